@@ -8,6 +8,9 @@ from components.language import init_session_state, get_text, load_custom_css
 from components.auth import init_auth_state, is_authenticated
 from components.navbar import render_navbar
 from components.chatbot_popup import render_floating_chatbot_button
+# Importing the connector starts the background model warmup, so the model is
+# ready by the time the user reaches the upload page
+import components.ml_model_connector  # noqa: F401
 
 # Page configuration
 st.set_page_config(
@@ -7,6 +7,9 @@ import streamlit as st
 from components.auth import init_auth_state, sign_in, is_authenticated, validate_email
 from components.language import init_session_state, get_text, load_custom_css
 from components.navbar import render_navbar
+# Importing the connector starts the background model warmup, so the model is
+# ready by the time the user reaches the upload page
+import components.ml_model_connector  # noqa: F401
 
 # Page configuration
 st.set_page_config(
@@ -4,18 +4,23 @@ Image upload and analysis trigger with ML model integration
 """
 
 import streamlit as st
-from PIL import Image
 import time
 from components.language import init_session_state, get_text, load_custom_css
 from components.navbar import render_navbar
 from components.auth import init_auth_state, require_auth
 from components.chatbot_popup import render_floating_chatbot_button
 from components.ml_model_connector import (
-    load_plant_disease_model,
-    predict_disease,
+    predict_disease_batched,
+    predict_disease_tiled,
+    TILED_INFERENCE,
+    load_image,
     validate_image,
-    check_model_availability
+    prescreen_image,
+    check_model_availability,
+    get_model_warmup_status
 )
+from components.inference_profiler import RequestTrace, active_trace
+from components.worker_pool import PoolBusyError
 
 # Page configuration
 st.set_page_config(
@@ -38,13 +43,24 @@ render_navbar()
 
 # Check model availability on page load
 if 'model_check_done' not in st.session_state:
-    with st.spinner("🔄 Initializing ML model..."):
-        model_available = check_model_availability()
+    warmup = get_model_warmup_status()
+    
+    if warmup['state'] == 'running':
+        # Model is still loading in the background; don't block the page, check again on the next rerun
+        st.info("🔄 The ML model is warming up in the background. You can upload an image now - analysis starts as soon as it is ready.")
+    else:
+        if warmup['state'] == 'ready':
+            model_available = True
+        elif warmup['state'] == 'failed':
+            model_available = False
+        else:
+            with st.spinner("🔄 Initializing ML model..."):
+                model_available = check_model_availability()
         st.session_state.model_check_done = True
         st.session_state.model_available = model_available
         
         if not model_available:
-            st.info("💡 Running in Demo Mode - Using simulated predictions for demonstration purposes.")
+            st.info("💡 Running in Demo Mode - Using a lightweight colour/texture classifier instead of the deep learning model.")
             st.info("ℹ️ For real ML predictions, PyTorch needs to be properly installed with Visual C++ redistributables.")
 
 # Header
@@ -76,16 +92,31 @@ with col2:
     )
     
     if uploaded_file is not None:
-        # Display uploaded image
-        image = Image.open(uploaded_file)
+        # Stage timings of this request; finished on the Results page
+        trace = RequestTrace()
+        
+        # Decode uploaded image (large photos are downscaled while decoding)
+        with trace.stage("decode"):
+            image = load_image(uploaded_file)
         
         # Validate image
-        is_valid, validation_msg = validate_image(image)
+        with trace.stage("validate"):
+            is_valid, validation_msg = validate_image(image)
         
         if not is_valid:
             st.error(f"❌ {validation_msg}")
             st.stop()
         
+        # Reject photos that are clearly not a usable leaf before running the model
+        with trace.stage("prescreen"):
+            is_leaf, prescreen_msg = prescreen_image(image)
+        
+        if not is_leaf:
+            st.image(image, width=300)
+            st.warning(f"🍃 {prescreen_msg}")
+            st.info("💡 Tip: Fill the frame with one leaf, in good light, and keep the camera steady.")
+            st.stop()
+        
         st.session_state.uploaded_image = image
         
         st.markdown("<br>", unsafe_allow_html=True)
@@ -107,31 +138,48 @@ with col2:
         
         st.markdown("<br>", unsafe_allow_html=True)
         
+        # An analysis interrupted by a rerun is resumed with its request id
+        # (with the worker pool, the original request kept running meanwhile)
+        upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+        pending = st.session_state.get('pending_prediction')
+        resume = pending is not None and pending['upload'] == upload_key
+        
         # Analyze button
-        if st.button(get_text('analyze_btn'), use_container_width=True, key="analyze_btn"):
+        if st.button(get_text('analyze_btn'), use_container_width=True, key="analyze_btn") or resume:
+            if not resume:
+                st.session_state.pending_prediction = {'upload': upload_key, 'request_id': trace.request_id}
+            request_id = st.session_state.pending_prediction['request_id']
+            
             with st.spinner(f"🤖 {get_text('analyzing')}"):
-                # Load ML model
-                processor, model = load_plant_disease_model()
-                
                 # Progress bar for user feedback
                 progress_bar = st.progress(0)
                 progress_bar.progress(30)
                 
-                # Make prediction using ML model (or demo mode)
-                prediction_results = predict_disease(image, processor, model)
-                progress_bar.progress(80)
-                
-                if prediction_results is None:
-                    st.error("❌ Prediction failed. Please try again with a different image.")
+                # Make prediction using the shared batched ML engine (or demo mode).
+                # Tiled mode re-decodes the original upload at a higher working resolution.
+                try:
+                    with active_trace(trace):
+                        if TILED_INFERENCE:
+                            with trace.stage("predict_tiled"):
+                                prediction_results = predict_disease_tiled(uploaded_file, request_id=request_id)
+                        else:
+                            prediction_results = predict_disease_batched(image, request_id=request_id)
+                except PoolBusyError:
+                    # Not accepted yet: pending_prediction is kept, so the next run retries the same request
+                    progress_bar.empty()
+                    st.warning("⏳ The analysis servers are busy right now. Press Analyze again in a moment.")
                     st.stop()
+                progress_bar.progress(80)
+                st.session_state.pending_prediction = None
                 
                 # Show demo mode indicator if applicable
-                if prediction_results.get('demo_mode', False):
-                    st.info("💡 Demo Mode: Showing simulated prediction based on image analysis")
+                if prediction_results.demo_mode:
+                    st.info("💡 Demo Mode: Showing the lightweight colour/texture classifier's prediction")
                 
                 # Store results in session state
                 st.session_state.ml_prediction = prediction_results
                 st.session_state.analysis_done = True
+                st.session_state.request_trace = trace
                 
                 progress_bar.progress(100)
             
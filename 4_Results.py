@@ -10,9 +10,14 @@ from components.cards import result_card
 from components.auth import init_auth_state, require_auth
 from components.gemini_ai import get_disease_recommendation, get_xai_explanation, text_to_speech, init_gemini
 from components.chatbot_popup import render_floating_chatbot_button
-from components.ml_model_connector import get_disease_recommendations, get_dataset_info
+from components.ml_model_connector import (
+    get_disease_recommendations, get_dataset_info, finish_request_trace, get_profiling_stats, PROFILING_PANEL
+)
+from components.inference_profiler import RequestTrace
+from components.tiled_inference import render_severity_overlay
+from components.saliency import render_saliency_overlay
 from datetime import datetime
-import numpy as np
+from pathlib import Path
 
 # Page configuration
 st.set_page_config(
@@ -101,26 +106,28 @@ if st.session_state.uploaded_image is None or not st.session_state.analysis_done
         if st.button(get_text('go_upload'), use_container_width=True):
             st.switch_page("pages/3_Upload.py")
 else:
+    # Trace started by the Upload page; only the first render after an analysis is recorded
+    upload_trace = st.session_state.pop('request_trace', None)
+    trace = upload_trace or RequestTrace()
+    
     # Get ML prediction results
     ml_prediction = st.session_state.get('ml_prediction', None)
     
     if ml_prediction:
         # Use actual ML predictions
-        disease_name = ml_prediction['predicted_disease']
-        confidence = ml_prediction['confidence'] * 100  # Convert to percentage
-        all_predictions = ml_prediction.get('all_probabilities', [])
-        all_classes = ml_prediction.get('all_classes', [])
-        is_demo_mode = ml_prediction.get('demo_mode', False)
+        disease_name = ml_prediction.predicted_disease
+        confidence = ml_prediction.confidence * 100  # Convert to percentage
+        top_predictions = ml_prediction.top(5)
+        is_demo_mode = ml_prediction.demo_mode
         
         # Show demo mode banner if applicable
         if is_demo_mode:
-            st.info("💡 Demo Mode Active: These are simulated predictions for demonstration. For real ML predictions, install PyTorch with proper dependencies.")
+            st.info("💡 Demo Mode Active: These predictions come from a lightweight colour/texture classifier and are less accurate. For deep learning predictions, install PyTorch with proper dependencies.")
     else:
         # Fallback to demo data
         disease_name = get_text('disease_name')
         confidence = 96.5
-        all_predictions = None
-        all_classes = None
+        top_predictions = None
         is_demo_mode = True
     
     # Store in history
@@ -134,8 +141,9 @@ else:
         'crop': 'Tomato'
     }
     
-    if not any(h['date'] == current_result['date'] for h in st.session_state.disease_history):
-        st.session_state.disease_history.append(current_result)
+    with trace.stage("save_history"):
+        if not any(h['date'] == current_result['date'] for h in st.session_state.disease_history):
+            st.session_state.disease_history.append(current_result)
     
     # Display results
     col1, col2 = st.columns([1, 1])
@@ -145,21 +153,35 @@ else:
         st.markdown("<div class='image-container'>", unsafe_allow_html=True)
         st.image(st.session_state.uploaded_image, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
+        
+        # Tiled analysis: show which parts of the leaf look diseased
+        if ml_prediction and ml_prediction.tiles:
+            with st.expander("🧩 Tile Severity Map", expanded=True):
+                st.image(render_severity_overlay(st.session_state.uploaded_image, ml_prediction), use_container_width=True)
+                st.caption(
+                    f"Affected leaf area: {ml_prediction.severity * 100:.0f}% "
+                    f"({len(ml_prediction.tiles)} tiles analyzed; red = diseased, green = healthy)"
+                )
     
     with col2:
         st.markdown(f"<h3 style='color: #2e7d32;'>🔍 {get_text('detection_results')}</h3>", unsafe_allow_html=True)
         result_card(get_text('detected_disease'), disease_name, "🦠")
         result_card(get_text('confidence_score'), f"{confidence:.2f}%", "📈")
         
+        # Borderline case re-scored with augmented views (test-time augmentation)
+        tta = ml_prediction.tta if ml_prediction else None
+        if tta and tta['views']:
+            st.caption(
+                f"🔁 Borderline case: confidence refined over {len(tta['views']) + 1} views of the leaf "
+                f"(first look: {tta['first_confidence'] * 100:.1f}%)"
+            )
+        
         # Show all predictions if available
-        if all_predictions is not None and all_classes is not None:
+        if top_predictions:
             with st.expander("📊 All Predictions (Top 5)", expanded=False):
-                # Sort by probability
-                sorted_indices = np.argsort(all_predictions)[::-1][:5]
-                
-                for idx in sorted_indices:
-                    label = all_classes[idx]
-                    prob = all_predictions[idx] * 100
+                # Already sorted by probability
+                for label, probability in top_predictions:
+                    prob = probability * 100
                     
                     # Color code based on probability
                     if prob > 50:
@@ -170,7 +192,7 @@ else:
                         color = "⚪"
                     
                     st.markdown(f"{color} **{label}**: {prob:.2f}%")
-                    st.progress(float(all_predictions[idx]))
+                    st.progress(probability)
         
         st.markdown("<br>", unsafe_allow_html=True)
         if st.button("🔊 Listen to Diagnosis", use_container_width=True, key="voice_diagnosis"):
@@ -187,17 +209,57 @@ else:
     
     st.markdown("<br>", unsafe_allow_html=True)
     
+    # ==================== SIMILAR REFERENCE CASES ====================
+    # Confirmed training images closest to this photo in the model's embedding space
+    similar_cases = [
+        case for case in ((ml_prediction.similar_cases if ml_prediction else None) or ())
+        if Path(case['path']).is_file()
+    ]
+    if similar_cases:
+        st.markdown("<h2 style='color: #2e7d32; margin-top: 30px;'>🔎 Similar Reference Cases</h2>", unsafe_allow_html=True)
+        for column, case in zip(st.columns(len(similar_cases)), similar_cases):
+            with column:
+                st.image(case['path'], use_container_width=True)
+                st.caption(
+                    f"{case['label_name'].replace('___', ' - ').replace('_', ' ')} · "
+                    f"{case['similarity'] * 100:.0f}% similar"
+                )
+        st.markdown("<br>", unsafe_allow_html=True)
+    
     # ==================== EXPLAINABLE AI SECTION WITH GEMINI ====================
     st.markdown("<h2 style='color: #2e7d32; margin-top: 30px;'>🔬 Why AI Predicted This (Explainable AI)</h2>", unsafe_allow_html=True)
     
     # Get current language
     current_language = st.session_state.get('language', 'English')
     
-    # Generate XAI explanation with Gemini
+    # Grad-CAM heatmap: the leaf regions that drove this prediction, computed in the same model pass
+    has_saliency = bool(ml_prediction) and ml_prediction.saliency_map is not None
+    if has_saliency:
+        heat_col, legend_col = st.columns([1, 1])
+        with heat_col:
+            with trace.stage("render_heatmap"):
+                heatmap = render_saliency_overlay(st.session_state.uploaded_image, ml_prediction)
+            st.image(heatmap, use_container_width=True)
+        with legend_col:
+            st.markdown(f"""
+            <div class='info-box' style='padding: 30px;'>
+                <h4 style='color: #1565c0; margin-bottom: 20px; font-weight: 700;'>🔥 Model Attention Heatmap</h4>
+                <p style='color: #0d3d0d; font-size: 16px; line-height: 1.8;'>
+                    Red and yellow areas are the parts of this photo that pushed the model towards
+                    <strong>{disease_name}</strong>. Blue areas had little influence on the result.
+                    If the hot spots are not on the leaf, retake the photo closer to the affected area.
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
+        st.markdown("<br>", unsafe_allow_html=True)
+    
+    # Generate XAI explanation with Gemini (a network round trip, so on request when the heatmap is shown)
     xai_cache_key = f"xai_{disease_name}_{current_language}"
     
-    if xai_cache_key not in st.session_state:
-        with st.spinner("🧠 Generating AI explanation..."):
+    if xai_cache_key not in st.session_state and (
+        not has_saliency or st.button("🧠 Explain This Disease in Words", key="xai_text_explanation")
+    ):
+        with st.spinner("🧠 Generating AI explanation..."), trace.stage("gemini_explanation"):
             xai_result = get_xai_explanation(disease_name, current_language)
             if xai_result:
                 st.session_state[xai_cache_key] = xai_result
@@ -212,9 +274,9 @@ else:
             <p style='color: #0d3d0d; font-size: 16px; line-height: 1.8; white-space: pre-wrap;'>{xai_result.get('explanation', '')}</p>
         </div>
         """, unsafe_allow_html=True)
-    else:
-        # Fallback to static XAI data
-        xai_data = XAI_EXPLANATIONS.get("Tomato Late Blight", {})
+    
+    # Static XAI details below (also needed when the Gemini explanation is shown)
+    xai_data = XAI_EXPLANATIONS.get("Tomato Late Blight", {})
     
     col1, col2 = st.columns([1, 1])
     
@@ -279,7 +341,7 @@ else:
     cache_key = f"ai_rec_{disease_name}_{current_language}"
     
     if cache_key not in st.session_state:
-        with st.spinner("🤖 Generating AI recommendations..."):
+        with st.spinner("🤖 Generating AI recommendations..."), trace.stage("gemini_recommendations"):
             ai_rec = get_disease_recommendation(disease_name, current_language)
             if ai_rec:
                 st.session_state[cache_key] = ai_rec
@@ -369,6 +431,41 @@ else:
     
     st.markdown("<br>", unsafe_allow_html=True)
     
+    if upload_trace is not None:
+        finish_request_trace(upload_trace)
+    
+    # ==================== PROFILING PANEL (DEBUG) ====================
+    if PROFILING_PANEL:
+        profiling = get_profiling_stats()
+        with st.expander(f"🛠️ Inference Profiling (last {len(profiling['recent'])} requests)", expanded=False):
+            st.markdown("**Recent requests (ms per stage)**")
+            st.dataframe(
+                [
+                    {
+                        "request": entry['request_id'],
+                        "time": datetime.fromtimestamp(entry['started_at']).strftime("%H:%M:%S"),
+                        "total": round(entry['total_ms'], 1),
+                        **{stage: round(ms, 1) for stage, ms in entry['stages'].items()},
+                        **{key: value for key, value in entry['meta'].items() if key != 'torch_profile'}
+                    }
+                    for entry in profiling['recent']
+                ],
+                use_container_width=True
+            )
+            st.markdown("**All requests in this process (ms)**")
+            st.dataframe(
+                [
+                    {"stage": stage, "count": summary['count'], "mean": round(summary['mean_ms'], 1),
+                     "p50": round(summary['p50_ms'], 1), "p95": round(summary['p95_ms'], 1),
+                     "p99": round(summary['p99_ms'], 1), "max": round(summary['max_ms'], 1)}
+                    for stage, summary in profiling['stages'].items()
+                ],
+                use_container_width=True
+            )
+            torch_profiles = [entry['meta']['torch_profile'] for entry in profiling['recent'] if 'torch_profile' in entry['meta']]
+            if torch_profiles:
+                st.caption(f"PyTorch profiler trace of the latest request: {torch_profiles[0]} (open in chrome://tracing)")
+    
     # Action buttons
     col1, col2, col3 = st.columns(3)
     
@@ -0,0 +1,298 @@
+"""
+Augmented Inference - Test-Time Augmentation for Borderline Predictions
+When the first forward pass is not confident enough, flipped and cropped views
+of the same images are stacked into one extra batch and classified together;
+each image's logits are averaged over its original and augmented views. A
+per-request latency budget caps how many views run, dropping the lowest
+priority ones first. Includes an offline accuracy report on the validation split.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PIL import Image
+
+# Fraction of each side kept by the zoom and corner crops
+CROP_FRACTION = 0.85
+
+# Smoothing of the per-view cost estimate used to fit views into the budget
+COST_SMOOTHING = 0.3
+
+
+def _crop(image: Image.Image, anchor: tuple) -> Image.Image:
+    """CROP_FRACTION crop whose free margin is split by ``anchor`` (0 = left/top, 1 = right/bottom)"""
+    width, height = image.size
+    crop_width, crop_height = round(width * CROP_FRACTION), round(height * CROP_FRACTION)
+    left = round((width - crop_width) * anchor[0])
+    top = round((height - crop_height) * anchor[1])
+    return image.crop((left, top, left + crop_width, top + crop_height))
+
+
+# In priority order: a tight budget keeps the first ones
+VIEWS = {
+    "hflip": lambda image: image.transpose(Image.FLIP_LEFT_RIGHT),
+    "vflip": lambda image: image.transpose(Image.FLIP_TOP_BOTTOM),
+    "zoom": lambda image: _crop(image, (0.5, 0.5)),
+    "crop_top_left": lambda image: _crop(image, (0.0, 0.0)),
+    "crop_bottom_right": lambda image: _crop(image, (1.0, 1.0)),
+    "crop_top_right": lambda image: _crop(image, (1.0, 0.0)),
+    "crop_bottom_left": lambda image: _crop(image, (0.0, 1.0)),
+    "rot90": lambda image: image.transpose(Image.ROTATE_90)
+}
+
+
+def augment(image: Image.Image, view: str) -> Image.Image:
+    """One augmented view of an image"""
+    return VIEWS[view](image)
+
+
+def average_logits(first_probabilities: np.ndarray, view_logits: np.ndarray) -> np.ndarray:
+    """
+    Class probabilities from logits averaged over the original and augmented views.
+
+    The first pass only kept probabilities; their logarithm differs from the
+    logits by a per-view constant, which the final softmax cancels out.
+
+    Args:
+        first_probabilities: (C,) probabilities of the original image
+        view_logits: (V, C) logits of its augmented views
+
+    Returns:
+        np.ndarray: float32 (C,) probabilities
+    """
+    first_logits = np.log(np.maximum(first_probabilities.astype(np.float64), np.finfo(np.float64).tiny))
+    logits = np.vstack([first_logits[None, :], view_logits.astype(np.float64)]).mean(axis=0)
+    logits -= logits.max()
+    probabilities = np.exp(logits)
+    return (probabilities / probabilities.sum()).astype(np.float32)
+
+
+class TestTimeAugmenter:
+    """
+    Confidence-gated, budgeted test-time augmentation.
+
+    Results whose confidence is below ``threshold`` get up to ``len(views)``
+    augmented views each, as many as the remaining latency budget affords
+    at the running per-view cost estimate. Keeps counters and a window of
+    recent augmentation latencies.
+    """
+
+    def __init__(self, views, threshold: float, budget_ms: float, latency_window: int = 1000):
+        """
+        Args:
+            views: Names from VIEWS, highest priority first
+            threshold: Confidence below which a prediction is augmented
+            budget_ms: Latency budget per request, first pass included
+            latency_window: Number of recent augmentation latencies kept for stats()
+        """
+        unknown = [view for view in views if view not in VIEWS]
+        if unknown:
+            raise ValueError(f"Unknown augmentation views: {', '.join(unknown)}")
+        self.views = list(views)
+        self.threshold = float(threshold)
+        self.budget_ms = float(budget_ms)
+
+        self._lock = threading.Lock()
+        self._view_ms = None
+        self._counts = {"requests": 0, "augmented": 0, "budget_limited": 0, "skipped_budget": 0, "views": 0}
+        self._latencies_ms = deque(maxlen=latency_window)
+
+    def plan(self, count: int, elapsed_ms: float, first_pass_ms: float) -> list:
+        """
+        Views affordable for ``count`` borderline images within the remaining budget.
+
+        Args:
+            count: Images to augment in the same batch
+            elapsed_ms: Time the request has already spent
+            first_pass_ms: Per-image cost of the first pass (the estimate until views were timed)
+        """
+        with self._lock:
+            view_ms = self._view_ms if self._view_ms is not None else first_pass_ms
+        remaining_ms = self.budget_ms - elapsed_ms
+        affordable = int(remaining_ms // max(view_ms * count, 1e-3)) if remaining_ms > 0 else 0
+        return self.views[:max(0, min(len(self.views), affordable))]
+
+    def refine(self, images, probabilities, predict_logits, elapsed_ms: float) -> tuple:
+        """
+        Re-score the low-confidence images of one batch with augmented views.
+
+        Args:
+            images: PIL images of the batch
+            probabilities: (N, C) first-pass class probabilities
+            predict_logits: Callable mapping a list of images to (N, C) logits in one forward pass
+            elapsed_ms: Time the batch has taken so far (the first pass)
+
+        Returns:
+            tuple: ((N, C) probabilities, borderline rows replaced; per image a dict
+                   (first_confidence, views, dropped, ms) if it was below the threshold, else None)
+        """
+        probabilities = np.asarray(probabilities)
+        confidence = probabilities.max(axis=1)
+        borderline = np.flatnonzero(confidence < self.threshold)
+        augmentations = [None] * len(probabilities)
+        with self._lock:
+            self._counts["requests"] += len(probabilities)
+        if not len(borderline):
+            return probabilities, augmentations
+
+        views = self.plan(len(borderline), elapsed_ms, elapsed_ms / len(probabilities))
+        dropped = self.views[len(views):]
+        refined = probabilities.copy()
+        started = time.perf_counter()
+
+        if views:
+            batch = [augment(images[position], view) for position in borderline for view in views]
+            logits = np.asarray(predict_logits(batch)).reshape(len(borderline), len(views), -1)
+            for offset, position in enumerate(borderline):
+                refined[position] = average_logits(probabilities[position], logits[offset])
+
+        augment_ms = 1000.0 * (time.perf_counter() - started)
+        for position in borderline:
+            augmentations[position] = {
+                "first_confidence": float(confidence[position]),
+                "views": list(views),
+                "dropped": list(dropped),
+                "ms": augment_ms
+            }
+
+        with self._lock:
+            self._counts["augmented"] += len(borderline) if views else 0
+            self._counts["budget_limited"] += len(borderline) if dropped else 0
+            self._counts["skipped_budget"] += 0 if views else len(borderline)
+            self._counts["views"] += len(borderline) * len(views)
+            if views:
+                view_ms = augment_ms / (len(borderline) * len(views))
+                self._view_ms = view_ms if self._view_ms is None else (
+                    COST_SMOOTHING * view_ms + (1 - COST_SMOOTHING) * self._view_ms
+                )
+                self._latencies_ms.append(augment_ms)
+        return refined, augmentations
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: threshold, budget, counters, estimated per-view cost and
+                  augmentation latency percentiles over the recent window
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = list(self._latencies_ms)
+            view_ms = self._view_ms
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (None, None, None)
+        return {
+            "threshold": self.threshold,
+            "budget_ms": self.budget_ms,
+            **counts,
+            "augmented_fraction": counts["augmented"] / counts["requests"] if counts["requests"] else 0.0,
+            "view_ms": view_ms,
+            "p50_ms": None if p50 is None else float(p50),
+            "p95_ms": None if p95 is None else float(p95),
+            "p99_ms": None if p99 is None else float(p99)
+        }
+
+
+# ==================== ACCURACY REPORT ====================
+def evaluate_tta(first_probabilities, view_logits, labels, view_counts, thresholds) -> list:
+    """
+    Accuracy of gated TTA for several thresholds and view counts, from one pass
+    over every view of every image.
+
+    Args:
+        first_probabilities: (N, C) first-pass probabilities
+        view_logits: (N, V, C) logits of the augmented views, in priority order
+        labels: (N,) true class indices
+        view_counts: Numbers of views (prefixes of the V views) to evaluate
+        thresholds: Confidence thresholds to evaluate
+
+    Returns:
+        list: One dict per (views, threshold) with augmented_fraction, accuracy,
+              baseline_accuracy, gain and the accuracy on the augmented images before/after
+    """
+    first_prediction = first_probabilities.argmax(axis=1)
+    confidence = first_probabilities.max(axis=1)
+    baseline = float((first_prediction == labels).mean())
+
+    rows = []
+    for count in view_counts:
+        augmented_prediction = np.array([
+            average_logits(probabilities, logits[:count]).argmax()
+            for probabilities, logits in zip(first_probabilities, view_logits)
+        ])
+        for threshold in thresholds:
+            gated = confidence < threshold
+            prediction = np.where(gated, augmented_prediction, first_prediction)
+            accuracy = float((prediction == labels).mean())
+            rows.append({
+                "views": int(count),
+                "threshold": float(threshold),
+                "augmented_fraction": float(gated.mean()),
+                "baseline_accuracy": baseline,
+                "accuracy": accuracy,
+                "gain": accuracy - baseline,
+                "gated_accuracy_before": float((first_prediction == labels)[gated].mean()) if gated.any() else None,
+                "gated_accuracy_after": float((prediction == labels)[gated].mean()) if gated.any() else None
+            })
+    return rows
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+
+    os.environ["AGRIDETECT_TTA"] = "0"
+    os.environ["AGRIDETECT_CASCADE"] = "0"
+    from components.ml_model_connector import (
+        _class_logits, _class_probabilities, _preprocess_images, list_dataset_images, load_plant_disease_model
+    )
+
+    parser = argparse.ArgumentParser(description="Report the accuracy gain of test-time augmentation on the validation split")
+    parser.add_argument("--views", nargs="+", default=list(VIEWS), choices=list(VIEWS))
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9, 1.01])
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate only the first N images")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    processor, model = load_plant_disease_model()
+    if model is None:
+        raise SystemExit("❌ Model could not be loaded")
+
+    items = list_dataset_images("valid")
+    if args.limit:
+        items = items[::max(1, len(items) // args.limit)][:args.limit]
+    images = [Image.open(path).convert("RGB") for path, _ in items]
+
+    first_probabilities, view_logits, first_ms, views_ms = [], [], [], []
+    for image in images:
+        started = time.perf_counter()
+        first_probabilities.append(_class_probabilities(_preprocess_images([image], processor), model)[0])
+        first_ms.append(1000.0 * (time.perf_counter() - started))
+
+        started = time.perf_counter()
+        batch = _preprocess_images([augment(image, view) for view in args.views], processor)
+        view_logits.append(_class_logits(batch, model))
+        views_ms.append(1000.0 * (time.perf_counter() - started))
+
+    rows = evaluate_tta(
+        np.stack(first_probabilities), np.stack(view_logits), np.array([idx for _, idx in items]),
+        range(1, len(args.views) + 1), args.thresholds
+    )
+
+    print(f"TTA on {len(items)} validation images: first pass {np.mean(first_ms):.0f} ms, "
+          f"{len(args.views)} views in one batch {np.mean(views_ms):.0f} ms "
+          f"(~{np.mean(views_ms) / len(args.views):.0f} ms per view)")
+    print(f"{'views':>5} {'threshold':>9} {'augmented':>10} {'baseline':>9} {'accuracy':>9} {'gain':>7} "
+          f"{'gated before':>13} {'gated after':>12}")
+    for row in rows:
+        before = "-" if row["gated_accuracy_before"] is None else f"{row['gated_accuracy_before']:.1%}"
+        after = "-" if row["gated_accuracy_after"] is None else f"{row['gated_accuracy_after']:.1%}"
+        print(f"{row['views']:>5} {row['threshold']:>9.2f} {row['augmented_fraction']:>10.1%} "
+              f"{row['baseline_accuracy']:>9.1%} {row['accuracy']:>9.1%} {row['gain']:>+7.1%} "
+              f"{before:>13} {after:>12}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
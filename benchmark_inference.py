@@ -0,0 +1,372 @@
+"""
+Inference Benchmark for AgroDetect AI
+Compares cold-load time and peak memory, per-stage latency percentiles
+(decode, preprocess, forward, postprocess, end-to-end), predict_batch
+throughput across batch sizes and thread counts, and sustained video-stream
+frames/sec for the transformers model and the exported TorchScript classifier.
+Save a run with --save and pass it to a later run with --baseline to compare
+model variants or track regressions over time.
+
+Usage (from the app root, the folder holding components/; otherwise add it to PYTHONPATH):
+    python -m components.benchmark_inference --save before.json
+    python -m components.benchmark_inference --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP_ROOT = Path(__file__).parent.parent
+COLD_LOAD_MARKER = "COLD_LOAD_SECONDS="
+PEAK_RSS_MARKER = "PEAK_RSS_MB="
+
+STAGES = ("decode", "preprocess", "forward", "postprocess", "end_to_end")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where getrusage is unavailable (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_cold_load(torchscript_path: str = "", image_path: str = "") -> dict:
+    """
+    Time load_plant_disease_model() in a fresh Python process.
+    Library imports are excluded so only model construction is measured.
+    The process then classifies one image so the peak RSS is that of a
+    serving process (imports + weights + one forward pass).
+
+    Returns:
+        dict: seconds and peak_rss_mb (None if the platform cannot report it)
+    """
+    env = dict(os.environ, AGRIDETECT_QUANTIZATION="off", AGRIDETECT_TORCHSCRIPT_PATH=torchscript_path)
+    code = (
+        "import sys, time\n"
+        "import torch, transformers\n"
+        "import components.ml_model_connector as connector\n"
+        "from components.benchmark_inference import peak_rss_mb\n"
+        "started = time.perf_counter()\n"
+        "processor, model = connector.load_plant_disease_model()\n"
+        "assert model is not None, 'model failed to load'\n"
+        f"print('{COLD_LOAD_MARKER}' + str(time.perf_counter() - started))\n"
+        "if sys.argv[1]:\n"
+        "    connector._predict_images([connector.load_image(sys.argv[1])], processor, model)\n"
+        f"print('{PEAK_RSS_MARKER}' + str(peak_rss_mb()))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code, image_path],
+        env=env,
+        # The app root is the child's first import path, so components.* resolves
+        cwd=str(APP_ROOT),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    result = {}
+    for line in completed.stdout.splitlines():
+        if line.startswith(COLD_LOAD_MARKER):
+            result["seconds"] = float(line[len(COLD_LOAD_MARKER):])
+        elif line.startswith(PEAK_RSS_MARKER):
+            value = line[len(PEAK_RSS_MARKER):]
+            result["peak_rss_mb"] = None if value == "None" else float(value)
+    if "seconds" not in result:
+        raise RuntimeError(f"Cold load benchmark produced no result:\n{completed.stderr[-2000:]}")
+    return result
+
+
+def measure_stages(processor, model, paths, warmup: int = 3) -> dict:
+    """
+    Per-image latency of each stage of a single prediction, in milliseconds:
+    decode (load_image from disk), preprocess, forward, postprocess (softmax +
+    top-k PredictionResult) and end-to-end. The prediction cache is bypassed.
+
+    Returns:
+        dict: Stage name -> list of per-image milliseconds
+    """
+    import torch
+    from components.ml_model_connector import _build_prediction_result, _preprocess_images, load_image
+    from components.model_graph import forward_logits
+
+    batch_buffer = processor.allocate_batch(1) if hasattr(processor, "allocate_batch") else None
+    id2label = model.config.id2label
+    timings = {stage: [] for stage in STAGES}
+
+    for index, path in enumerate(list(paths[:warmup]) + list(paths)):
+        with torch.no_grad():
+            started = time.perf_counter()
+            image = load_image(path)
+            decoded = time.perf_counter()
+            pixel_values = _preprocess_images([image], processor, batch_buffer)
+            preprocessed = time.perf_counter()
+            logits = forward_logits(model, pixel_values)
+            forwarded = time.perf_counter()
+            probabilities = torch.nn.functional.softmax(logits, dim=-1).numpy()
+            _build_prediction_result(probabilities[0], id2label)
+            finished = time.perf_counter()
+
+        if index < warmup:
+            continue
+        checkpoints = (started, decoded, preprocessed, forwarded, finished)
+        for stage, begin, end in zip(STAGES, checkpoints, checkpoints[1:]):
+            timings[stage].append(1000.0 * (end - begin))
+        timings["end_to_end"].append(1000.0 * (finished - started))
+    return timings
+
+
+def measure_throughput(processor, model, images, batch_sizes) -> dict:
+    """
+    predict_batch throughput in images per second for each batch size.
+    """
+    from components.ml_model_connector import predict_batch
+
+    predict_batch(images[:max(batch_sizes)], processor, model, batch_size=max(batch_sizes))
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        predict_batch(images, processor, model, batch_size=batch_size)
+        throughput[batch_size] = len(images) / (time.perf_counter() - started)
+    return throughput
+
+
+def measure_throughput_grid(processor, model, images, batch_sizes, thread_counts) -> list:
+    """
+    predict_batch throughput for every (intra-op threads, batch size) pair.
+    The process-wide torch thread count is restored afterwards.
+
+    Returns:
+        list: Dicts with threads, batch_size and images_per_second
+    """
+    import torch
+
+    original_threads = torch.get_num_threads()
+    grid = []
+    try:
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            for batch_size, images_per_second in measure_throughput(processor, model, images, batch_sizes).items():
+                grid.append({"threads": threads, "batch_size": batch_size, "images_per_second": images_per_second})
+    finally:
+        torch.set_num_threads(original_threads)
+    return grid
+
+
+def synthetic_walk_frames(images, seconds: float, fps: float = 30.0, size=(640, 480)):
+    """
+    A scout walking a crop row: the camera pans along a strip of leaf photos,
+    stopping on every second leaf for a second with slight sensor noise.
+    """
+    from PIL import Image
+    import numpy as np
+
+    tile = size[1]
+    strip = Image.new("RGB", (tile * len(images) + size[0], tile))
+    for i, image in enumerate(images):
+        strip.paste(image.resize((tile, tile)), (i * tile, 0))
+
+    rng = np.random.default_rng(0)
+    pan_per_frame = max(1, int(tile / fps))  # one leaf per second while walking
+    x = 0
+    for index in range(int(seconds * fps)):
+        paused = (index // int(fps)) % 2 == 1
+        if not paused:
+            x = min(x + pan_per_frame, strip.size[0] - size[0])
+        frame = np.asarray(strip.crop((x, 0, x + size[0], size[1])), dtype=np.int16)
+        frame = np.clip(frame + rng.integers(-3, 4, frame.shape), 0, 255).astype(np.uint8)
+        yield Image.fromarray(frame)
+
+
+def measure_streaming(processor, model, images, seconds: float, fps: float = 30.0) -> dict:
+    """
+    Sustained frames/sec of the streaming pipeline (sampling, dHash
+    de-duplication, batched classification) on a synthetic walk video.
+    Frame synthesis happens up front and is not timed.
+    """
+    from components.frame_stream import iter_image_frames, stream_detections
+    from components.ml_model_connector import STREAM_BATCH_SIZE, _predict_images
+
+    frames = list(synthetic_walk_frames(images, seconds, fps))
+    batch_buffer = processor.allocate_batch(STREAM_BATCH_SIZE) if hasattr(processor, "allocate_batch") else None
+    stats = {}
+
+    started = time.perf_counter()
+    timeline = list(stream_detections(
+        iter_image_frames(frames, fps=fps),
+        lambda batch: _predict_images(batch, processor, model, batch_buffer),
+        batch_size=STREAM_BATCH_SIZE,
+        stats=stats
+    ))
+    elapsed = time.perf_counter() - started
+
+    return {
+        **stats,
+        "detections": len(timeline),
+        "frames_per_second": stats["frames_read"] / elapsed,
+        "realtime_factor": stats["frames_read"] / elapsed / fps
+    }
+
+
+def percentiles(latencies: list) -> dict:
+    """mean, p50, p95 and p99 of a list of milliseconds"""
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"mean": statistics.mean(latencies), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def summarize(latencies: list) -> str:
+    stats = percentiles(latencies)
+    return (f"mean {stats['mean']:7.1f} ms   p50 {stats['p50']:7.1f} ms   "
+            f"p95 {stats['p95']:7.1f} ms   p99 {stats['p99']:7.1f} ms")
+
+
+def environment() -> dict:
+    """Host, library versions and source revision recorded with every saved run"""
+    import torch
+
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=str(Path(__file__).parent),
+            capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        revision = None
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads()
+    }
+
+
+def _format_change(before, after) -> str:
+    if not before or after is None:
+        return ""
+    return f"   ({(after - before) / before:+.0%} vs baseline)"
+
+
+def main():
+    from components.torchscript_export import DEFAULT_TORCHSCRIPT_PATH, load_torchscript_classifier
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--torchscript", default=DEFAULT_TORCHSCRIPT_PATH,
+                        help="TorchScript artifact from python -m components.torchscript_export "
+                             "(the variant is skipped if it does not exist)")
+    parser.add_argument("--images", type=int, default=50, help="Validation images for the latency run")
+    parser.add_argument("--cold-runs", type=int, default=3, help="Fresh processes per cold-load measurement")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32],
+                        help="Batch sizes for the predict_batch throughput run")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="torch intra-op thread counts for the throughput run (default: current setting)")
+    parser.add_argument("--stream-seconds", type=float, default=20.0,
+                        help="Length of the synthetic 30 fps walk video for the streaming run (0 = skip)")
+    parser.add_argument("--save", type=Path, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier --save output to compare against")
+    args = parser.parse_args()
+
+    os.environ["AGRIDETECT_QUANTIZATION"] = "off"
+    os.environ["AGRIDETECT_TORCHSCRIPT_PATH"] = ""
+
+    import torch
+    from PIL import Image
+    from components.ml_model_connector import get_model_revision, list_dataset_images, load_plant_disease_model
+
+    torchscript_path = str(Path(args.torchscript).resolve())
+
+    paths = [path for path, _ in list_dataset_images("valid")]
+    step = max(1, len(paths) // max(1, args.images))
+    paths = paths[::step][:args.images]
+    images = [Image.open(path).convert("RGB") for path in paths]
+    if not images:
+        raise SystemExit("❌ No validation images found")
+
+    thread_counts = args.threads or [torch.get_num_threads()]
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else {}
+    report = {
+        "environment": environment(),
+        "config": {"images": len(images), "cold_runs": args.cold_runs, "batch_sizes": args.batch_sizes,
+                   "threads": thread_counts, "stream_seconds": args.stream_seconds},
+        "variants": {}
+    }
+
+    print("=" * 70)
+    print("⏱️  AgroDetect Inference Benchmark")
+    print("=" * 70)
+
+    variants = {"transformers": ("", load_plant_disease_model)}
+    if Path(torchscript_path).is_file():
+        variants["torchscript"] = (torchscript_path, lambda: load_torchscript_classifier(torchscript_path))
+    else:
+        print(f"⏭️  TorchScript artifact not found ({torchscript_path}): variant skipped. "
+              f"Create it with python -m components.torchscript_export")
+
+    for name, (artifact, loader) in variants.items():
+        before = baseline.get("variants", {}).get(name, {})
+        cold = [measure_cold_load(artifact, str(paths[0])) for _ in range(args.cold_runs)]
+        cold_seconds = statistics.median(run["seconds"] for run in cold)
+        peak_rss = max((run["peak_rss_mb"] for run in cold if run.get("peak_rss_mb") is not None), default=None)
+
+        processor, model = loader()
+        stages = {stage: percentiles(values) for stage, values in measure_stages(processor, model, paths).items()}
+        grid = measure_throughput_grid(processor, model, images, args.batch_sizes, thread_counts)
+
+        print(f"\n📦 {name}")
+        print(f"   Cold load:  median {cold_seconds:.3f} s over {len(cold)} fresh processes"
+              + _format_change(before.get("cold_load_seconds"), cold_seconds))
+        if peak_rss is not None:
+            print(f"   Peak RSS:   {peak_rss:7.0f} MB after load + one prediction"
+                  + _format_change(before.get("peak_rss_mb"), peak_rss))
+        label = f"Stages ({len(images)} images, batch 1, ms)"
+        print(f"   {label:<28}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for stage, stats in stages.items():
+            print(f"      {stage:<25}{stats['mean']:9.1f}{stats['p50']:9.1f}{stats['p95']:9.1f}{stats['p99']:9.1f}"
+                  + _format_change(before.get("stages", {}).get(stage, {}).get("p50"), stats["p50"]))
+
+        earlier = {(cell["threads"], cell["batch_size"]): cell["images_per_second"]
+                   for cell in before.get("throughput", [])}
+        for cell in grid:
+            print(f"   Threads {cell['threads']:>2}, batch {cell['batch_size']:>3}:  "
+                  f"{cell['images_per_second']:7.1f} images/sec"
+                  + _format_change(earlier.get((cell["threads"], cell["batch_size"])), cell["images_per_second"]))
+
+        result = {
+            "model_revision": get_model_revision(model),
+            "cold_load_seconds": cold_seconds,
+            "peak_rss_mb": peak_rss,
+            "stages": stages,
+            "throughput": grid
+        }
+
+        if args.stream_seconds > 0:
+            stream = measure_streaming(processor, model, images[:12], args.stream_seconds)
+            print(f"   Stream:     {stream['frames_per_second']:7.1f} frames/sec sustained "
+                  f"({stream['realtime_factor']:.1f}x real time at 30 fps; {stream['frames_sampled']} of "
+                  f"{stream['frames_read']} frames sampled, {stream['duplicates_skipped']} duplicates, "
+                  f"{stream['frames_classified']} classified)")
+            result["stream"] = stream
+
+        report["variants"][name] = result
+        del processor, model
+
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\n📄 Results saved to {args.save}")
+    print("\n" + "=" * 70)
+
+if __name__ == "__main__":
+    main()
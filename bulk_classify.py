@@ -0,0 +1,292 @@
+"""
+Bulk Classification for AgroDetect AI
+Classifies every image under a directory tree without the web UI:
+images are decoded in a process pool, classified in batches and results are
+streamed to CSV or Parquet. Re-running the same command resumes where it stopped;
+images that could not be decoded get one error row and are retried on the next run.
+
+Usage:
+    python bulk_classify.py field_photos/ --output results.csv
+    python bulk_classify.py field_photos/ --output results_parquet/ --format parquet
+"""
+
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# ==================== DECODE WORKERS ====================
+_worker_spec = None
+
+
+def _init_worker(spec_values: dict):
+    global _worker_spec
+    from components.image_preprocessing import PreprocessSpec
+
+    _worker_spec = PreprocessSpec.from_dict(spec_values)
+
+
+def _decode_crop(path: str):
+    """Decode one image (JPEG draft mode) and crop it to the model input; runs in a worker process"""
+    from components.image_preprocessing import decode_image, resize_and_crop
+
+    try:
+        image = decode_image(path, min_edge=_worker_spec.resize_shortest_edge)
+        return path, resize_and_crop(image, _worker_spec), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+# ==================== INPUT & MANIFEST ====================
+def find_images(input_dir: Path) -> list:
+    """All image files under input_dir, in a stable order"""
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                found.append(Path(root) / name)
+    return found
+
+
+class ProcessedManifest:
+    """
+    Append-only list of files already written to the output, one relative path per line.
+    Files that failed to decode are listed with a "failed<TAB>" prefix: they are retried
+    on resume, but their error row is not written again.
+    """
+
+    FAILED_PREFIX = "failed\t"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done = set()
+        self.failed = set()
+        if path.is_file():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                if line.startswith(self.FAILED_PREFIX):
+                    self.failed.add(line[len(self.FAILED_PREFIX):])
+                elif line:
+                    self.done.add(line)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def add(self, relative_paths, failed: bool = False):
+        prefix = self.FAILED_PREFIX if failed else ""
+        self._file.write("".join(f"{prefix}{path}\n" for path in relative_paths))
+        self._file.flush()
+        (self.failed if failed else self.done).update(relative_paths)
+
+    def close(self):
+        self._file.close()
+
+
+# ==================== OUTPUT WRITERS ====================
+def _columns(top_k: int) -> list:
+    columns = ["path", "predicted_disease", "confidence"]
+    for rank in range(1, top_k + 1):
+        columns += [f"top{rank}_label", f"top{rank}_probability"]
+    return columns + ["error"]
+
+
+class CsvResultWriter:
+    """Appends rows to one CSV file, flushing after every batch"""
+
+    def __init__(self, path: Path, top_k: int):
+        self.columns = _columns(top_k)
+        is_new = not path.is_file() or path.stat().st_size == 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns)
+        if is_new:
+            self._writer.writeheader()
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """Writes one Parquet part file per run into a directory, one row group per batch"""
+
+    def __init__(self, directory: Path, top_k: int):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet output needs pyarrow: pip install pyarrow")
+
+        self._pa = pa
+        self.columns = _columns(top_k)
+        fields = []
+        for column in self.columns:
+            is_float = column == "confidence" or column.endswith("_probability")
+            fields.append(pa.field(column, pa.float32() if is_float else pa.string()))
+        self._schema = pa.schema(fields)
+
+        directory.mkdir(parents=True, exist_ok=True)
+        part_path = directory / f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.parquet"
+        self._writer = pq.ParquetWriter(str(part_path), self._schema)
+
+    def write(self, rows: list):
+        table = self._pa.Table.from_pylist(rows, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+# ==================== CLASSIFICATION LOOP ====================
+def classify_directory(input_dir: Path, writer, manifest: ProcessedManifest, workers: int,
+                       batch_size: int, top_k: int, log_every: int = 10) -> dict:
+    """
+    Classify every not-yet-processed image under input_dir.
+
+    Decoding runs ahead in the process pool (bounded to a few batches in flight)
+    while the main process runs batched forward passes.
+
+    Returns:
+        dict: Counts and images/sec of this run
+    """
+    from components.ml_model_connector import load_plant_disease_model, predict_pixel_values
+
+    processor, model = load_plant_disease_model()
+    if model is None:
+        raise SystemExit("❌ Model could not be loaded")
+    if not hasattr(processor, "pack_crops"):
+        raise SystemExit("❌ Bulk classification needs the fast preprocessing path (AGRIDETECT_FAST_PREPROCESSING=1)")
+
+    all_images = find_images(input_dir)
+    pending = [path for path in all_images if path.relative_to(input_dir).as_posix() not in manifest.done]
+
+    print(f"📁 {len(all_images)} images found, {len(all_images) - len(pending)} already processed, {len(pending)} to go")
+    if not pending:
+        return {"processed": 0, "failed": 0, "seconds": 0.0, "images_per_second": 0.0}
+
+    batch_buffer = processor.allocate_batch(batch_size)
+    max_in_flight = batch_size * 4
+    processed = failed = batches = 0
+    started = time.perf_counter()
+
+    def flush(batch):
+        nonlocal processed, failed
+        rows = []
+        decoded = [(path, crop) for path, crop, error in batch if crop is not None]
+
+        results = iter(predict_pixel_values(processor.pack_crops([crop for _, crop in decoded], batch_buffer),
+                                            model, top_k)) if decoded else iter(())
+
+        for path, crop, error in batch:
+            row = {column: None for column in writer.columns}
+            row["path"] = Path(path).relative_to(input_dir).as_posix()
+            if crop is None:
+                row["error"] = error
+                failed += 1
+            else:
+                result = next(results)
+                row["predicted_disease"] = result.predicted_disease
+                row["confidence"] = result.confidence
+                for rank, (label, prob) in enumerate(result.top(), 1):
+                    row[f"top{rank}_label"] = label
+                    row[f"top{rank}_probability"] = prob
+            rows.append(row)
+
+        # Output first, manifest second: a crash in between only repeats rows on resume.
+        # Failed files are retried on resume, but only their first failure gets a row.
+        rows_out = [row for row in rows if row["error"] is None or row["path"] not in manifest.failed]
+        if rows_out:
+            writer.write(rows_out)
+        manifest.add([row["path"] for row in rows_out if row["error"] is None])
+        manifest.add([row["path"] for row in rows_out if row["error"] is not None], failed=True)
+        processed += len(rows)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(processor.spec.to_dict(),)) as pool:
+        in_flight = deque()
+        queue = iter(pending)
+        batch = []
+
+        while True:
+            while len(in_flight) < max_in_flight:
+                path = next(queue, None)
+                if path is None:
+                    break
+                in_flight.append(pool.submit(_decode_crop, str(path)))
+            if not in_flight:
+                break
+
+            batch.append(in_flight.popleft().result())
+            if len(batch) == batch_size:
+                flush(batch)
+                batch = []
+                batches += 1
+                if batches % log_every == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"   📈 {processed}/{len(pending)} images, {processed / elapsed:.1f} images/sec")
+
+        if batch:
+            flush(batch)
+
+    seconds = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "failed": failed,
+        "seconds": seconds,
+        "images_per_second": processed / seconds if seconds else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a directory tree of plant leaf images")
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("--output", type=Path, required=True, help="CSV file or Parquet directory")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None,
+                        help="Output format (default: from the output name)")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help="Processed-files manifest used for resuming (default: <output>.manifest)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Decode processes")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if not args.input_dir.is_dir():
+        raise SystemExit(f"❌ Not a directory: {args.input_dir}")
+
+    # The decode workers produce crops for the fast preprocessing path
+    os.environ["AGRIDETECT_FAST_PREPROCESSING"] = "1"
+
+    output_format = args.format or ("csv" if args.output.suffix.lower() == ".csv" else "parquet")
+    manifest_path = args.manifest or args.output.with_name(args.output.name + ".manifest")
+
+    print("=" * 60)
+    print("🌿 AgroDetect Bulk Classification")
+    print("=" * 60)
+
+    manifest = ProcessedManifest(manifest_path)
+    if output_format == "csv":
+        writer = CsvResultWriter(args.output, args.top_k)
+    else:
+        writer = ParquetResultWriter(args.output, args.top_k)
+
+    try:
+        summary = classify_directory(args.input_dir, writer, manifest, args.workers, args.batch_size, args.top_k)
+    finally:
+        writer.close()
+        manifest.close()
+
+    print("\n" + "=" * 60)
+    print(f"✅ {summary['processed']} images classified ({summary['failed']} unreadable) "
+          f"in {summary['seconds']:.1f} s — {summary['images_per_second']:.1f} images/sec")
+    print(f"📄 Results: {args.output}")
+    print(f"📋 Manifest: {manifest_path}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
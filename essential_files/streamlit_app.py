@@ -9,6 +9,11 @@ import torch
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 import numpy as np
 
+try:
+    from components.model_store import MODEL_STORE_DIR, find_snapshot, load_snapshot
+except ImportError:
+    MODEL_STORE_DIR = find_snapshot = load_snapshot = None
+
 # Page configuration
 st.set_page_config(
     page_title="Plant Disease Classifier",
@@ -26,10 +31,15 @@ This model was trained on 1,600 images across 8 different plant disease categori
 # Model loading with caching
 @st.cache_resource
 def load_model():
-    """Load the trained model and processor from Hugging Face Hub"""
+    """Load the trained model and processor from the local model store or Hugging Face Hub"""
     model_name = "Warrior025/plant-disease-model"
     
     try:
+        # Prefer the checksum-verified local snapshot (python -m components.model_store fetch)
+        snapshot_dir = find_snapshot(MODEL_STORE_DIR, model_name) if find_snapshot else None
+        if snapshot_dir is not None:
+            return load_snapshot(snapshot_dir)
+        
         processor = AutoImageProcessor.from_pretrained(model_name)
         model = AutoModelForImageClassification.from_pretrained(model_name)
         return processor, model
@@ -0,0 +1,224 @@
+"""
+Fallback Classifier - Colour Histogram and Texture Model Without PyTorch
+A small softmax regression over HSV colour histograms and texture statistics of
+a 32x32 thumbnail, trained offline on the local AgriDetect_new_model dataset.
+It serves deterministic predictions in degraded mode (no torch) from a few-KB
+NumPy weight file, in a fraction of a millisecond per image.
+"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_WEIGHTS_PATH = Path(__file__).with_name("fallback_classifier.npz")
+FEATURE_VERSION = 1
+THUMBNAIL_SIZE = 32
+
+# Bits dropped per HSV channel: 16 hue, 8 saturation and 8 value bins
+_HSV_SHIFTS = np.array([4, 5, 5], dtype=np.uint8)
+_HSV_OFFSETS = np.array([0, 16, 24], dtype=np.intp)
+_HISTOGRAM_BINS = 32
+
+
+# ==================== FEATURES ====================
+def thumbnail(image: Image.Image, size: int = THUMBNAIL_SIZE) -> Image.Image:
+    """Shrink an image to size x size, box-reducing large images first"""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    factor = min(image.size) // size
+    if factor > 1:
+        image = image.reduce(factor)
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.BILINEAR)
+    return image
+
+
+def extract_features(image: Image.Image) -> np.ndarray:
+    """
+    Feature vector of one image: 32 HSV histogram bins and 7 texture statistics
+    of the value channel (mean/mean-square gradients and Laplacian, contrast).
+
+    Returns:
+        np.ndarray: float32 vector of length 39
+    """
+    hsv = np.asarray(thumbnail(image).convert("HSV"))
+    pixels = hsv.shape[0] * hsv.shape[1]
+
+    bins = (hsv >> _HSV_SHIFTS).astype(np.intp) + _HSV_OFFSETS
+    histogram = np.bincount(bins.ravel(), minlength=_HISTOGRAM_BINS) / pixels
+
+    value = hsv[..., 2].astype(np.float32) * (1 / 255)
+    grad_x = (value[:, 1:] - value[:, :-1]).ravel()
+    grad_y = (value[1:, :] - value[:-1, :]).ravel()
+    laplacian = (4 * value[1:-1, 1:-1] - value[:-2, 1:-1] - value[2:, 1:-1]
+                 - value[1:-1, :-2] - value[1:-1, 2:]).ravel()
+    mean_value = value.mean()
+
+    texture = np.array([
+        np.abs(grad_x).mean(),
+        np.abs(grad_y).mean(),
+        grad_x @ grad_x / grad_x.size,
+        grad_y @ grad_y / grad_y.size,
+        np.abs(laplacian).mean(),
+        laplacian @ laplacian / laplacian.size,
+        float((value * value).mean() - mean_value * mean_value)
+    ])
+    return np.concatenate([histogram, texture]).astype(np.float32)
+
+
+# ==================== MODEL ====================
+class FallbackClassifier:
+    """
+    Softmax regression on extract_features, with the feature standardization
+    folded into the weights so inference is one small matrix-vector product.
+    ``temperature`` scales the logits so confidences are calibrated.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels, metadata: dict = None,
+                 temperature: float = 1.0):
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+        self.metadata = metadata or {}
+        self.temperature = float(temperature)
+
+    def logits(self, image: Image.Image) -> np.ndarray:
+        """Uncalibrated class scores for one image"""
+        return extract_features(image) @ self.weights + self.bias
+
+    def predict_proba(self, image: Image.Image) -> np.ndarray:
+        """Calibrated class probabilities (float32, label order) for one image"""
+        return _softmax(self.logits(image) / self.temperature)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels),
+            temperature=self.temperature,
+            feature_version=FEATURE_VERSION,
+            **{key: np.asarray(value) for key, value in self.metadata.items()}
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_WEIGHTS_PATH) -> "FallbackClassifier":
+        """
+        Load a weight file written by train_fallback_classifier.
+
+        Raises:
+            ValueError: If the file was written for a different feature layout
+        """
+        with np.load(path) as data:
+            if int(data["feature_version"]) != FEATURE_VERSION:
+                raise ValueError(f"{path} was trained on feature version {int(data['feature_version'])}, "
+                                 f"this code computes version {FEATURE_VERSION}")
+            metadata = {key: data[key].item() for key in data.files
+                        if key not in ("weights", "bias", "labels", "temperature", "feature_version")}
+            temperature = float(data["temperature"]) if "temperature" in data.files else 1.0
+            return cls(data["weights"], data["bias"], data["labels"].tolist(), metadata, temperature)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+# ==================== TRAINING ====================
+def train_fallback_classifier(train_items, labels, epochs: int = 3000, learning_rate: float = 0.5,
+                              l2: float = 1e-3) -> FallbackClassifier:
+    """
+    Fit the softmax regression with full-batch gradient descent (deterministic).
+
+    Args:
+        train_items: List of (image path, class index) pairs
+        labels: Class names, indexed by class index
+        epochs: Gradient descent steps
+        learning_rate: Step size on standardized features
+        l2: Weight decay
+
+    Returns:
+        FallbackClassifier
+    """
+    features = np.stack([extract_features(Image.open(path)) for path, _ in train_items])
+    targets = np.eye(len(labels), dtype=np.float32)[[idx for _, idx in train_items]]
+
+    mean = features.mean(axis=0)
+    std = features.std(axis=0) + 1e-6
+    standardized = (features - mean) / std
+
+    weights = np.zeros((features.shape[1], len(labels)), dtype=np.float32)
+    bias = np.zeros(len(labels), dtype=np.float32)
+    for _ in range(epochs):
+        logits = standardized @ weights + bias
+        probabilities = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        gradient = (probabilities - targets) / len(features)
+        weights -= learning_rate * (standardized.T @ gradient + l2 * weights)
+        bias -= learning_rate * gradient.sum(axis=0)
+
+    # Fold standardization into the weights: ((x - mean) / std) @ W == x @ (W / std) - (mean / std) @ W
+    folded_weights = weights / std[:, None]
+    folded_bias = bias - (mean / std) @ weights
+    return FallbackClassifier(folded_weights, folded_bias, labels, {"train_images": len(train_items)})
+
+
+def fit_temperature(classifier: FallbackClassifier, items) -> float:
+    """
+    Temperature scaling: pick the logit temperature minimizing the negative
+    log-likelihood on held-out (image path, class index) pairs, so the top
+    probability can be used as a confidence threshold.
+    """
+    logits = np.stack([classifier.logits(Image.open(path)) for path, _ in items]).astype(np.float64)
+    targets = np.array([idx for _, idx in items])
+
+    best_temperature, best_nll = 1.0, np.inf
+    for temperature in np.geomspace(0.25, 4.0, 81):
+        probabilities = _softmax(logits / temperature)
+        nll = -np.log(probabilities[np.arange(len(targets)), targets] + 1e-12).mean()
+        if nll < best_nll:
+            best_temperature, best_nll = float(temperature), nll
+    return best_temperature
+
+
+def evaluate(classifier: FallbackClassifier, items) -> float:
+    """Top-1 accuracy on (image path, class index) pairs"""
+    correct = sum(int(np.argmax(classifier.predict_proba(Image.open(path)))) == idx for path, idx in items)
+    return correct / max(1, len(items))
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from components.ml_model_connector import get_dataset_split_path, list_dataset_images
+
+    parser = argparse.ArgumentParser(description="Train the colour/texture fallback classifier on the local dataset")
+    parser.add_argument("--output", default=str(DEFAULT_WEIGHTS_PATH))
+    parser.add_argument("--epochs", type=int, default=3000)
+    args = parser.parse_args()
+
+    class_names = sorted(path.name for path in get_dataset_split_path("train").iterdir() if path.is_dir())
+    train_items = list_dataset_images("train")
+    valid_items = list_dataset_images("valid")
+    if not train_items:
+        raise SystemExit("❌ No training images found")
+
+    classifier = train_fallback_classifier(train_items, class_names, epochs=args.epochs)
+    classifier.temperature = fit_temperature(classifier, valid_items)
+    classifier.metadata["valid_accuracy"] = evaluate(classifier, valid_items)
+    classifier.save(args.output)
+
+    image = Image.open(valid_items[0][0]).convert("RGB")
+    started = time.perf_counter()
+    for _ in range(1000):
+        classifier.predict_proba(image)
+    per_image_ms = time.perf_counter() - started  # seconds for 1000 images == ms per image
+
+    print(f"✅ Fallback classifier written to {args.output}")
+    print(f"   Validation accuracy: {classifier.metadata['valid_accuracy']:.1%} on {len(valid_items)} images")
+    print(f"   Calibrated temperature: {classifier.temperature:.3f}")
+    print(f"   Inference: {per_image_ms:.3f} ms per image")
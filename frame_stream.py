@@ -0,0 +1,188 @@
+"""
+Frame Stream - Video and Frame-Sequence Inference With De-Duplication
+Turns a video file or a sequence of frames into a timeline of detections:
+frames are sampled adaptively (less often while the camera is still),
+near-duplicates are dropped by perceptual hash (dHash), and the remaining
+frames are classified in batches. Results are yielded as they are produced.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# ==================== PERCEPTUAL HASH ====================
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: sign of horizontal gradients on a (hash_size+1) x hash_size
+    grayscale thumbnail, packed into a hash_size**2-bit integer.
+    Small camera shake or compression noise changes only a few bits.
+    """
+    small = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# ==================== FRAME SOURCES ====================
+def iter_video_frames(path):
+    """
+    Frames of a video as (frame index, timestamp in seconds, load) tuples.
+    ``load()`` decodes the frame on demand (it must be called before the next
+    frame is requested), so frames skipped by the sampler are only demuxed,
+    never decoded to pixels.
+
+    Uses OpenCV when installed (pip install opencv-python-headless); animated
+    GIF/WebP/TIFF files are read with Pillow.
+    """
+    try:
+        import cv2
+    except ImportError:
+        cv2 = None
+
+    if cv2 is not None:
+        capture = cv2.VideoCapture(str(path))
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        try:
+            index = 0
+            while capture.grab():
+                def load(capture=capture):
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        raise ValueError("Frame could not be decoded")
+                    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                yield index, index / fps, load
+                index += 1
+        finally:
+            capture.release()
+        return
+
+    with Image.open(path) as video:
+        if getattr(video, "n_frames", 1) <= 1:
+            raise ValueError("Video decoding needs OpenCV: pip install opencv-python-headless")
+        timestamp = 0.0
+        for index, frame in enumerate(ImageSequence.Iterator(video)):
+            yield index, timestamp, lambda frame=frame: frame.convert("RGB")
+            timestamp += frame.info.get("duration", 100) / 1000
+
+
+def iter_image_frames(frames, fps: float = 30.0):
+    """
+    Frames from image files (a folder or a list of paths) or PIL images, as
+    (frame index, timestamp, load) tuples; timestamps assume ``fps``.
+    """
+    if isinstance(frames, (str, os.PathLike)):
+        frames = sorted(path for path in Path(frames).iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+
+    for index, frame in enumerate(frames):
+        if isinstance(frame, Image.Image):
+            load = (lambda frame=frame: frame if frame.mode == "RGB" else frame.convert("RGB"))
+        else:
+            load = (lambda frame=frame: Image.open(frame).convert("RGB"))
+        yield index, index / fps, load
+
+
+# ==================== STREAMING ====================
+class AdaptiveSampler:
+    """
+    Decides which frames to look at.
+
+    Starts at one frame every ``min_interval`` seconds. Every near-duplicate
+    doubles the interval (up to ``max_interval``), so a camera held still
+    costs little; any real change resets it.
+    """
+
+    def __init__(self, min_interval: float = 0.2, max_interval: float = 2.0):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+        self._next_time = 0.0
+
+    def wants(self, timestamp: float) -> bool:
+        return timestamp >= self._next_time
+
+    def update(self, timestamp: float, duplicate: bool):
+        if duplicate:
+            self.interval = min(self.interval * 2, self.max_interval)
+        else:
+            self.interval = self.min_interval
+        self._next_time = timestamp + self.interval
+
+
+def stream_detections(frames, classify_batch, batch_size: int = 8, min_interval: float = 0.2,
+                      max_interval: float = 2.0, duplicate_distance: int = 6, stats: dict = None):
+    """
+    Classify a frame stream and yield one timeline entry per analyzed frame.
+
+    Args:
+        frames: Iterable of (frame index, timestamp, load) tuples, e.g. from
+            iter_video_frames or iter_image_frames
+        classify_batch: Callable taking a list of PIL images and returning one
+            PredictionResult per image
+        batch_size: Frames per forward pass
+        min_interval: Shortest time between sampled frames, in seconds
+        max_interval: Longest time between sampled frames while nothing changes
+        duplicate_distance: Maximum dHash Hamming distance (of 64 bits) for a
+            frame to count as a near-duplicate of the last analyzed frame
+        stats: Optional dict updated in place with frame counters
+
+    Yields:
+        dict: frame_index, timestamp, predicted_disease, confidence,
+              predicted_class_idx and frames_skipped (since the previous entry)
+    """
+    stats = stats if stats is not None else {}
+    stats.update(frames_read=0, frames_sampled=0, duplicates_skipped=0, frames_classified=0)
+
+    sampler = AdaptiveSampler(min_interval, max_interval)
+    last_hash = None
+    skipped = 0
+    pending = []
+
+    def flush():
+        results = classify_batch([image for image, _, _, _ in pending])
+        for (_, index, timestamp, skipped_before), result in zip(pending, results):
+            yield {
+                "frame_index": index,
+                "timestamp": timestamp,
+                "predicted_disease": result.predicted_disease,
+                "confidence": result.confidence,
+                "predicted_class_idx": result.predicted_class_idx,
+                "frames_skipped": skipped_before
+            }
+        stats["frames_classified"] += len(pending)
+        pending.clear()
+
+    for index, timestamp, load in frames:
+        stats["frames_read"] += 1
+        if not sampler.wants(timestamp):
+            skipped += 1
+            continue
+
+        image = load()
+        stats["frames_sampled"] += 1
+        frame_hash = dhash(image)
+        duplicate = last_hash is not None and hamming_distance(frame_hash, last_hash) <= duplicate_distance
+        sampler.update(timestamp, duplicate)
+
+        if duplicate:
+            stats["duplicates_skipped"] += 1
+            skipped += 1
+            continue
+
+        last_hash = frame_hash
+        pending.append((image, index, timestamp, skipped))
+        skipped = 0
+        if len(pending) >= batch_size:
+            yield from flush()
+
+    if pending:
+        yield from flush()
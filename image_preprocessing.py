@@ -0,0 +1,226 @@
+"""
+Image Preprocessing - Model-Specific Fast Path
+Reproduces the classifier's AutoImageProcessor (resize, center crop, rescale,
+normalize) from its saved constants without the generic transformers pipeline:
+JPEG draft-mode decoding, one crop+resize per image and a fused
+uint8 -> float normalization written straight into the batch tensor
+"""
+
+import math
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class PreprocessSpec:
+    """Preprocessing constants of the classifier, as saved in preprocessor_config.json"""
+
+    resize_shortest_edge: int
+    crop_size: int
+    image_mean: tuple
+    image_std: tuple
+    rescale_factor: float = 1 / 255
+    resample: int = Image.BICUBIC
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "PreprocessSpec":
+        return cls(**{**values, "image_mean": tuple(values["image_mean"]), "image_std": tuple(values["image_std"])})
+
+
+def spec_from_processor(processor) -> PreprocessSpec:
+    """
+    Read the preprocessing constants of a Hugging Face image processor.
+
+    Supports the ConvNext-style processor saved with the fine-tuned ResNet-50
+    (shortest edge resized to size / crop_pct, then center cropped) and plain
+    fixed-size processors.
+
+    Raises:
+        ValueError: If the processor uses a resize rule this fast path does not implement
+    """
+    size = processor.size
+    if "shortest_edge" in size:
+        shortest_edge = size["shortest_edge"]
+        crop_pct = getattr(processor, "crop_pct", None) or 1.0
+        if shortest_edge >= 384:
+            raise ValueError("Square warping processors (shortest_edge >= 384) are not supported")
+        resize_shortest_edge = int(shortest_edge / crop_pct)
+        crop_size = shortest_edge
+    elif "height" in size and size["height"] == size["width"]:
+        resize_shortest_edge = crop_size = size["height"]
+    else:
+        raise ValueError(f"Unsupported processor size rule: {size}")
+
+    return PreprocessSpec(
+        resize_shortest_edge=int(resize_shortest_edge),
+        crop_size=int(crop_size),
+        image_mean=tuple(float(v) for v in processor.image_mean),
+        image_std=tuple(float(v) for v in processor.image_std),
+        rescale_factor=float(getattr(processor, "rescale_factor", 1 / 255)),
+        resample=int(getattr(processor, "resample", Image.BICUBIC))
+    )
+
+
+# ==================== DECODING ====================
+def decode_image(source, min_edge: int = 256) -> Image.Image:
+    """
+    Open an image, letting the JPEG decoder downscale large photos while decoding.
+
+    Draft mode makes libjpeg decode at 1/2, 1/4 or 1/8 scale, so a 12 MP camera
+    photo is never fully materialized when only a small version is needed.
+    The shortest edge is kept at or above ``min_edge``.
+
+    Args:
+        source: File path or file-like object (e.g. a Streamlit UploadedFile)
+        min_edge: Smallest acceptable shortest edge after decoding
+
+    Returns:
+        PIL.Image.Image: Decoded RGB image
+    """
+    image = Image.open(source)
+
+    if image.format == "JPEG":
+        width, height = image.size
+        scale = min_edge / min(width, height)
+        if scale < 1:
+            image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+# ==================== RESIZE ====================
+def crop_box(size: tuple, spec: PreprocessSpec) -> tuple:
+    """
+    Region of the source image that ends up in the model input.
+
+    The processor resizes the shortest edge to ``resize_shortest_edge`` and
+    then center crops ``crop_size``; mapping that crop back to source
+    coordinates lets one resize call do both steps.
+    """
+    width, height = size
+    short, long = (width, height) if width <= height else (height, width)
+    new_long = int(spec.resize_shortest_edge * long / short)
+    new_width, new_height = (spec.resize_shortest_edge, new_long) if width <= height else (new_long, spec.resize_shortest_edge)
+
+    top = (new_height - spec.crop_size) // 2
+    left = (new_width - spec.crop_size) // 2
+    scale_x = width / new_width
+    scale_y = height / new_height
+    return (
+        left * scale_x,
+        top * scale_y,
+        (left + spec.crop_size) * scale_x,
+        (top + spec.crop_size) * scale_y
+    )
+
+
+def resize_and_crop(image: Image.Image, spec: PreprocessSpec) -> np.ndarray:
+    """
+    Resize the shortest edge and center crop in a single PIL resize call.
+
+    Returns:
+        np.ndarray: uint8 array of shape (crop_size, crop_size, 3)
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    image = image.resize(
+        (spec.crop_size, spec.crop_size),
+        resample=spec.resample,
+        box=crop_box(image.size, spec),
+        reducing_gap=None
+    )
+    # Writable copy so torch.from_numpy can wrap it without a warning
+    return np.array(image, dtype=np.uint8)
+
+
+# ==================== BATCHING ====================
+class FastImageProcessor:
+    """
+    Drop-in replacement for the classifier's AutoImageProcessor call.
+
+    Each image is cropped and resized once as uint8, copied into its slot of the
+    batch tensor, and the whole batch is normalized with one fused
+    ``pixels * (rescale / std) + (-mean / std)`` kernel.
+
+    With ``normalize=False`` it returns the cropped uint8 pixels, for models
+    that normalize internally (the exported TorchScript classifier).
+    """
+
+    def __init__(self, spec: PreprocessSpec, normalize: bool = True):
+        import torch
+
+        self.spec = spec
+        self.normalize = normalize
+        std = torch.tensor(spec.image_std, dtype=torch.float32).view(3, 1, 1)
+        mean = torch.tensor(spec.image_mean, dtype=torch.float32).view(3, 1, 1)
+        self._scale = spec.rescale_factor / std
+        self._shift = -mean / std
+
+    def allocate_batch(self, batch_size: int):
+        """Allocate a reusable batch tensor for preprocess_into"""
+        import torch
+
+        dtype = torch.float32 if self.normalize else torch.uint8
+        return torch.empty((batch_size, 3, self.spec.crop_size, self.spec.crop_size), dtype=dtype)
+
+    def preprocess_into(self, images, out):
+        """
+        Preprocess images into a preallocated batch tensor.
+
+        Args:
+            images: List of PIL Image objects
+            out: Tensor from allocate_batch with at least len(images) rows
+
+        Returns:
+            torch.Tensor: View of ``out`` holding exactly len(images) rows
+        """
+        return self.pack_crops([resize_and_crop(image, self.spec) for image in images], out)
+
+    def pack_crops(self, crops, out):
+        """
+        Copy already cropped uint8 images (from resize_and_crop) into a batch tensor and normalize it.
+
+        Args:
+            crops: List of uint8 arrays of shape (crop_size, crop_size, 3)
+            out: Tensor from allocate_batch with at least len(crops) rows
+
+        Returns:
+            torch.Tensor: View of ``out`` holding exactly len(crops) rows
+        """
+        import torch
+
+        if len(crops) > out.shape[0]:
+            raise ValueError(f"Batch of {len(crops)} images does not fit a buffer of {out.shape[0]}")
+
+        batch = out[:len(crops)]
+        for slot, crop in zip(batch, crops):
+            # HWC uint8 -> CHW (float) conversion happens inside the copy
+            slot.copy_(torch.from_numpy(crop).permute(2, 0, 1))
+
+        if self.normalize:
+            torch.addcmul(self._shift, batch, self._scale, out=batch)
+        return batch
+
+    def __call__(self, images, return_tensors: str = "pt") -> dict:
+        if isinstance(images, Image.Image):
+            images = [images]
+        return {"pixel_values": self.preprocess_into(images, self.allocate_batch(len(images)))}
+
+
+def fast_processor_for(processor):
+    """
+    Wrap a Hugging Face image processor with the fast path when its resize rule is supported.
+
+    Returns:
+        FastImageProcessor, or the original processor if it cannot be reproduced
+    """
+    try:
+        return FastImageProcessor(spec_from_processor(processor))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return processor
@@ -0,0 +1,119 @@
+"""
+Image Screening - Cheap Leaf / Not-a-Leaf Pre-Check
+Rejects obviously unusable uploads (documents, selfies, black or blown-out
+frames, heavily blurred shots) from a small thumbnail with a few vectorized
+NumPy statistics, before any model work is done
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+SCREEN_EDGE = 96
+
+
+@dataclass(frozen=True)
+class ScreeningThresholds:
+    """
+    Rejection limits. The defaults keep every image of the local
+    AgriDetect_new_model dataset (train + valid) with a wide margin.
+    """
+
+    min_leaf_score: float = 0.03
+    min_sharpness: float = 40.0
+    min_brightness: float = 20.0
+    max_brightness: float = 250.0
+    max_clipped_fraction: float = 0.9
+
+
+DEFAULT_THRESHOLDS = ScreeningThresholds()
+
+
+def screen_thumbnail(image: Image.Image, edge: int = SCREEN_EDGE) -> Image.Image:
+    """Downscale to a shortest edge of ``edge`` pixels, box-reducing large images first"""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    factor = min(image.size) // edge
+    if factor > 1:
+        image = image.reduce(factor)
+
+    width, height = image.size
+    scale = edge / min(width, height)
+    if scale < 1:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+    return image
+
+
+def foliage_masks(hsv: np.ndarray) -> tuple:
+    """
+    Green-foliage and yellow/brown lesion pixel masks of an HSV array.
+    PIL hue is 0-255: 25-120 covers yellow-green to teal, 14-25 orange-brown lesions.
+
+    Returns:
+        tuple: (green mask, lesion mask) boolean arrays
+    """
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    lit = value >= 30
+    green = (hue >= 25) & (hue <= 120) & (saturation >= 20) & lit
+    lesion = (hue >= 14) & (hue < 25) & (saturation >= 40) & lit
+    return green, lesion
+
+
+def image_statistics(image: Image.Image) -> dict:
+    """
+    Screening statistics of one image, computed on a small thumbnail.
+
+    Returns:
+        dict: green_ratio (green foliage pixels), lesion_ratio (yellow/brown
+              pixels), leaf_score, sharpness (variance of the Laplacian),
+              brightness (mean luma, 0-255) and clipped_fraction (pure black or white pixels)
+    """
+    thumbnail = screen_thumbnail(image)
+    green, lesion = foliage_masks(np.asarray(thumbnail.convert("HSV")))
+    luma = np.asarray(thumbnail.convert("L"), dtype=np.float32)
+
+    green_ratio = float(green.mean())
+    lesion_ratio = float(lesion.mean())
+    # Diseased tissue only counts next to some foliage, so skin tones alone do not pass
+    leaf_score = min(1.0, green_ratio + 0.5 * lesion_ratio) if green_ratio >= 0.01 else green_ratio
+
+    laplacian = (4 * luma[1:-1, 1:-1] - luma[:-2, 1:-1] - luma[2:, 1:-1]
+                 - luma[1:-1, :-2] - luma[1:-1, 2:])
+
+    return {
+        "green_ratio": green_ratio,
+        "lesion_ratio": lesion_ratio,
+        "leaf_score": leaf_score,
+        "sharpness": float(laplacian.var()),
+        "brightness": float(luma.mean()),
+        "clipped_fraction": float(((luma < 10) | (luma > 245)).mean())
+    }
+
+
+def screen_image(image: Image.Image, thresholds: ScreeningThresholds = DEFAULT_THRESHOLDS) -> dict:
+    """
+    Decide whether an image is worth sending to the classifier.
+
+    Args:
+        image: PIL Image object
+        thresholds: Rejection limits
+
+    Returns:
+        dict: passed (bool), reason (user-facing message, None if passed) and the statistics
+    """
+    stats = image_statistics(image)
+
+    if stats["brightness"] < thresholds.min_brightness:
+        reason = "The photo is too dark. Please retake it in daylight or better lighting."
+    elif stats["brightness"] > thresholds.max_brightness or stats["clipped_fraction"] > thresholds.max_clipped_fraction:
+        reason = "The photo is overexposed. Please avoid direct flash or strong backlight."
+    elif stats["leaf_score"] < thresholds.min_leaf_score:
+        reason = "No plant leaf detected. Please upload a close-up photo of a single leaf."
+    elif stats["sharpness"] < thresholds.min_sharpness:
+        reason = "The photo is too blurry. Please hold the camera steady and focus on the leaf."
+    else:
+        reason = None
+
+    return {"passed": reason is None, "reason": reason, "statistics": stats}
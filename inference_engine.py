@@ -0,0 +1,153 @@
+"""
+Inference Engine - Cross-Session Micro-Batching
+Collects prediction requests from every Streamlit session into one shared queue
+and runs them through the classifier as dynamic micro-batches
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class MicroBatchInferenceEngine:
+    """
+    Background worker that groups concurrent prediction requests into batches.
+
+    Requests are queued by any thread (one per Streamlit session) and picked up
+    by a single worker thread. The worker waits at most ``max_wait_ms`` after
+    the first request for more requests to arrive, then runs one batched
+    forward pass of up to ``max_batch_size`` images and resolves a Future for
+    each request.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = 16, max_wait_ms: float = 15.0):
+        """
+        Args:
+            run_batch: Callable taking a list of PIL images and returning one
+                prediction result per image, in the same order
+            max_batch_size: Maximum number of images per forward pass
+            max_wait_ms: Maximum time to wait for a batch to fill up
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "largest_batch": 0, "busy_seconds": 0.0}
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._worker_loop,
+            name="agridetect-inference-engine",
+            daemon=True
+        )
+        self._thread.start()
+
+    # ==================== PUBLIC API ====================
+    def submit(self, image) -> Future:
+        """
+        Queue an image for prediction.
+
+        Args:
+            image: PIL Image object
+
+        Returns:
+            Future: Resolves to the PredictionResult
+        """
+        if self._closed:
+            raise RuntimeError("Inference engine has been shut down")
+
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def predict(self, image, timeout: float = None):
+        """
+        Queue an image and block until its prediction is ready.
+
+        Args:
+            image: PIL Image object
+            timeout: Seconds to wait, or None to wait forever
+
+        Returns:
+            PredictionResult for the image
+
+        Raises:
+            TimeoutError: If no result arrived in time; the request is then
+                cancelled so the worker skips it if it is still queued
+        """
+        future = self.submit(image)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stats(self) -> dict:
+        """Get throughput counters for monitoring and batch size tuning"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker after the requests already queued have been served"""
+        self._closed = True
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    # ==================== WORKER ====================
+    def _worker_loop(self):
+        while True:
+            batch, stop = self._collect_batch()
+            if batch:
+                self._run(batch)
+            if stop:
+                return
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self, batch):
+        # Drop requests whose caller already gave up (e.g. a Streamlit rerun)
+        batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            results = self.run_batch([image for image, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            self._stats["busy_seconds"] += time.perf_counter() - started
@@ -0,0 +1,198 @@
+"""
+Inference Profiler - Per-Request Stage Timings
+A RequestTrace follows one upload from decode to the rendered Results page and
+records how long each stage took (monotonic perf_counter timings). Finished
+traces are aggregated into in-process latency histograms per stage, and the
+last few are kept for the debug panel. Optionally, the model's batches can be
+recorded with the PyTorch profiler as Chrome trace files.
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Histogram bucket upper bounds in milliseconds (log-spaced, ~13% apart), plus overflow
+HISTOGRAM_BOUNDS_MS = np.geomspace(0.01, 120000.0, 128)
+
+_current_trace = contextvars.ContextVar("agridetect_request_trace", default=None)
+
+
+# ==================== TRACES ====================
+class RequestTrace:
+    """
+    Stage timings of one request.
+
+    Usage:
+        trace = RequestTrace()
+        with trace.stage("decode"):
+            image = load_image(upload)
+        ...
+        trace.finish()
+    """
+
+    def __init__(self, request_id: str = None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.stages = []
+        self.meta = {}
+        self.total_ms = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one stage"""
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add(name, 1000.0 * (time.perf_counter() - started))
+
+    def add(self, name: str, milliseconds: float):
+        """Record a stage measured elsewhere (e.g. on the inference worker thread)"""
+        self.stages.append((name, float(milliseconds)))
+
+    def finish(self) -> "RequestTrace":
+        """Stop the request clock; time not covered by a stage is reported as ``other``"""
+        if self.total_ms is None:
+            self.total_ms = 1000.0 * (time.perf_counter() - self._started)
+        return self
+
+    def breakdown(self) -> dict:
+        """Milliseconds per stage name, in first-seen order (repeated stages are summed)"""
+        totals = {}
+        for name, milliseconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + milliseconds
+        if self.total_ms is not None:
+            totals["other"] = max(0.0, self.total_ms - sum(milliseconds for _, milliseconds in self.stages))
+        return totals
+
+    def as_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "stages": self.breakdown(),
+            "meta": dict(self.meta)
+        }
+
+
+@contextmanager
+def active_trace(trace):
+    """Make ``trace`` the current trace of this thread, so library code can add stages to it"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    """The trace activated by the caller, or None outside a traced request"""
+    return _current_trace.get()
+
+
+@contextmanager
+def traced_stage(name: str):
+    """Time the enclosed block as a stage of the current trace (no-op without one)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.stage(name):
+        yield trace
+
+
+# ==================== AGGREGATION ====================
+class LatencyHistogram:
+    """Fixed log-spaced buckets; constant memory however many requests are recorded"""
+
+    def __init__(self):
+        self.counts = np.zeros(len(HISTOGRAM_BOUNDS_MS) + 1, dtype=np.int64)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, milliseconds: float):
+        self.counts[np.searchsorted(HISTOGRAM_BOUNDS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (capped at the largest value seen)"""
+        if not self.count:
+            return None
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * self.count))
+        bound = HISTOGRAM_BOUNDS_MS[bucket] if bucket < len(HISTOGRAM_BOUNDS_MS) else self.max_ms
+        return float(min(bound, self.max_ms))
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms if self.count else None
+        }
+
+
+class InferenceProfiler:
+    """Process-wide per-stage histograms plus the most recent traces"""
+
+    def __init__(self, recent: int = 20):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._recent = deque(maxlen=max(1, int(recent)))
+
+    def record(self, trace: RequestTrace):
+        """Add a request's stages (and its total as ``total``) to the histograms"""
+        entry = trace.finish().as_dict()
+        with self._lock:
+            for name, milliseconds in list(entry["stages"].items()) + [("total", entry["total_ms"])]:
+                self._histograms.setdefault(name, LatencyHistogram()).record(milliseconds)
+            self._recent.append(entry)
+
+    def recent(self) -> list:
+        """Breakdowns of the last requests, newest first"""
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def summary(self) -> dict:
+        """Histogram summary (count, mean, p50, p95, p99, max in ms) per stage"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+
+# ==================== TORCH PROFILER ====================
+@contextmanager
+def torch_profiled(output_dir):
+    """
+    Record the enclosed block with the PyTorch profiler (CPU operators) and
+    write a Chrome trace (chrome://tracing, Perfetto) to ``output_dir``.
+    Does nothing when output_dir is empty.
+
+    Yields:
+        dict: Gets ``path`` of the written trace file once the block has finished
+    """
+    info = {}
+    if not output_dir:
+        yield info
+        return
+
+    from torch.profiler import ProfilerActivity, profile
+
+    with profile(activities=[ProfilerActivity.CPU]) as prof:
+        yield info
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"inference-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.json"
+    prof.export_chrome_trace(str(path))
+    info["path"] = str(path)
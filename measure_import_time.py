@@ -0,0 +1,118 @@
+"""
+Import-Time Measurement for AgroDetect AI
+Times the module-level imports of every page in a fresh Python process, i.e.
+what each page costs a new Streamlit worker before it renders anything.
+Save a run with --save and pass it to a later run with --baseline to print
+the before/after for each page.
+
+Usage (from the app root, the folder holding components/ and pages/, so that
+it is on the import path; otherwise add it to PYTHONPATH):
+    python -m components.measure_import_time --save before.json
+    python -m components.measure_import_time --baseline before.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+IMPORT_TIME_MARKER = "IMPORT_SECONDS="
+APP_ROOT = Path(__file__).parent.parent
+CONNECTOR_MODULE = "components.ml_model_connector"
+
+# Runs in the child process: execute only the page's top-level import statements
+_CHILD_CODE = """
+import ast, sys, time
+target = sys.argv[1]
+if target.endswith(".py"):
+    with open(target, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=target)
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    code = compile(ast.Module(body=imports, type_ignores=[]), target, "exec")
+else:
+    code = compile("import " + target, "<import>", "exec")
+started = time.perf_counter()
+exec(code, {"__name__": "__page__"})
+print("%s" + str(time.perf_counter() - started))
+""" % IMPORT_TIME_MARKER
+
+
+def default_pages_dir() -> Path:
+    """Pages live in <app root>/pages, next to the components package"""
+    return APP_ROOT / "pages"
+
+
+def measure_import(target: str, runs: int = 3) -> dict:
+    """
+    Median import time of a page file or module over fresh interpreter processes.
+
+    Returns:
+        dict: seconds (median) and runs, or error if the imports failed
+    """
+    times = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", _CHILD_CODE, target],
+            # The app root is the child's first import path, so pages resolve components.*
+            cwd=str(APP_ROOT),
+            capture_output=True,
+            text=True
+        )
+        marker_lines = [line for line in completed.stdout.splitlines() if line.startswith(IMPORT_TIME_MARKER)]
+        if completed.returncode != 0 or not marker_lines:
+            error = completed.stderr.strip().splitlines()
+            return {"seconds": None, "runs": len(times), "error": error[-1] if error else "no output"}
+        times.append(float(marker_lines[-1][len(IMPORT_TIME_MARKER):]))
+    return {"seconds": statistics.median(times), "runs": len(times)}
+
+
+def _format_seconds(seconds) -> str:
+    return "   error" if seconds is None else f"{seconds * 1000:8.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-page import time in fresh processes")
+    parser.add_argument("--pages-dir", type=Path, default=None, help="Folder with the page scripts (default: <app root>/pages)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per page (median is reported)")
+    parser.add_argument("--save", type=Path, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier --save output to compare against")
+    args = parser.parse_args()
+
+    pages_dir = args.pages_dir or default_pages_dir()
+    targets = {path.name: str(path.resolve()) for path in sorted(pages_dir.glob("[0-9]_*.py"))}
+    targets[CONNECTOR_MODULE] = CONNECTOR_MODULE
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else {}
+
+    print("=" * 70)
+    print("⏱️  AgroDetect Page Import Time (ms, median of fresh processes)")
+    print("=" * 70)
+    header = f"{'page':<28}{'before':>9}{'after':>9}{'change':>10}" if baseline else f"{'page':<28}{'import':>9}"
+    print(header)
+
+    results = {}
+    for name, target in targets.items():
+        result = measure_import(target, runs=args.runs)
+        results[name] = result
+
+        line = f"{name:<28}"
+        if baseline:
+            before = baseline.get(name, {}).get("seconds")
+            line += _format_seconds(before) + " " + _format_seconds(result["seconds"])
+            if before and result["seconds"] is not None:
+                line += f"{(result['seconds'] - before) / before:+10.0%}"
+        else:
+            line += _format_seconds(result["seconds"])
+        if result.get("error"):
+            line += f"   ({result['error'][:60]})"
+        print(line)
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n📄 Results saved to {args.save}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
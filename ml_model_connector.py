@@ -5,21 +5,62 @@ Provides safe access to ML models and datasets from AgriDetect-main folder
 
 import streamlit as st
 from pathlib import Path
+import hashlib
+import importlib.util
+from contextlib import nullcontext
+import os
 import sys
+import time
+from types import SimpleNamespace
 from PIL import Image
 import numpy as np
+from components.inference_engine import MicroBatchInferenceEngine
+from components.prediction_cache import PredictionCache, compute_image_digest
+from components.model_store import MODEL_STORE_DIR, find_snapshot, load_snapshot
+from components.image_preprocessing import crop_box, decode_image, fast_processor_for, spec_from_processor
+from components.model_warmup import BackgroundWarmup
+from components.fallback_classifier import FallbackClassifier
+from components.model_cascade import ConfidenceCascade
+from components.image_screening import screen_image
+from components.tiled_inference import classify_tiled, working_image
+from components.frame_stream import iter_image_frames, iter_video_frames, stream_detections
+from components.saliency import ActivationCapture, class_activation_maps, saliency_layers
+from components.embedding_index import INDEX_FILE, EmbeddingIndex, index_dir_name
+from components.shadow_inference import ShadowRunner, ShadowStore
+from components.inference_profiler import InferenceProfiler, current_trace, torch_profiled, traced_stage
+from components.worker_pool import InferenceWorkerPool, PoolBusyError
+from components.shared_weights import attach_shared_model, find_shared_weights, source_fingerprint
+from components.augmented_inference import TestTimeAugmenter
+from components.prediction_result import TOP_K, LabelTable, PredictionResult
+from components.model_registry import (
+    KIND_FOLDER, KIND_HUB, KIND_SNAPSHOT, KIND_TORCHSCRIPT, ModelRegistry, active_pointer_mtime,
+    discover_versions, read_active_pointer
+)
 
-# Try to import PyTorch - make it optional
-TORCH_AVAILABLE = False
-try:
-    import torch
-    from transformers import AutoImageProcessor, AutoModelForImageClassification
-    TORCH_AVAILABLE = True
-except (ImportError, OSError) as e:
-    st.warning(f"⚠️ PyTorch not available: {str(e)[:100]}... Using demo mode.")
-    torch = None
-    AutoImageProcessor = None
-    AutoModelForImageClassification = None
+# PyTorch is optional. Only check that it is installed here; importing torch and
+# transformers takes seconds, so it is deferred to the first model load (see _import_torch)
+TORCH_AVAILABLE = importlib.util.find_spec("torch") is not None and importlib.util.find_spec("transformers") is not None
+
+def _import_torch() -> bool:
+    """
+    Import torch and transformers on first use.
+    A broken installation (e.g. missing Visual C++ runtime DLLs on Windows)
+    only shows up here, and switches the app to demo mode.
+    
+    Returns:
+        bool: True if PyTorch can be used
+    """
+    global TORCH_AVAILABLE
+    if not TORCH_AVAILABLE:
+        return False
+    
+    try:
+        import torch  # noqa: F401
+        import transformers  # noqa: F401
+    except (ImportError, OSError) as e:
+        st.warning(f"⚠️ PyTorch not available: {str(e)[:100]}... Using demo mode.")
+        TORCH_AVAILABLE = False
+    return TORCH_AVAILABLE
 
 # ==================== PATH CONFIGURATION ====================
 def get_project_root():
@@ -38,35 +79,264 @@ def get_scripts_path():
     """Get the scripts folder path"""
     return get_database_path() / "essential_files" / "scripts"
 
+def get_dataset_split_path(split: str):
+    """Get a split folder (train/valid) of the local AgriDetect_new_model dataset"""
+    return get_datasets_path() / "useful_datasets" / "AgriDetect_new_model" / split
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+def list_dataset_images(split: str) -> list:
+    """
+    List the images of a local dataset split.
+    Class folders are sorted, matching DISEASE_CLASSES and the training label ids.
+    
+    Returns:
+        list: (image path, class index) tuples, empty if the split is missing
+    """
+    split_path = get_dataset_split_path(split)
+    if not split_path.is_dir():
+        return []
+    
+    class_dirs = sorted(path for path in split_path.iterdir() if path.is_dir())
+    return [
+        (image_path, class_idx)
+        for class_idx, class_dir in enumerate(class_dirs)
+        for image_path in sorted(class_dir.iterdir())
+        if image_path.suffix.lower() in IMAGE_EXTENSIONS
+    ]
+
 # Add database paths to Python path for imports
 database_path = get_database_path()
 if str(database_path) not in sys.path:
     sys.path.insert(0, str(database_path))
 
 # ==================== MODEL LOADING ====================
+MODEL_NAME = "Warrior025/plant-disease-model"
+
+# Local snapshot store (MODEL_STORE_DIR) written by `python -m components.model_store fetch`. When a
+# snapshot exists the model is read from disk only; AGRIDETECT_OFFLINE=1 forbids the Hub fallback.
+MODEL_OFFLINE = os.getenv("AGRIDETECT_OFFLINE", "0") == "1"
+
+# Frozen TorchScript artifact written by `python -m components.torchscript_export`.
+# When set, it is served instead of the transformers model (fast cold start),
+# unless it is missing or was exported from another revision than the store's
+# CURRENT snapshot; then the snapshot is served and a warning is shown.
+TORCHSCRIPT_PATH = os.getenv("AGRIDETECT_TORCHSCRIPT_PATH", "")
+
+# Replace the generic AutoImageProcessor with the model-specific fast path
+FAST_PREPROCESSING = os.getenv("AGRIDETECT_FAST_PREPROCESSING", "1") == "1"
+
+# Extra folders searched for local training outputs (e.g. plant-disease-model-v2
+# written by train_model_local.py), separated by os.pathsep
+MODEL_DIRS = [
+    Path(path) for path in os.getenv("AGRIDETECT_MODEL_DIRS", "").split(os.pathsep) if path.strip()
+] or [get_project_root(), get_database_path(), get_scripts_path()]
+
+# Version served at startup (an id from list_model_versions()); by default the
+# TorchScript artifact, else the store's CURRENT snapshot, else the Hub model.
+# `python -m components.model_registry promote <id>` rolls out another version
+# to every running server without a restart; promoting a version that failed to
+# load again makes the servers retry it. Setting it pins the version: promotes are
+# then ignored.
+MODEL_VERSION = os.getenv("AGRIDETECT_MODEL_VERSION", "")
+MODEL_POLL_SECONDS = float(os.getenv("AGRIDETECT_MODEL_POLL_SECONDS", "10"))
+
+# Weights published by `python -m components.shared_weights publish` (off unless set).
+# Replicas and inference workers attach to the published copy with mmap (one resident
+# copy per host, no transformers import) when serving the same snapshot or training
+# folder in fp32; a copy published from other source files is ignored.
+SHARED_WEIGHTS_DIR = os.getenv("AGRIDETECT_SHARED_WEIGHTS_DIR", "")
+
+def list_model_versions() -> list:
+    """
+    List the model versions this process can serve.
+    
+    Returns:
+        list: Dicts with id, kind (snapshot/folder/hub/torchscript), path, name and current
+    """
+    versions = discover_versions(MODEL_STORE_DIR, MODEL_DIRS)
+    if TORCHSCRIPT_PATH and Path(TORCHSCRIPT_PATH).is_file():
+        versions.insert(0, {"id": f"torchscript:{TORCHSCRIPT_PATH}", "kind": KIND_TORCHSCRIPT,
+                            "path": TORCHSCRIPT_PATH, "name": Path(TORCHSCRIPT_PATH).name, "current": False})
+    if not MODEL_OFFLINE:
+        versions.append({"id": MODEL_NAME, "kind": KIND_HUB, "path": None, "name": MODEL_NAME, "current": False})
+    return versions
+
+def _default_model_version() -> str:
+    """Version id loaded at startup when AGRIDETECT_MODEL_VERSION is not set"""
+    snapshot_dir = find_snapshot(MODEL_STORE_DIR, MODEL_NAME)
+    if TORCHSCRIPT_PATH and _torchscript_problem(snapshot_dir) is None:
+        return f"torchscript:{TORCHSCRIPT_PATH}"
+    if snapshot_dir is not None:
+        return f"{snapshot_dir.parent.name}@{snapshot_dir.name}"
+    return MODEL_NAME
+
+def _torchscript_problem(snapshot_dir):
+    """Why the configured TorchScript artifact is not served by default, or None if it is"""
+    from components.torchscript_export import check_torchscript_artifact
+    return check_torchscript_artifact(TORCHSCRIPT_PATH, snapshot_dir)
+
+def _load_model_version(version_id: str):
+    """
+    Load one model version, ready to serve (fast preprocessing, optional int8,
+    a warmup forward pass). Raises on failure.
+    
+    Returns:
+        tuple: (processor, model)
+    """
+    versions = {version["id"]: version for version in list_model_versions()}
+    version = versions.get(version_id)
+    if version is None:
+        raise FileNotFoundError(f"Unknown model version {version_id}; available: {', '.join(versions) or 'none'}")
+    
+    shared = None
+    if SHARED_WEIGHTS_DIR and FAST_PREPROCESSING and QUANTIZATION_MODE == "off":
+        shared = find_shared_weights(SHARED_WEIGHTS_DIR, version_id, source_fingerprint(version))
+    
+    if version["kind"] == KIND_TORCHSCRIPT:
+        from components.torchscript_export import load_torchscript_classifier
+        processor, model = load_torchscript_classifier(version["path"])
+    elif shared is not None:
+        processor, model = attach_shared_model(shared)
+    else:
+        if version["kind"] == KIND_SNAPSHOT:
+            processor, model = load_snapshot(version["path"])
+        else:
+            from transformers import AutoImageProcessor, AutoModelForImageClassification
+            local = version["kind"] == KIND_FOLDER
+            source = version["path"] if local else version_id
+            processor = AutoImageProcessor.from_pretrained(source, local_files_only=local)
+            model = AutoModelForImageClassification.from_pretrained(source, local_files_only=local)
+            model.eval()
+        
+        if FAST_PREPROCESSING:
+            processor = fast_processor_for(processor)
+        if QUANTIZATION_MODE != "off":
+            model = _activate_quantization(processor, model)
+    
+    # Requests are swapped onto this version only after its first forward pass
+    _predict_images([Image.new("RGB", (256, 256), (96, 128, 64))], processor, model)
+    return processor, model
+
 @st.cache_resource
-def load_plant_disease_model():
+def get_model_registry():
     """
-    Load the plant disease classification model from Hugging Face Hub.
-    Uses caching to avoid reloading on every interaction.
+    Get the process-wide model registry, with the startup version loaded.
     
     Returns:
-        tuple: (processor, model) or (None, None) if loading fails
+        ModelRegistry: Registry (its current() is None if the startup version failed to load)
     """
-    if not TORCH_AVAILABLE:
+    registry = ModelRegistry(
+        _load_model_version,
+        pointer_reader=None if MODEL_VERSION else (lambda: read_active_pointer(MODEL_STORE_DIR)),
+        poll_interval=MODEL_POLL_SECONDS,
+        pointer_stamp=lambda: active_pointer_mtime(MODEL_STORE_DIR)
+    )
+    if not _import_torch():
         st.info("💡 PyTorch not available. Using demo mode with simulated predictions.")
-        return None, None
+        return registry
     
-    model_name = "Warrior025/plant-disease-model"
+    if TORCHSCRIPT_PATH and not MODEL_VERSION:
+        problem = _torchscript_problem(find_snapshot(MODEL_STORE_DIR, MODEL_NAME))
+        if problem is not None:
+            st.warning(f"⚠️ TorchScript artifact not used ({problem}); re-run `python -m components.torchscript_export`.")
     
+    version_id = MODEL_VERSION or read_active_pointer(MODEL_STORE_DIR) or _default_model_version()
     try:
-        processor = AutoImageProcessor.from_pretrained(model_name)
-        model = AutoModelForImageClassification.from_pretrained(model_name)
-        return processor, model
+        registry.load(version_id)
     except Exception as e:
         st.error(f"❌ Error loading model: {e}")
-        st.info("💡 Make sure you have internet connection to download the model from Hugging Face Hub.")
+        st.info("💡 Run `python -m components.model_store fetch` once with internet access to create a local model snapshot.")
+    return registry
+
+def load_plant_disease_model():
+    """
+    Get the plant disease classification model currently served by the registry.
+    Loaded once per process (TorchScript artifact, checksum-verified local
+    snapshot, local training output or Hugging Face Hub, see MODEL_VERSION);
+    a rollout swaps in a new version without a restart.
+    
+    Returns:
+        tuple: (processor, model) or (None, None) if loading fails
+    """
+    handle = get_model_registry().current()
+    if handle is None:
         return None, None
+    return handle.processor, handle.model
+
+def activate_model_version(version_id: str, wait: bool = False) -> bool:
+    """
+    Roll out another model version in this process. It is loaded in the
+    background; requests switch to it once it is ready and requests still
+    running on the old version finish there before its weights are freed.
+    The version holds until the ACTIVE pointer is next rewritten: a later
+    promote rolls every server, this one included, to the promoted version.
+    
+    Returns:
+        bool: False if that version is already active or a load is in progress
+    """
+    return get_model_registry().activate(version_id, wait=wait)
+
+def get_model_registry_status() -> dict:
+    """Get the active model version, rollout progress and draining versions"""
+    return get_model_registry().status()
+
+# ==================== INT8 QUANTIZATION ====================
+# "off", "dynamic" (Linear head only) or "static" (all conv + linear layers).
+# The int8 model is only used if it passes the fp32 agreement gate. The verdict is
+# cached per model revision in QUANTIZATION_REPORT_DIR, so later loads skip the gate.
+QUANTIZATION_MODE = os.getenv("AGRIDETECT_QUANTIZATION", "off").strip().lower()
+QUANTIZATION_MIN_AGREEMENT = float(os.getenv("AGRIDETECT_QUANTIZATION_MIN_AGREEMENT", "0.98"))
+QUANTIZATION_CALIBRATION_IMAGES = int(os.getenv("AGRIDETECT_QUANTIZATION_CALIBRATION_IMAGES", "128"))
+QUANTIZATION_REPORT_DIR = os.getenv("AGRIDETECT_QUANTIZATION_REPORT_DIR", ".cache/agridetect/quantization")
+
+def _activate_quantization(processor, model):
+    """
+    Quantize the model and verify it on the local validation split
+    (or reuse the verdict cached for this model revision).
+    
+    Returns:
+        The int8 model if it passed verification, otherwise the fp32 model
+    """
+    from components.model_quantization import build_verified_quantized_model
+    
+    valid_paths = [path for path, _ in list_dataset_images("valid")]
+    train_paths = [path for path, _ in list_dataset_images("train")]
+    step = max(1, len(train_paths) // max(1, QUANTIZATION_CALIBRATION_IMAGES))
+    calibration_paths = train_paths[::step][:QUANTIZATION_CALIBRATION_IMAGES]
+    revision = get_model_revision(model)
+    revision_tag = hashlib.sha256(revision.encode("utf-8")).hexdigest()[:12]
+    
+    try:
+        quantized, report = build_verified_quantized_model(
+            model,
+            processor,
+            QUANTIZATION_MODE,
+            valid_paths,
+            calibration_paths,
+            report_path=Path(QUANTIZATION_REPORT_DIR) / f"{QUANTIZATION_MODE}-{revision_tag}.json",
+            min_agreement=QUANTIZATION_MIN_AGREEMENT,
+            revision=revision
+        )
+    except Exception as e:
+        st.warning(f"⚠️ Int8 {QUANTIZATION_MODE} quantization unavailable ({e}). Using fp32 model.")
+        return model
+    
+    if quantized is None:
+        st.warning(
+            f"⚠️ Int8 {QUANTIZATION_MODE} quantization failed verification "
+            f"(top-1 agreement {report['top1_agreement']:.1%}, speedup {report['speedup']:.2f}x). Using fp32 model."
+        )
+        return model
+    
+    return quantized
+
+def get_model_revision(model) -> str:
+    """Identify the loaded model weights (part of every prediction cache key)"""
+    config = model.config
+    revision = f"{config.name_or_path}@{getattr(config, '_commit_hash', None) or 'local'}"
+    variant = getattr(model, "variant", "fp32")
+    return revision if variant == "fp32" else f"{revision}+{variant}"
 
 # ==================== DISEASE CLASSES ====================
 DISEASE_CLASSES = [
@@ -81,7 +351,39 @@ DISEASE_CLASSES = [
 ]
 
 # ==================== PREDICTION FUNCTIONS ====================
-def predict_disease(image: Image.Image, processor, model):
+# Grad-CAM heatmaps for the Results page, taken from the prediction's own forward pass
+SALIENCY_MAPS = os.getenv("AGRIDETECT_SALIENCY", "1") == "1"
+
+# "Similar reference cases": nearest training images by penultimate-layer embedding.
+# Build the index once per model with `python -m components.embedding_index build`.
+SIMILAR_CASES = os.getenv("AGRIDETECT_SIMILAR_CASES", "1") == "1"
+SIMILAR_CASES_K = int(os.getenv("AGRIDETECT_SIMILAR_CASES_K", "5"))
+EMBEDDING_INDEX_DIR = os.getenv("AGRIDETECT_EMBEDDING_INDEX", str(get_project_root() / "embedding_index"))
+
+def _embedding_index_dir(model_revision: str) -> Path:
+    return Path(EMBEDDING_INDEX_DIR) / index_dir_name(model_revision)
+
+@st.cache_resource
+def _load_embedding_index(model_revision: str, index_mtime: int):
+    """Memory-map the index built with this model revision (index_mtime keys the cache to that build)"""
+    return EmbeddingIndex(_embedding_index_dir(model_revision), dataset_root=get_dataset_split_path("train"))
+
+def get_embedding_index(model):
+    """
+    Get the similar-case index of a model. An index built or rebuilt while
+    the app is running is picked up on the next call.
+    
+    Returns:
+        EmbeddingIndex or None if no index was built for this model revision
+    """
+    model_revision = get_model_revision(model)
+    try:
+        index_mtime = (_embedding_index_dir(model_revision) / INDEX_FILE).stat().st_mtime_ns
+    except OSError:
+        return None
+    return _load_embedding_index(model_revision, index_mtime)
+
+def predict_disease(image: Image.Image, processor, model, tta: bool = None):
     """
     Predict plant disease from an image.
     
@@ -89,99 +391,770 @@ def predict_disease(image: Image.Image, processor, model):
         image: PIL Image object
         processor: Hugging Face image processor
         model: Hugging Face model
+        tta: Re-score low-confidence predictions with augmented views
+            (default: AGRIDETECT_TTA)
     
     Returns:
-        dict: Prediction results with disease name, confidence, and all probabilities
+        PredictionResult: Top classes with their probabilities, plus heatmap,
+            similar cases and TTA details when enabled
     """
     # Demo mode if PyTorch not available
     if not TORCH_AVAILABLE or processor is None or model is None:
         return get_demo_prediction(image)
     
+    tta = TTA_ENABLED if tta is None else tta
     try:
-        # Ensure image is RGB
-        if image.mode != "RGB":
-            image = image.convert("RGB")
+        result = _cached_prediction(
+            image, model,
+            lambda: _predict_with_cascade(
+                image, model, lambda: _predict_images(
+                    [image], processor, model, saliency=SALIENCY_MAPS, similar_cases=SIMILAR_CASES, tta=tta
+                )[0]
+            ),
+            tta=tta
+        )
         
-        # Preprocess image
-        inputs = processor(images=image, return_tensors="pt")
-        
-        # Make prediction
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits
-            probabilities = torch.nn.functional.softmax(logits, dim=-1)
-        
-        # Get prediction
-        predicted_class_idx = logits.argmax(-1).item()
-        confidence = probabilities[0][predicted_class_idx].item()
-        predicted_label = model.config.id2label[predicted_class_idx]
-        
-        # Get all probabilities
-        all_probs = probabilities[0].numpy()
+    except Exception as e:
+        st.error(f"❌ Prediction error: {e}")
+        return get_demo_prediction(image)
+    
+    _shadow_prediction(image, result, model)
+    return result
+
+def _predict_images(images, processor, model, batch_buffer=None, saliency: bool = False,
+                    similar_cases: bool = False, tta: bool = False, top_k: int = TOP_K, timings: dict = None):
+    """
+    Run one batched forward pass over a list of images.
+    
+    Args:
+        images: List of PIL Image objects
+        processor: Hugging Face image processor or FastImageProcessor
+        model: Hugging Face model or quantized ClassifierGraph
+        batch_buffer: Optional preallocated batch tensor (FastImageProcessor only);
+            must not be shared between threads
+        saliency: Also compute Grad-CAM heatmaps from the same forward pass
+            (``saliency_map`` and ``saliency_box`` in each result, if the model supports it)
+        similar_cases: Also look up the most similar training images in the
+            embedding index (``similar_cases`` in each result, if an index exists)
+        tta: Re-score low-confidence results with one extra batch of augmented
+            views, within the TTA latency budget (``tta`` in those results)
+        top_k: Classes kept per result
+        timings: Optional dict that receives the milliseconds spent on the batch's
+            preprocess, forward, postprocess, similar_cases and tta stages
+    
+    Returns:
+        list: One PredictionResult per image, in input order
+    """
+    started = time.perf_counter()
+    clock = _StageClock(timings)
+    probabilities, details, features = _first_pass(
+        images, processor, model, batch_buffer, saliency, similar_cases, clock
+    )
+    if tta:
+        first_classes = probabilities.argmax(axis=1)
+        probabilities, augmentations = get_test_time_augmenter().refine(
+            images, probabilities,
+            lambda views: _class_logits(_preprocess_images(views, processor), model),
+            elapsed_ms=1000.0 * (time.perf_counter() - started)
+        )
+        for detail, augmentation in zip(details, augmentations):
+            if augmentation is not None:
+                detail["tta"] = augmentation
         
-        # Create results dictionary
-        results = {
-            "predicted_disease": predicted_label,
-            "confidence": confidence,
-            "predicted_class_idx": predicted_class_idx,
-            "all_probabilities": all_probs,
-            "all_classes": [model.config.id2label[i] for i in range(len(all_probs))]
-        }
+        # A heatmap must explain the final class: redo it where the views changed the verdict
+        changed = [
+            position for position, detail in enumerate(details)
+            if "saliency_map" in detail and probabilities[position].argmax() != first_classes[position]
+        ]
+        if changed:
+            activations, linear = features
+            saliency_maps = class_activation_maps(activations[changed], linear, probabilities[changed].argmax(axis=1))
+            for position, saliency_map in zip(changed, saliency_maps):
+                details[position]["saliency_map"] = saliency_map
+        clock.lap("tta")
+    
+    results = [
+        _build_prediction_result(row, model.config.id2label, top_k, **detail)
+        for row, detail in zip(probabilities, details)
+    ]
+    clock.lap("postprocess")
+    return results
+
+def _first_pass(images, processor, model, batch_buffer, saliency: bool, similar_cases: bool, clock) -> tuple:
+    """
+    The single forward pass of _predict_images and what is derived from it.
+    
+    Returns:
+        tuple: (probabilities (N, C), one dict of PredictionResult details per image,
+                (activations, final linear layer) or None if no features were captured)
+    """
+    pixel_values = _preprocess_images(images, processor, batch_buffer)
+    clock.lap("preprocess")
+    details = [{} for _ in images]
+    if not (saliency or similar_cases):
+        probabilities = _class_probabilities(pixel_values, model)
+        clock.lap("forward")
+        return probabilities, details, None
+    
+    probabilities, activations, linear = _forward_with_features(pixel_values, model)
+    clock.lap("forward")
+    if activations is None:
+        return probabilities, details, None
+    
+    if saliency:
+        saliency_maps = class_activation_maps(activations, linear, probabilities.argmax(axis=1))
+        for image, detail, saliency_map in zip(images, details, saliency_maps):
+            detail["saliency_map"] = saliency_map
+            detail["saliency_box"] = tuple(_saliency_box(image.size, processor))
+    clock.lap("postprocess")
+    
+    index = get_embedding_index(model) if similar_cases else None
+    if index is not None:
+        neighbours = index.search(_pooled_embeddings(activations), k=SIMILAR_CASES_K)
+        for detail, cases in zip(details, neighbours):
+            detail["similar_cases"] = tuple(cases)
+        clock.lap("similar_cases")
+    return probabilities, details, (activations, linear)
+
+class _StageClock:
+    """Writes the milliseconds since the previous lap into a timings dict (no-op without one)"""
+    
+    def __init__(self, timings: dict = None):
+        self.timings = timings
+        self.last = time.perf_counter()
+    
+    def lap(self, stage: str):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + 1000.0 * (now - self.last)
+        self.last = now
+
+def _class_logits(pixel_values, model) -> np.ndarray:
+    """Logits (N, C) for a preprocessed batch"""
+    import torch
+    from components.model_graph import forward_logits
+    
+    with torch.no_grad():
+        return forward_logits(model, pixel_values).float().numpy()
+
+def _class_probabilities(pixel_values, model) -> np.ndarray:
+    """Softmax class probabilities (N, C) for a preprocessed batch"""
+    import torch
+    from components.model_graph import forward_logits
+    
+    with torch.no_grad():
+        logits = forward_logits(model, pixel_values)
+        probabilities = torch.nn.functional.softmax(logits, dim=-1)
+    return probabilities.numpy()
+
+def _forward_with_features(pixel_values, model) -> tuple:
+    """
+    Softmax class probabilities plus the last conv block's activations, from a
+    single forward pass (the block's output is kept by a hook).
+    
+    Returns:
+        tuple: (probabilities (N, C), activations (N, K, h, w) tensor, final linear layer);
+               activations and layer are None if the model is opaque (e.g. TorchScript)
+    """
+    import torch
+    from components.model_graph import forward_logits
+    
+    layers = saliency_layers(model)
+    if layers is None:
+        return _class_probabilities(pixel_values, model), None, None
+    block, linear = layers
+    
+    with torch.no_grad(), ActivationCapture(block) as capture:
+        logits = forward_logits(model, pixel_values)
+        probabilities = torch.nn.functional.softmax(logits, dim=-1).numpy()
+    
+    return probabilities, capture.activations, linear
+
+def _pooled_embeddings(activations) -> np.ndarray:
+    """Penultimate-layer embeddings: the global average pool of the last conv block (N, K)"""
+    return activations.float().mean(dim=(2, 3)).numpy()
+
+def extract_embeddings(images, processor, model, batch_buffer=None) -> np.ndarray:
+    """
+    Penultimate-layer embeddings (the classifier's input features) of a list of images.
+    
+    Returns:
+        np.ndarray: float32 (N, 2048) for the ResNet-50
+    
+    Raises:
+        ValueError: If the model does not expose its layers (e.g. TorchScript)
+    """
+    pixel_values = _preprocess_images(images, processor, batch_buffer)
+    _, activations, _ = _forward_with_features(pixel_values, model)
+    if activations is None:
+        raise ValueError(f"Cannot extract embeddings from {type(model).__name__}")
+    return _pooled_embeddings(activations)
+
+def _saliency_box(size: tuple, processor) -> list:
+    """The model's center crop of an image, as fractions of its width and height"""
+    try:
+        spec = processor.spec if hasattr(processor, "spec") else spec_from_processor(processor)
+    except ValueError:
+        return [0.0, 0.0, 1.0, 1.0]
+    left, top, right, bottom = crop_box(size, spec)
+    width, height = size
+    return [left / width, top / height, right / width, bottom / height]
+
+def _preprocess_images(images, processor, batch_buffer=None):
+    """Preprocess a list of images into one pixel_values batch tensor"""
+    # Ensure images are RGB
+    images = [image if image.mode == "RGB" else image.convert("RGB") for image in images]
+    
+    if batch_buffer is not None and hasattr(processor, "preprocess_into"):
+        return processor.preprocess_into(images, batch_buffer)
+    return processor(images=images, return_tensors="pt")["pixel_values"]
+
+def predict_batch(images, processor, model, batch_size: int = 16, top_k: int = TOP_K) -> list:
+    """
+    Predict plant diseases for many images in one call.
+    Images are stacked and run through chunked forward passes of batch_size.
+    
+    Args:
+        images: List of PIL Image objects or image file paths
+        processor: Hugging Face image processor or FastImageProcessor
+        model: Hugging Face model, quantized ClassifierGraph or TorchScript classifier
+        batch_size: Images per forward pass
+        top_k: Number of top classes kept per image
+    
+    Returns:
+        list: One PredictionResult per image (top_k classes)
+    """
+    if not TORCH_AVAILABLE or processor is None or model is None:
+        return [get_demo_prediction(_as_image(image), top_k) for image in images]
+    
+    batch_buffer = processor.allocate_batch(batch_size) if hasattr(processor, "allocate_batch") else None
+    results = []
+    
+    for start in range(0, len(images), batch_size):
+        chunk = [_as_image(image) for image in images[start:start + batch_size]]
+        pixel_values = _preprocess_images(chunk, processor, batch_buffer)
+        results.extend(predict_pixel_values(pixel_values, model, top_k))
+    
+    return results
+
+def predict_pixel_values(pixel_values, model, top_k: int = TOP_K) -> list:
+    """
+    Run one forward pass over an already preprocessed batch.
+    
+    Args:
+        pixel_values: Batch tensor from the model's processor
+        model: Loaded classifier
+        top_k: Number of top classes kept per image
+    
+    Returns:
+        list: PredictionResults, as returned by predict_batch
+    """
+    import torch
+    from components.model_graph import forward_logits
+    
+    labels = LabelTable.from_id2label(model.config.id2label)
+    top_k = min(top_k, len(labels))
+    
+    with torch.inference_mode():
+        probabilities = torch.nn.functional.softmax(forward_logits(model, pixel_values), dim=-1)
+        top_probabilities, top_indices = probabilities.topk(top_k, dim=-1)
+    
+    results = []
+    for indices, probs in zip(top_indices.to(torch.int16).numpy(), top_probabilities.numpy()):
+        indices.flags.writeable = False
+        probs.flags.writeable = False
+        results.append(PredictionResult(labels, indices, probs))
+    return results
+
+def _as_image(image) -> Image.Image:
+    """Accept either a PIL image or an image file path"""
+    return image if isinstance(image, Image.Image) else load_image(image)
+
+def _build_prediction_result(all_probs: np.ndarray, id2label: dict, top_k: int = TOP_K, **details) -> PredictionResult:
+    """Create the prediction result for one image's class probabilities (details: optional fields)"""
+    return PredictionResult.from_probabilities(all_probs, LabelTable.from_id2label(id2label), top_k, **details)
+
+# ==================== SHARED INFERENCE ENGINE ====================
+# Requests from all sessions are grouped into micro-batches of up to
+# INFERENCE_MAX_BATCH_SIZE images, waiting at most INFERENCE_MAX_WAIT_MS
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("AGRIDETECT_MAX_BATCH_SIZE", "16"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("AGRIDETECT_MAX_BATCH_WAIT_MS", "15"))
+
+def _create_inference_engine(handle):
+    """Micro-batching engine bound to one model version (shut down with it)"""
+    processor, model = handle.processor, handle.model
+    
+    # Only the engine's worker thread preprocesses, so one batch buffer is reused
+    batch_buffer = processor.allocate_batch(INFERENCE_MAX_BATCH_SIZE) if hasattr(processor, "allocate_batch") else None
+    
+    return MicroBatchInferenceEngine(
+        lambda images: _run_engine_batch(images, processor, model, batch_buffer),
+        max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=INFERENCE_MAX_WAIT_MS
+    )
+
+def _run_engine_batch(images, processor, model, batch_buffer) -> list:
+    """
+    One engine batch. Each request gets (result, batch info): the batch's stage
+    timings, its size and, when enabled, the PyTorch profiler trace file.
+    """
+    timings = {}
+    with torch_profiled(TORCH_PROFILE_DIR) as profile:
+        results = _predict_images(
+            images, processor, model, batch_buffer, saliency=SALIENCY_MAPS, similar_cases=SIMILAR_CASES,
+            tta=TTA_ENABLED, timings=timings
+        )
+    info = {"timings": timings, "batch_size": len(images), "torch_profile": profile.get("path")}
+    return [(result, info) for result in results]
+
+def _engine_predict(engine, image: Image.Image, timeout: float) -> PredictionResult:
+    """Predict through the engine and add its stages (plus the time spent queued) to the current trace"""
+    started = time.perf_counter()
+    result, info = engine.predict(image, timeout=timeout)
+    
+    trace = current_trace()
+    if trace is not None:
+        elapsed_ms = 1000.0 * (time.perf_counter() - started)
+        trace.add("queue_wait", max(0.0, elapsed_ms - sum(info["timings"].values())))
+        for stage, milliseconds in info["timings"].items():
+            trace.add(stage, milliseconds)
+        trace.meta["batch_size"] = info["batch_size"]
+        if info["torch_profile"]:
+            trace.meta["torch_profile"] = info["torch_profile"]
+    return result
+
+def get_inference_engine():
+    """
+    Get the process-wide micro-batching inference engine of the active model version.
+    Shared by every session, like the model it wraps.
+    
+    Returns:
+        MicroBatchInferenceEngine or None if the model is not available
+    """
+    handle = get_model_registry().current()
+    if handle is None:
+        return None
+    return handle.resource("inference_engine", _create_inference_engine)
+
+def predict_disease_batched(image: Image.Image, timeout: float = 60.0, request_id: str = None):
+    """
+    Predict plant disease through the shared inference engine.
+    Concurrent requests from all sessions are served by batched forward passes.
+    
+    Args:
+        image: PIL Image object
+        timeout: Seconds to wait for the result
+        request_id: Id that survives Streamlit reruns; with the worker pool, calling
+            again with the same id waits for (or returns) the original request
+    
+    Returns:
+        PredictionResult: Same as predict_disease
+    
+    Raises:
+        PoolBusyError: If the worker pool is too busy to accept the request; retry
+            later with the same request_id
+    """
+    if not TORCH_AVAILABLE:
+        return get_demo_prediction(image)
+    
+    pool = get_worker_pool()
+    if pool is not None:
+        return _predict_with_worker_pool(pool, image, request_id, timeout)
+    
+    # The request stays on the version it started with, even if a rollout swaps models meanwhile
+    with get_model_registry().acquire() as handle:
+        if handle is None:
+            return get_demo_prediction(image)
         
-        return results
+        try:
+            engine = handle.resource("inference_engine", _create_inference_engine)
+            result = _cached_prediction(
+                image, handle.model,
+                lambda: _predict_with_cascade(image, handle.model, lambda: _engine_predict(engine, image, timeout)),
+                tta=TTA_ENABLED
+            )
+        except Exception as e:
+            st.error(f"❌ Prediction error: {e}")
+            return get_demo_prediction(image)
         
+        trace = current_trace()
+        if trace is not None:
+            trace.meta["model_version"] = handle.version_id
+        _shadow_prediction(image, result, handle.model)
+        return result
+
+# ==================== WORKER POOL ====================
+# With AGRIDETECT_WORKER_POOL_SIZE > 0, predictions run in that many separate
+# processes (one model copy each) instead of this Streamlit process. A request
+# keeps running when its session reruns, and is picked up again by request id.
+# Unless AGRIDETECT_MODEL_VERSION pins a version, a promote (ACTIVE pointer
+# rewrite) replaces the workers with ones serving the new version.
+WORKER_POOL_SIZE = int(os.getenv("AGRIDETECT_WORKER_POOL_SIZE", "0"))
+WORKER_POOL_MAX_PENDING = int(os.getenv("AGRIDETECT_WORKER_POOL_MAX_PENDING", "64"))
+WORKER_HANG_TIMEOUT = float(os.getenv("AGRIDETECT_WORKER_HANG_TIMEOUT", "120"))
+
+POOL_MODE_TILED = "tiled"
+
+def _load_pool_predictor(version_id: str):
+    """Load a model version inside a pool worker; returns its batch predictor and model description"""
+    processor, model = _load_model_version(version_id)
+    
+    def predict(images, mode=None):
+        if mode == POOL_MODE_TILED:
+            return [_predict_tiled(image, processor, model) for image in images]
+        return _predict_images(
+            images, processor, model, saliency=SALIENCY_MAPS, similar_cases=SIMILAR_CASES, tta=TTA_ENABLED
+        )
+    
+    return predict, _describe_model(model)
+
+def _describe_model(model) -> SimpleNamespace:
+    """
+    Picklable stand-in for a model served by the workers: what the prediction
+    cache, cascade and shadow worker read from it (revision and labels).
+    """
+    config = model.config
+    return SimpleNamespace(
+        config=SimpleNamespace(
+            name_or_path=config.name_or_path,
+            _commit_hash=getattr(config, "_commit_hash", None),
+            id2label=dict(config.id2label)
+        ),
+        variant=getattr(model, "variant", "fp32")
+    )
+
+def _pool_model_version() -> str:
+    """Version a (re)started worker loads: the configured one, else the shared ACTIVE pointer"""
+    return MODEL_VERSION or read_active_pointer(MODEL_STORE_DIR) or _default_model_version()
+
+@st.cache_resource
+def get_worker_pool():
+    """
+    Get the process-wide inference worker pool.
+    
+    Returns:
+        InferenceWorkerPool or None if out-of-process inference is off
+    """
+    if WORKER_POOL_SIZE <= 0 or not TORCH_AVAILABLE:
+        return None
+    return InferenceWorkerPool(
+        _load_pool_predictor, _pool_model_version,
+        num_workers=WORKER_POOL_SIZE,
+        max_pending=WORKER_POOL_MAX_PENDING,
+        max_batch=INFERENCE_MAX_BATCH_SIZE,
+        hang_timeout=WORKER_HANG_TIMEOUT,
+        version_stamp=None if MODEL_VERSION else (lambda: active_pointer_mtime(MODEL_STORE_DIR))
+    )
+
+def get_worker_pool_status():
+    """Get the pool's request counters and per-worker health, or None if the pool is off"""
+    pool = get_worker_pool()
+    return pool.status() if pool is not None else None
+
+def _predict_with_worker_pool(pool, image: Image.Image, request_id: str, timeout: float, mode: str = None):
+    """
+    Run (or re-attach to) a request on the worker pool, behind the same prediction
+    cache, cascade and shadow traffic as in-process predictions.
+    
+    Args:
+        mode: None for a plain prediction, or POOL_MODE_TILED for a working image
+            classified tile by tile (cached apart, no cascade or shadow traffic)
+    
+    Raises:
+        PoolBusyError: If the pool already holds its maximum of pending requests
+    """
+    if not pool.wait_ready(timeout):
+        st.error("❌ The inference workers could not load the model.")
+        return get_demo_prediction(image)
+    # Cache lookups use the revision new requests are served by (the newest
+    # workers' during a rollover); fresh results are stored under the revision
+    # of the worker that actually produced them
+    model = pool.worker_info()
+    served = {}
+    
+    def predict_on_pool():
+        with traced_stage("worker_pool"):
+            future = pool.submit(image, request_id=request_id, mode=mode)
+            result = future.result(timeout=timeout)
+        served["model"] = future.worker_info
+        trace = current_trace()
+        if trace is not None:
+            trace.meta["model_version"] = future.version_id
+        return result
+    
+    served_model = lambda: served.get("model", model)
+    try:
+        if mode == POOL_MODE_TILED:
+            return _cached_prediction(image, model, predict_on_pool, mode=_tiled_cache_mode(), served_model=served_model)
+        result = _cached_prediction(
+            image, model, lambda: _predict_with_cascade(image, model, predict_on_pool),
+            tta=TTA_ENABLED, served_model=served_model
+        )
+    except PoolBusyError:
+        raise
     except Exception as e:
         st.error(f"❌ Prediction error: {e}")
         return get_demo_prediction(image)
+    
+    _shadow_prediction(image, result, served_model())
+    return result
+
+# ==================== MODEL CASCADE ====================
+# The fallback classifier answers first; images whose calibrated confidence is
+# below CASCADE_THRESHOLD are escalated to the full model.
+# Tune the threshold with `python -m components.model_cascade`.
+CASCADE_ENABLED = os.getenv("AGRIDETECT_CASCADE", "0") == "1"
+CASCADE_THRESHOLD = float(os.getenv("AGRIDETECT_CASCADE_THRESHOLD", "0.9"))
+
+@st.cache_resource
+def get_model_cascade():
+    """
+    Get the process-wide cascade (fast model in front of the full model).
+    
+    Returns:
+        ConfidenceCascade or None if the cascade is disabled or the fast model is missing
+    """
+    if not CASCADE_ENABLED:
+        return None
+    fast_model = get_fallback_classifier()
+    return None if fast_model is None else ConfidenceCascade(fast_model, CASCADE_THRESHOLD)
+
+def get_cascade_stats():
+    """Get escalation counters and latency percentiles, or None if the cascade is off"""
+    cascade = get_model_cascade()
+    return cascade.stats() if cascade is not None else None
+
+def _predict_with_cascade(image: Image.Image, model, predict_full):
+    """
+    Run the fast model first and call predict_full only if it is not confident enough.
+    Without a cascade this is just predict_full().
+    """
+    cascade = get_model_cascade()
+    if cascade is None:
+        return predict_full()
+    return cascade.predict(image, predict_full, lambda probs: _build_prediction_result(probs, model.config.id2label))
+
+# ==================== TEST-TIME AUGMENTATION ====================
+# Predictions below TTA_THRESHOLD confidence are re-scored with flipped/cropped
+# views in one extra batch (logits averaged). Views are dropped, last first, when
+# they would push the request past TTA_BUDGET_MS.
+# Measure the accuracy gain with `python -m components.augmented_inference`.
+TTA_ENABLED = os.getenv("AGRIDETECT_TTA", "0") == "1"
+TTA_THRESHOLD = float(os.getenv("AGRIDETECT_TTA_THRESHOLD", "0.7"))
+TTA_BUDGET_MS = float(os.getenv("AGRIDETECT_TTA_BUDGET_MS", "1000"))
+TTA_VIEWS = [
+    view.strip() for view in os.getenv("AGRIDETECT_TTA_VIEWS", "hflip,vflip,zoom,crop_top_left,crop_bottom_right").split(",")
+    if view.strip()
+]
+
+@st.cache_resource
+def get_test_time_augmenter():
+    """
+    Get the process-wide test-time augmenter (shared per-view cost estimate and counters).
+    
+    Returns:
+        TestTimeAugmenter: Used whenever a prediction is made with tta=True
+    """
+    return TestTimeAugmenter(TTA_VIEWS, TTA_THRESHOLD, TTA_BUDGET_MS)
+
+def get_tta_stats():
+    """Get augmentation counters and latency percentiles, or None if TTA is off"""
+    return get_test_time_augmenter().stats() if TTA_ENABLED else None
+
+# ==================== PREDICTION CACHE ====================
+# In-memory LRU tier size and optional on-disk tier shared by all processes
+# (bounded by row count and age; memory only if its database cannot be opened)
+PREDICTION_CACHE_SIZE = int(os.getenv("AGRIDETECT_PREDICTION_CACHE_SIZE", "512"))
+PREDICTION_CACHE_DIR = os.getenv("AGRIDETECT_PREDICTION_CACHE_DIR", "")
+PREDICTION_CACHE_DISK_ENTRIES = int(os.getenv("AGRIDETECT_PREDICTION_CACHE_DISK_ENTRIES", "50000"))
+PREDICTION_CACHE_MAX_AGE_DAYS = float(os.getenv("AGRIDETECT_PREDICTION_CACHE_MAX_AGE_DAYS", "30"))
+
+@st.cache_resource
+def get_prediction_cache():
+    """
+    Get the process-wide prediction cache.
+    Predictions are keyed by image pixel digest plus model revision.
+    
+    Returns:
+        PredictionCache: Shared cache instance
+    """
+    disk_path = Path(PREDICTION_CACHE_DIR) / "predictions.sqlite3" if PREDICTION_CACHE_DIR else None
+    return PredictionCache(
+        max_entries=PREDICTION_CACHE_SIZE,
+        disk_path=disk_path,
+        max_disk_entries=PREDICTION_CACHE_DISK_ENTRIES,
+        max_age_seconds=PREDICTION_CACHE_MAX_AGE_DAYS * 24 * 3600
+    )
 
-def get_demo_prediction(image: Image.Image):
+def get_prediction_cache_stats() -> dict:
+    """Get prediction cache hit/miss counters"""
+    return get_prediction_cache().stats()
+
+def _cached_prediction(image: Image.Image, model, predict, mode: str = None, tta: bool = False,
+                       served_model=None):
     """
-    Generate demo prediction when PyTorch is not available.
-    Uses image analysis to provide realistic-looking results.
+    Return the cached prediction for an image, or compute and store it.
     
     Args:
         image: PIL Image object
+        model: Model whose revision keys the cache entry
+        predict: Zero-argument callable producing the prediction on a miss
+        mode: Optional name of a non-default prediction mode (kept apart in the cache)
+        tta: Whether predict() applies test-time augmentation
+        served_model: Optional zero-argument callable returning the model that
+            produced a fresh prediction, when that can differ from ``model``
+            (worker pool rollover); the result is stored under its revision
     
     Returns:
-        dict: Demo prediction results
+        PredictionResult: Cached or freshly computed prediction
     """
-    import random
+    cache = get_prediction_cache()
     
-    # Analyze image to make prediction seem realistic
-    img_array = np.array(image)
+    with traced_stage("cache_lookup"):
+        key = compute_image_digest(image, _cache_revision(model, mode, tta))
+        result = cache.get(key)
     
-    # Calculate some basic image statistics
-    avg_green = np.mean(img_array[:, :, 1]) if len(img_array.shape) == 3 else 128
-    avg_red = np.mean(img_array[:, :, 0]) if len(img_array.shape) == 3 else 128
+    trace = current_trace()
+    if trace is not None:
+        trace.meta["cache_hit"] = result is not None
     
-    # Use image characteristics to influence prediction
-    if avg_red > avg_green + 20:
-        # More red - likely disease
-        disease_idx = random.choice([0, 2, 4, 6])  # Disease classes
-    elif avg_green > 150:
-        # Very green - likely healthy
-        disease_idx = 7  # Healthy
+    if result is None:
+        result = predict()
+        producer = served_model() if served_model is not None else model
+        if producer is not model:
+            key = compute_image_digest(image, _cache_revision(producer, mode, tta))
+        cache.put(key, result)
+    return result
+
+def _cache_revision(model, mode: str = None, tta: bool = False) -> str:
+    """Cache key revision: the model revision plus every option that changes the result"""
+    revision = get_model_revision(model)
+    if mode:
+        revision = f"{revision}+{mode}"
     else:
-        # Mixed - random disease
-        disease_idx = random.randint(0, 6)
+        # Entries cached without heatmaps or similar cases must not be served once those are on
+        if SALIENCY_MAPS:
+            revision = f"{revision}+cam"
+        if SIMILAR_CASES and get_embedding_index(model) is not None:
+            revision = f"{revision}+knn{SIMILAR_CASES_K}"
+        if tta:
+            revision = f"{revision}+tta{TTA_THRESHOLD:g}x{len(TTA_VIEWS)}"
+    if get_model_cascade() is not None:
+        # Cascade answers depend on the threshold, keep them apart from full-model results
+        revision = f"{revision}+cascade{CASCADE_THRESHOLD:g}"
+    return revision
+
+# ==================== SHADOW INFERENCE ====================
+# A candidate version (an id from list_model_versions()) is run on a copy of live
+# traffic by a background worker and compared with production. Results go to a
+# local SQLite store; summarize them with `python -m components.shadow_inference`.
+SHADOW_VERSION = os.getenv("AGRIDETECT_SHADOW_VERSION", "")
+SHADOW_QUEUE_SIZE = int(os.getenv("AGRIDETECT_SHADOW_QUEUE_SIZE", "32"))
+SHADOW_DB_PATH = os.getenv("AGRIDETECT_SHADOW_DB", ".cache/agridetect/shadow.sqlite3")
+
+def _load_shadow_candidate():
+    """Load the candidate on the shadow worker thread and return its batch predictor"""
+    processor, model = _load_model_version(SHADOW_VERSION)
+    # Every class is kept, to look up the candidate's probability of the production answer
+    return lambda images: _predict_images(images, processor, model, top_k=len(model.config.id2label))
+
+@st.cache_resource
+def get_shadow_runner():
+    """
+    Get the process-wide shadow worker.
+    
+    Returns:
+        ShadowRunner or None if no candidate is configured
+    """
+    if not SHADOW_VERSION or not TORCH_AVAILABLE:
+        return None
+    return ShadowRunner(_load_shadow_candidate, ShadowStore(SHADOW_DB_PATH), SHADOW_VERSION,
+                        max_queue=SHADOW_QUEUE_SIZE)
+
+def _shadow_prediction(image: Image.Image, result: PredictionResult, model):
+    """Hand a production prediction to the shadow worker; returns immediately"""
+    if not SHADOW_VERSION or result.demo_mode:
+        return
+    runner = get_shadow_runner()
+    if runner is not None:
+        runner.submit(image, result, get_model_revision(model))
+
+def get_shadow_stats():
+    """
+    Get shadow worker counters plus the candidate's recorded disagreement,
+    confidence delta and latency summary, or None if shadow mode is off
+    """
+    runner = get_shadow_runner()
+    if runner is None:
+        return None
+    return {**runner.stats(), "summary": runner.store.summary(SHADOW_VERSION)}
+
+# ==================== PROFILING ====================
+# Upload -> prediction -> Results requests are traced stage by stage (see
+# components.inference_profiler). PROFILING_PANEL shows the last PROFILE_RECENT
+# breakdowns and the per-stage histograms on the Results page; with
+# TORCH_PROFILE_DIR set, every engine batch is also recorded by the PyTorch profiler.
+PROFILING_PANEL = os.getenv("AGRIDETECT_PROFILING_PANEL", "0") == "1"
+PROFILE_RECENT = int(os.getenv("AGRIDETECT_PROFILE_RECENT", "20"))
+TORCH_PROFILE_DIR = os.getenv("AGRIDETECT_TORCH_PROFILE_DIR", "")
+
+@st.cache_resource
+def get_inference_profiler():
+    """
+    Get the process-wide profiler aggregating finished request traces.
+    
+    Returns:
+        InferenceProfiler: Shared instance
+    """
+    return InferenceProfiler(recent=PROFILE_RECENT)
+
+def finish_request_trace(trace):
+    """Stop a request's clock and add it to the profiler's histograms and recent requests"""
+    if trace is not None:
+        get_inference_profiler().record(trace)
+
+def get_profiling_stats() -> dict:
+    """Get the per-stage latency summary and the most recent request breakdowns"""
+    profiler = get_inference_profiler()
+    return {"stages": profiler.summary(), "recent": profiler.recent()}
+
+@st.cache_resource
+def get_fallback_classifier():
+    """
+    Load the colour/texture fallback classifier shipped next to this module
+    (trained with `python -m components.fallback_classifier`).
     
-    predicted_disease = DISEASE_CLASSES[disease_idx]
+    Returns:
+        FallbackClassifier or None if the weight file is missing or unreadable
+    """
+    try:
+        return FallbackClassifier.load()
+    except Exception as e:
+        st.warning(f"⚠️ Fallback classifier unavailable: {e}")
+        return None
+
+def get_demo_prediction(image: Image.Image, top_k: int = TOP_K):
+    """
+    Generate a prediction when PyTorch is not available.
+    Uses the lightweight colour-histogram/texture classifier, which is
+    deterministic and runs in well under a millisecond.
     
-    # Generate realistic probabilities
-    all_probs = np.random.dirichlet(np.ones(len(DISEASE_CLASSES)) * 0.5)
-    all_probs[disease_idx] = max(all_probs[disease_idx], 0.75)  # Ensure high confidence for predicted class
-    all_probs = all_probs / all_probs.sum()  # Normalize
+    Args:
+        image: PIL Image object
+        top_k: Classes kept
     
-    confidence = all_probs[disease_idx]
+    Returns:
+        PredictionResult: Demo prediction (``demo_mode`` set)
+    """
+    classifier = get_fallback_classifier()
+    if classifier is not None:
+        all_probs = classifier.predict_proba(image).astype(np.float64)
+    else:
+        # No usable model at all: say so instead of guessing
+        all_probs = np.full(len(DISEASE_CLASSES), 1 / len(DISEASE_CLASSES))
     
-    return {
-        "predicted_disease": predicted_disease,
-        "confidence": confidence,
-        "predicted_class_idx": disease_idx,
-        "all_probabilities": all_probs,
-        "all_classes": DISEASE_CLASSES,
-        "demo_mode": True
-    }
+    return PredictionResult.from_probabilities(all_probs, LabelTable.intern(DISEASE_CLASSES), top_k, demo_mode=True)
 
 def get_disease_recommendations(disease_name: str) -> dict:
     """
@@ -369,6 +1342,138 @@ def get_dataset_info():
         "framework": "Hugging Face Transformers"
     }
 
+# ==================== IMAGE LOADING ====================
+# Large JPEGs are decoded at reduced scale, keeping the shortest edge at least this long
+DECODE_MIN_EDGE = int(os.getenv("AGRIDETECT_DECODE_MIN_EDGE", "512"))
+
+def load_image(source) -> Image.Image:
+    """
+    Decode an uploaded image for preview and prediction.
+    Camera photos are shrunk by the JPEG decoder instead of being fully decoded.
+    
+    Args:
+        source: File path or file-like object (e.g. Streamlit UploadedFile)
+    
+    Returns:
+        PIL Image in RGB mode
+    """
+    return decode_image(source, min_edge=DECODE_MIN_EDGE)
+
+# ==================== TILED INFERENCE ====================
+# High-resolution photos are decoded at a bounded working size and classified
+# as overlapping model-sized tiles around the foliage, so small lesions are not
+# lost by squashing the whole photo to one 224x224 input
+TILED_INFERENCE = os.getenv("AGRIDETECT_TILED", "0") == "1"
+TILED_WORKING_EDGE = int(os.getenv("AGRIDETECT_TILED_WORKING_EDGE", "672"))
+TILED_MAX_TILES = int(os.getenv("AGRIDETECT_TILED_MAX_TILES", "16"))
+
+def _tiled_cache_mode() -> str:
+    return f"tiled{TILED_WORKING_EDGE}x{TILED_MAX_TILES}"
+
+def _predict_tiled(image: Image.Image, processor, model):
+    """Classify a working image tile by tile in one batched forward pass (see predict_disease_tiled)"""
+    id2label = model.config.id2label
+    labels = [id2label[i] for i in range(len(id2label))]
+    tiled = classify_tiled(
+        image, processor, lambda pixel_values: _class_probabilities(pixel_values, model),
+        labels, max_tiles=TILED_MAX_TILES
+    )
+    return _build_prediction_result(
+        tiled["probabilities"], id2label,
+        severity=tiled["severity"],
+        severity_map=tiled["severity_map"],
+        tiles=tuple(tiled["tiles"]),
+        working_size=tuple(tiled["working_size"]),
+        tile_size=tiled["tile_size"]
+    )
+
+def predict_disease_tiled(source, timeout: float = 60.0, request_id: str = None):
+    """
+    Predict plant disease from a high-resolution photo, tile by tile.
+    With the worker pool on, the tile batch runs in a pool worker.
+    
+    Args:
+        source: File path, file-like object (e.g. Streamlit UploadedFile) or PIL image
+        timeout: Seconds to wait for a pool worker's result
+        request_id: Id that survives Streamlit reruns (worker pool only)
+    
+    Returns:
+        PredictionResult: Image verdict plus severity, severity_map, tiles,
+            working_size and tile_size from the tile pass
+    
+    Raises:
+        PoolBusyError: If the worker pool is too busy to accept the request
+    """
+    image = working_image(source, working_edge=TILED_WORKING_EDGE, max_long_edge=2 * TILED_WORKING_EDGE)
+    
+    if not TORCH_AVAILABLE:
+        return get_demo_prediction(image)
+    
+    pool = get_worker_pool()
+    if pool is not None:
+        return _predict_with_worker_pool(pool, image, request_id, timeout, mode=POOL_MODE_TILED)
+    
+    with get_model_registry().acquire() as handle:
+        if handle is None:
+            return get_demo_prediction(image)
+        processor, model = handle.processor, handle.model
+        
+        try:
+            return _cached_prediction(image, model, lambda: _predict_tiled(image, processor, model),
+                                      mode=_tiled_cache_mode())
+        except Exception as e:
+            st.error(f"❌ Prediction error: {e}")
+            return get_demo_prediction(image)
+
+# ==================== STREAMING INFERENCE ====================
+# Video files and frame sequences: adaptive sampling, dHash de-duplication and
+# batched classification, yielding a timeline of detections
+STREAM_BATCH_SIZE = int(os.getenv("AGRIDETECT_STREAM_BATCH_SIZE", "8"))
+STREAM_MIN_INTERVAL = float(os.getenv("AGRIDETECT_STREAM_MIN_INTERVAL", "0.2"))
+STREAM_MAX_INTERVAL = float(os.getenv("AGRIDETECT_STREAM_MAX_INTERVAL", "2.0"))
+STREAM_DUPLICATE_DISTANCE = int(os.getenv("AGRIDETECT_STREAM_DUPLICATE_DISTANCE", "6"))
+
+def stream_disease_timeline(source, fps: float = 30.0, stats: dict = None):
+    """
+    Classify a video or frame sequence and yield detections as they are made.
+    
+    Args:
+        source: Video file path, folder of frame images, or list of image paths / PIL images
+        fps: Frame rate used for timestamps of image sequences
+        stats: Optional dict filled with frames_read, frames_sampled,
+            duplicates_skipped and frames_classified
+    
+    Yields:
+        dict: frame_index, timestamp, predicted_disease, confidence,
+              predicted_class_idx and frames_skipped
+    """
+    if isinstance(source, (str, os.PathLike)) and Path(source).is_file():
+        frames = iter_video_frames(source)
+    else:
+        frames = iter_image_frames(source, fps=fps)
+    
+    registry = get_model_registry() if TORCH_AVAILABLE else None
+    
+    # A whole video is classified by the version that was active when it started
+    with (registry.acquire() if registry is not None else nullcontext()) as handle:
+        if handle is None:
+            classify = lambda images: [get_demo_prediction(image) for image in images]
+        else:
+            processor, model = handle.processor, handle.model
+            # The generator runs in one thread, so one batch buffer is reused
+            batch_buffer = processor.allocate_batch(STREAM_BATCH_SIZE) if hasattr(processor, "allocate_batch") else None
+            classify = lambda images: _predict_images(images, processor, model, batch_buffer)
+        
+        yield from stream_detections(
+            frames,
+            classify,
+            batch_size=STREAM_BATCH_SIZE,
+            min_interval=STREAM_MIN_INTERVAL,
+            max_interval=STREAM_MAX_INTERVAL,
+            duplicate_distance=STREAM_DUPLICATE_DISTANCE,
+            stats=stats
+        )
+
 # ==================== VALIDATION FUNCTIONS ====================
 def validate_image(image: Image.Image) -> tuple:
     """
@@ -399,6 +1504,32 @@ def validate_image(image: Image.Image) -> tuple:
     except Exception as e:
         return False, f"Error validating image: {e}"
 
+# Obviously unusable uploads (documents, selfies, dark or blurred shots) are
+# rejected from a small thumbnail before any model work
+PRESCREEN_ENABLED = os.getenv("AGRIDETECT_PRESCREEN", "1") == "1"
+
+def prescreen_image(image: Image.Image) -> tuple:
+    """
+    Cheap leaf/not-a-leaf check on a thumbnail: exposure, green-pixel ratio,
+    leaf-likeness and blur (Laplacian variance).
+    
+    Args:
+        image: PIL Image object (already passed validate_image)
+    
+    Returns:
+        tuple: (passed: bool, message: str) - the message explains a rejection
+    """
+    if not PRESCREEN_ENABLED:
+        return True, "Pre-screening disabled"
+    
+    try:
+        result = screen_image(image)
+    except Exception as e:
+        # Never block an upload because the pre-screen itself failed
+        return True, f"Pre-screening skipped: {e}"
+    
+    return result["passed"], result["reason"] or "Image looks like a plant leaf"
+
 # ==================== ERROR HANDLING ====================
 def check_model_availability():
     """
@@ -408,19 +1539,103 @@ def check_model_availability():
     if not TORCH_AVAILABLE:
         return False
     
+    if WORKER_POOL_SIZE > 0:
+        pool = get_worker_pool()
+        return pool is not None and pool.healthy()
+    
     try:
         processor, model = load_plant_disease_model()
         return processor is not None and model is not None
     except Exception:
         return False
 
+# ==================== BACKGROUND WARMUP ====================
+# Loading the weights and running the first forward passes starts in a
+# background thread as soon as any page imports this module
+MODEL_WARMUP = os.getenv("AGRIDETECT_WARMUP", "1") == "1"
+WARMUP_BATCH_SIZES = [int(size) for size in os.getenv("AGRIDETECT_WARMUP_BATCH_SIZES", "1,4").split(",") if size.strip()]
+
+def _warm_up_model() -> bool:
+    """
+    Load the model and the shared inference engine, then run a few dummy
+    batches so kernels are selected and buffers allocated before the first
+    real request. The prediction cache is bypassed.
+    With the worker pool, waits until a worker has loaded (and warmed) its model.
+    """
+    if WORKER_POOL_SIZE > 0:
+        pool = get_worker_pool()
+        return pool is not None and pool.wait_ready(timeout=WORKER_HANG_TIMEOUT)
+    
+    if not check_model_availability():
+        return False
+    
+    processor, model = load_plant_disease_model()
+    get_inference_engine()
+    
+    dummy = Image.new("RGB", (256, 256), (96, 128, 64))
+    for batch_size in WARMUP_BATCH_SIZES:
+        _predict_images([dummy] * batch_size, processor, model)
+    return True
+
+_model_warmup = BackgroundWarmup(_warm_up_model)
+
+def start_model_warmup() -> bool:
+    """
+    Start the background warmup once per process.
+    Only runs inside a Streamlit server, so CLIs and scripts importing this
+    module do not load the model behind their back.
+    
+    Returns:
+        bool: True if this call started the warmup
+    """
+    if not (MODEL_WARMUP and TORCH_AVAILABLE and st.runtime.exists()):
+        return False
+    return _model_warmup.start()
+
+def is_model_ready() -> bool:
+    """True once the background warmup has loaded and warmed the model (never blocks)"""
+    return _model_warmup.is_ready()
+
+def get_model_warmup_status() -> dict:
+    """
+    Get the background warmup state for display.
+    
+    Returns:
+        dict: state (pending/running/ready/failed), error, seconds and started flag
+    """
+    return {**_model_warmup.status(), "started": _model_warmup.started}
+
+start_model_warmup()
+
 # ==================== EXPORT ====================
 __all__ = [
     'load_plant_disease_model',
     'predict_disease',
+    'predict_disease_batched',
+    'predict_batch',
+    'extract_embeddings',
+    'get_embedding_index',
+    'predict_disease_tiled',
+    'stream_disease_timeline',
+    'get_inference_engine',
+    'list_model_versions',
+    'activate_model_version',
+    'get_model_registry_status',
+    'get_prediction_cache_stats',
+    'get_cascade_stats',
+    'get_tta_stats',
+    'get_shadow_stats',
+    'get_worker_pool_status',
+    'finish_request_trace',
+    'get_profiling_stats',
     'get_disease_recommendations',
     'get_dataset_info',
     'validate_image',
+    'prescreen_image',
+    'load_image',
     'check_model_availability',
+    'start_model_warmup',
+    'is_model_ready',
+    'get_model_warmup_status',
     'DISEASE_CLASSES'
 ]
@@ -0,0 +1,192 @@
+"""
+Model Cascade - Confidence-Gated Fast Path in Front of ResNet-50
+The colour/texture fallback classifier answers first; an image is escalated to
+the full model only when the fast model's calibrated confidence is below the
+threshold. Includes an offline threshold sweep on the validation split.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+STAGE_FAST = "fast"
+STAGE_FULL = "full"
+
+
+def _percentiles(values) -> dict:
+    if len(values) == 0:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.asarray(values), [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+class ConfidenceCascade:
+    """
+    Two-stage classifier: ``fast_model.predict_proba`` first, the full model
+    only for images whose top fast probability is below ``threshold``.
+
+    Keeps escalation counters and a window of recent end-to-end latencies.
+    """
+
+    def __init__(self, fast_model, threshold: float, latency_window: int = 1000):
+        """
+        Args:
+            fast_model: Object with predict_proba(image) -> calibrated class probabilities,
+                in the same class order as the full model
+            threshold: Minimum fast-model confidence to answer without escalating
+            latency_window: Number of recent request latencies kept for stats()
+        """
+        self.fast_model = fast_model
+        self.threshold = float(threshold)
+
+        self._lock = threading.Lock()
+        self._counts = {STAGE_FAST: 0, STAGE_FULL: 0}
+        self._latencies_ms = deque(maxlen=latency_window)
+
+    def predict(self, image, predict_full, build_result):
+        """
+        Classify one image through the cascade.
+
+        Args:
+            image: PIL Image object
+            predict_full: Zero-argument callable running the full model, returning a PredictionResult
+            build_result: Callable turning fast-model probabilities into a PredictionResult
+
+        Returns:
+            PredictionResult: With ``cascade_stage`` set to "fast" or "full"
+        """
+        started = time.perf_counter()
+        probabilities = self.fast_model.predict_proba(image)
+
+        if float(probabilities.max()) >= self.threshold:
+            result = build_result(probabilities.astype(np.float32))
+            stage = STAGE_FAST
+        else:
+            result = predict_full()
+            stage = STAGE_FULL
+
+        result = result.with_details(cascade_stage=stage)
+        with self._lock:
+            self._counts[stage] += 1
+            self._latencies_ms.append(1000.0 * (time.perf_counter() - started))
+        return result
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: threshold, request counts per stage, escalated fraction and
+                  latency percentiles over the recent window
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = list(self._latencies_ms)
+        total = counts[STAGE_FAST] + counts[STAGE_FULL]
+        return {
+            "threshold": self.threshold,
+            "requests": total,
+            "escalated": counts[STAGE_FULL],
+            "escalated_fraction": counts[STAGE_FULL] / total if total else 0.0,
+            **_percentiles(latencies)
+        }
+
+
+# ==================== THRESHOLD SWEEP ====================
+def sweep_thresholds(fast_probabilities, full_probabilities, labels, fast_ms, full_ms, thresholds) -> list:
+    """
+    Simulate the cascade for several thresholds from per-image measurements.
+
+    Each image's cascade latency is its fast-model time, plus its full-model
+    time when it is escalated, so one pass of both models covers every threshold.
+
+    Args:
+        fast_probabilities: (N, C) fast-model probabilities
+        full_probabilities: (N, C) full-model probabilities
+        labels: (N,) true class indices
+        fast_ms: (N,) fast-model latency per image
+        full_ms: (N,) full-model latency per image
+        thresholds: Thresholds to evaluate
+
+    Returns:
+        list: One dict per threshold with escalated_fraction, accuracy, accuracy of
+              the images answered by the fast model, agreement with the full
+              model and latency percentiles
+    """
+    fast_pred = fast_probabilities.argmax(axis=1)
+    full_pred = full_probabilities.argmax(axis=1)
+    fast_confidence = fast_probabilities.max(axis=1)
+
+    rows = []
+    for threshold in thresholds:
+        escalate = fast_confidence < threshold
+        prediction = np.where(escalate, full_pred, fast_pred)
+        latency = fast_ms + np.where(escalate, full_ms, 0.0)
+        rows.append({
+            "threshold": float(threshold),
+            "escalated_fraction": float(escalate.mean()),
+            "accuracy": float((prediction == labels).mean()),
+            "fast_accuracy": float((fast_pred == labels)[~escalate].mean()) if (~escalate).any() else None,
+            "agreement_with_full": float((prediction == full_pred).mean()),
+            "mean_ms": float(latency.mean()),
+            **_percentiles(latency)
+        })
+    return rows
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+
+    from PIL import Image
+
+    os.environ["AGRIDETECT_CASCADE"] = "0"
+    from components.fallback_classifier import FallbackClassifier
+    from components.ml_model_connector import (
+        _class_probabilities, _predict_images, _preprocess_images, list_dataset_images, load_plant_disease_model
+    )
+
+    parser = argparse.ArgumentParser(description="Sweep cascade thresholds on the validation split")
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[0.0, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99, 1.01])
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    processor, model = load_plant_disease_model()
+    if model is None:
+        raise SystemExit("❌ Model could not be loaded")
+    fast_model = FallbackClassifier.load()
+
+    items = list_dataset_images("valid")
+    images = [Image.open(path).convert("RGB") for path, _ in items]
+    _predict_images(images[:2], processor, model)
+
+    fast_probabilities, full_probabilities, fast_ms, full_ms = [], [], [], []
+    for image in images:
+        started = time.perf_counter()
+        fast_probabilities.append(fast_model.predict_proba(image))
+        fast_ms.append(1000.0 * (time.perf_counter() - started))
+
+        started = time.perf_counter()
+        full_probabilities.append(_class_probabilities(_preprocess_images([image], processor), model)[0])
+        full_ms.append(1000.0 * (time.perf_counter() - started))
+
+    rows = sweep_thresholds(
+        np.stack(fast_probabilities), np.stack(full_probabilities),
+        np.array([idx for _, idx in items]), np.array(fast_ms), np.array(full_ms), args.thresholds
+    )
+
+    print(f"Cascade sweep on {len(items)} validation images (threshold 0 = fast model only, >1 = full model only)")
+    print(f"{'threshold':>9} {'escalated':>10} {'accuracy':>9} {'fast acc':>9} {'agree':>7} "
+          f"{'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for row in rows:
+        fast_accuracy = "-" if row["fast_accuracy"] is None else f"{row['fast_accuracy']:.1%}"
+        print(f"{row['threshold']:>9.2f} {row['escalated_fraction']:>10.1%} {row['accuracy']:>9.1%} {fast_accuracy:>9} "
+              f"{row['agreement_with_full']:>7.1%} {row['mean_ms']:>8.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
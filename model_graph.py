@@ -0,0 +1,174 @@
+"""
+Model Graph - Plain PyTorch View of the Classifier
+Re-expresses the fine-tuned Hugging Face ResNet-50 as a flat nn.Sequential so it
+can be quantized, traced and exported without the transformers output wrappers,
+and rebuilds the same network in plain PyTorch to load it without transformers
+"""
+
+from torch import nn
+
+
+class ClassifierGraph(nn.Module):
+    """
+    pixel_values -> logits network that keeps the source model's config.
+
+    ``variant`` names the transformation applied to the weights (for example
+    ``"int8-static"``) so predictions from different variants are never
+    mixed up in the prediction cache.
+    """
+
+    def __init__(self, network: nn.Module, config, variant: str = "fp32"):
+        super().__init__()
+        self.network = network
+        self.config = config
+        self.variant = variant
+
+    def forward(self, pixel_values):
+        return self.network(pixel_values)
+
+
+def build_classifier_graph(model) -> ClassifierGraph:
+    """
+    Flatten a ResNetForImageClassification into a single nn.Sequential.
+
+    The Hugging Face forward pass is embedder -> encoder stages -> pooler ->
+    classifier; the Sequential runs exactly the same modules in the same
+    order, minus the ModelOutput bookkeeping that blocks FX tracing.
+
+    Args:
+        model: Hugging Face ResNet image classification model
+
+    Returns:
+        ClassifierGraph: Float32 graph sharing the model's weights
+    """
+    if not hasattr(model, "resnet") or not hasattr(model, "classifier"):
+        raise ValueError(f"Unsupported model architecture: {type(model).__name__}")
+
+    resnet = model.resnet
+    network = nn.Sequential(
+        resnet.embedder.embedder,
+        resnet.embedder.pooler,
+        *resnet.encoder.stages,
+        resnet.pooler,
+        model.classifier
+    )
+    return ClassifierGraph(network.eval(), model.config)
+
+
+# ==================== PLAIN PYTORCH RESNET ====================
+# The same modules as transformers' ResNet, with the same attribute names, so a
+# ClassifierGraph network's state dict loads into it unchanged. Building it does
+# not import transformers (seconds of start-up per process).
+_ACTIVATIONS = {"relu": nn.ReLU, "gelu": nn.GELU, "silu": nn.SiLU, "swish": nn.SiLU}
+
+
+def _activation(name):
+    return _ACTIVATIONS[name]() if name is not None else nn.Identity()
+
+
+class _ConvLayer(nn.Module):
+    def __init__(self, in_channels, out_channels, kernel_size=3, stride=1, activation="relu"):
+        super().__init__()
+        self.convolution = nn.Conv2d(in_channels, out_channels, kernel_size=kernel_size, stride=stride,
+                                     padding=kernel_size // 2, bias=False)
+        self.normalization = nn.BatchNorm2d(out_channels)
+        self.activation = _activation(activation)
+
+    def forward(self, x):
+        return self.activation(self.normalization(self.convolution(x)))
+
+
+class _ShortCut(nn.Module):
+    def __init__(self, in_channels, out_channels, stride=2):
+        super().__init__()
+        self.convolution = nn.Conv2d(in_channels, out_channels, kernel_size=1, stride=stride, bias=False)
+        self.normalization = nn.BatchNorm2d(out_channels)
+
+    def forward(self, x):
+        return self.normalization(self.convolution(x))
+
+
+class _ResidualLayer(nn.Module):
+    """Bottleneck (1x1 -> 3x3 -> 1x1) or basic (3x3 -> 3x3) residual layer"""
+
+    def __init__(self, in_channels, out_channels, stride=1, activation="relu", bottleneck=True,
+                 downsample_in_bottleneck=False):
+        super().__init__()
+        needs_shortcut = in_channels != out_channels or stride != 1
+        self.shortcut = _ShortCut(in_channels, out_channels, stride) if needs_shortcut else nn.Identity()
+        if bottleneck:
+            reduced = out_channels // 4
+            self.layer = nn.Sequential(
+                _ConvLayer(in_channels, reduced, kernel_size=1, stride=stride if downsample_in_bottleneck else 1),
+                _ConvLayer(reduced, reduced, stride=1 if downsample_in_bottleneck else stride),
+                _ConvLayer(reduced, out_channels, kernel_size=1, activation=None)
+            )
+        else:
+            self.layer = nn.Sequential(
+                _ConvLayer(in_channels, out_channels, stride=stride),
+                _ConvLayer(out_channels, out_channels, activation=None)
+            )
+        self.activation = _activation(activation)
+
+    def forward(self, x):
+        return self.activation(self.layer(x) + self.shortcut(x))
+
+
+class _Stage(nn.Module):
+    def __init__(self, in_channels, out_channels, stride, depth, architecture: dict):
+        super().__init__()
+        options = {
+            "activation": architecture["hidden_act"],
+            "bottleneck": architecture["layer_type"] == "bottleneck",
+            "downsample_in_bottleneck": architecture.get("downsample_in_bottleneck", False)
+        }
+        self.layers = nn.Sequential(
+            _ResidualLayer(in_channels, out_channels, stride=stride, **options),
+            *[_ResidualLayer(out_channels, out_channels, **options) for _ in range(depth - 1)]
+        )
+
+    def forward(self, x):
+        return self.layers(x)
+
+
+def build_resnet_network(architecture: dict) -> nn.Sequential:
+    """
+    Build the flat network of build_classifier_graph() from a ResNet config
+    dict (depths, hidden_sizes, embedding_size, num_channels, hidden_act,
+    layer_type, downsample_in_first_stage, downsample_in_bottleneck, num_labels).
+    Weights are left uninitialized; construct it under ``torch.device("meta")``
+    and load a state dict with ``assign=True`` to allocate no memory at all.
+    """
+    hidden_sizes, depths = architecture["hidden_sizes"], architecture["depths"]
+    in_channels = [architecture["embedding_size"]] + hidden_sizes[:-1]
+    strides = [2 if architecture["downsample_in_first_stage"] else 1] + [2] * (len(hidden_sizes) - 1)
+
+    return nn.Sequential(
+        _ConvLayer(architecture["num_channels"], architecture["embedding_size"], kernel_size=7, stride=2,
+                   activation=architecture["hidden_act"]),
+        nn.MaxPool2d(kernel_size=3, stride=2, padding=1),
+        *[_Stage(i, o, s, d, architecture) for i, o, s, d in zip(in_channels, hidden_sizes, strides, depths)],
+        nn.AdaptiveAvgPool2d((1, 1)),
+        nn.Sequential(nn.Flatten(), nn.Linear(hidden_sizes[-1], architecture["num_labels"]))
+    )
+
+
+def resnet_architecture(config) -> dict:
+    """The config fields build_resnet_network() needs, from a transformers ResNetConfig"""
+    return {
+        "depths": list(config.depths),
+        "hidden_sizes": list(config.hidden_sizes),
+        "embedding_size": config.embedding_size,
+        "num_channels": config.num_channels,
+        "hidden_act": config.hidden_act,
+        "layer_type": config.layer_type,
+        "downsample_in_first_stage": config.downsample_in_first_stage,
+        "downsample_in_bottleneck": getattr(config, "downsample_in_bottleneck", False),
+        "num_labels": len(config.id2label)
+    }
+
+
+def forward_logits(model, pixel_values):
+    """Run a Hugging Face model or a ClassifierGraph and return the logits tensor"""
+    outputs = model(pixel_values)
+    return getattr(outputs, "logits", outputs)
@@ -0,0 +1,277 @@
+"""
+Model Quantization - Int8 CPU Inference Mode
+Builds dynamic or static int8 versions of the classifier and verifies them
+against fp32 on the local validation split before they may be activated
+"""
+
+import copy
+import hashlib
+import json
+import statistics
+import time
+from pathlib import Path
+
+import torch
+from torch import nn
+from PIL import Image
+
+from components.model_graph import ClassifierGraph, build_classifier_graph, forward_logits
+
+QUANTIZATION_MODES = ("off", "dynamic", "static")
+
+
+# ==================== QUANTIZATION ====================
+def _select_quantized_engine() -> str:
+    """Pick the best int8 kernel backend available on this CPU"""
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("No int8 quantized engine available in this PyTorch build")
+
+
+def quantize_model(model, mode: str, calibration_batches=None) -> ClassifierGraph:
+    """
+    Build an int8 version of the classifier.
+
+    ``dynamic`` quantizes the Linear head only (PyTorch has no dynamic int8
+    conv kernels), so it is cheap to build but saves little on ResNet-50.
+    ``static`` runs FX post-training quantization over every conv, batch norm
+    and linear layer, calibrated on real images.
+
+    Args:
+        model: Hugging Face ResNet image classification model (fp32)
+        mode: "dynamic" or "static"
+        calibration_batches: Iterable of pixel_values tensors (static mode only)
+
+    Returns:
+        ClassifierGraph: Quantized pixel_values -> logits network
+    """
+    graph = build_classifier_graph(copy.deepcopy(model).eval())
+    engine = _select_quantized_engine()
+
+    if mode == "dynamic":
+        network = torch.ao.quantization.quantize_dynamic(graph.network, {nn.Linear}, dtype=torch.qint8)
+    elif mode == "static":
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if calibration_batches is None:
+            raise ValueError("Static quantization needs calibration batches")
+
+        example_inputs = (torch.zeros(1, 3, 224, 224),)
+        prepared = prepare_fx(graph.network, get_default_qconfig_mapping(engine), example_inputs)
+        with torch.no_grad():
+            for pixel_values in calibration_batches:
+                prepared(pixel_values)
+        network = convert_fx(prepared)
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    return ClassifierGraph(network.eval(), model.config, variant=f"int8-{mode}")
+
+
+# ==================== VERIFICATION ====================
+def iter_pixel_batches(image_paths, processor, batch_size: int = 32):
+    """
+    Load images from disk and preprocess them into pixel_values batches.
+
+    Args:
+        image_paths: List of image file paths
+        processor: Hugging Face image processor
+        batch_size: Images per batch
+
+    Yields:
+        torch.Tensor: pixel_values of shape (batch, 3, H, W)
+    """
+    for start in range(0, len(image_paths), batch_size):
+        images = [Image.open(path).convert("RGB") for path in image_paths[start:start + batch_size]]
+        yield processor(images=images, return_tensors="pt")["pixel_values"]
+
+
+def _median_seconds(model, pixel_values, repeats: int) -> float:
+    """
+    Time repeated forward passes of one batch and return the median duration.
+
+    Args:
+        model: Model to time
+        pixel_values: Batch of pixel_values
+        repeats: Number of timed passes
+
+    Returns:
+        float: Median seconds per pass
+    """
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        forward_logits(model, pixel_values)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def verify_quantized_model(reference, candidate, pixel_batches, min_agreement: float = 0.98,
+                           max_latency_ratio: float = 1.1, timing_repeats: int = 5) -> dict:
+    """
+    Compare a quantized model with the fp32 reference.
+
+    Latency is the median of several timed passes per batch, and the ratio
+    gets some tolerance, so scheduler noise on a single pass cannot flip
+    the gate and silently keep fp32 active.
+
+    Args:
+        reference: fp32 model
+        candidate: Quantized model
+        pixel_batches: Iterable of pixel_values tensors from the validation split
+        min_agreement: Minimum share of images with the same top-1 class
+        max_latency_ratio: Maximum candidate / reference latency ratio
+        timing_repeats: Timed passes per batch and model (after one untimed warm-up)
+
+    Returns:
+        dict: Verification report, with "passed" telling whether the mode may activate
+    """
+    agree = 0
+    total = 0
+    reference_seconds = 0.0
+    candidate_seconds = 0.0
+
+    with torch.inference_mode():
+        for pixel_values in pixel_batches:
+            # The agreement pass doubles as the warm-up for the timed passes
+            reference_top1 = forward_logits(reference, pixel_values).argmax(-1)
+            candidate_top1 = forward_logits(candidate, pixel_values).argmax(-1)
+
+            reference_seconds += _median_seconds(reference, pixel_values, timing_repeats)
+            candidate_seconds += _median_seconds(candidate, pixel_values, timing_repeats)
+
+            agree += int((reference_top1 == candidate_top1).sum())
+            total += len(pixel_values)
+
+    if total == 0:
+        raise ValueError("No validation images to verify against")
+
+    agreement = agree / total
+    latency_ratio = candidate_seconds / reference_seconds if reference_seconds else float("inf")
+
+    return {
+        "variant": getattr(candidate, "variant", "unknown"),
+        "images": total,
+        "top1_agreement": agreement,
+        "fp32_ms_per_image": 1000.0 * reference_seconds / total,
+        "int8_ms_per_image": 1000.0 * candidate_seconds / total,
+        "speedup": 1.0 / latency_ratio if latency_ratio else float("inf"),
+        "min_agreement": min_agreement,
+        "max_latency_ratio": max_latency_ratio,
+        "timing_repeats": timing_repeats,
+        "passed": bool(agreement >= min_agreement and latency_ratio <= max_latency_ratio)
+    }
+
+
+def gate_key(revision: str, mode: str, valid_paths, min_agreement: float, max_latency_ratio: float) -> str:
+    """
+    Identify one gate run: a verdict stays valid while the weights, the mode,
+    the thresholds, the validation images and the PyTorch build are unchanged.
+    """
+    images = hashlib.sha256("\n".join(sorted(str(path) for path in valid_paths)).encode("utf-8")).hexdigest()
+    return f"{revision}|{mode}|{min_agreement:g}|{max_latency_ratio:g}|{images[:16]}|torch-{torch.__version__}"
+
+
+def _read_report(report_path):
+    try:
+        return json.loads(Path(report_path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def build_verified_quantized_model(model, processor, mode: str, valid_paths, calibration_paths,
+                                   report_path=None, min_agreement: float = 0.98,
+                                   max_latency_ratio: float = 1.1, revision: str = None):
+    """
+    Quantize the model and run the accuracy/latency gate on the validation split.
+
+    With a revision and a report_path, the verdict is cached in the report:
+    a later call with the same gate_key() reuses it instead of verifying again
+    (a failed mode is not even quantized).
+
+    Args:
+        model: Hugging Face ResNet image classification model (fp32)
+        processor: Hugging Face image processor
+        mode: "dynamic" or "static"
+        valid_paths: Validation image paths used for the gate
+        calibration_paths: Training image paths used to calibrate static mode
+        report_path: Optional JSON file to write the verification report to
+        min_agreement: Minimum top-1 agreement with fp32
+        max_latency_ratio: Maximum int8 / fp32 latency ratio
+        revision: Optional identifier of the model weights, enables the verdict cache
+
+    Returns:
+        tuple: (quantized model or None if the gate failed, report dict;
+                report["cached"] tells whether the verdict was reused)
+    """
+    if not valid_paths:
+        raise ValueError("Validation split is empty; refusing to activate quantization unverified")
+
+    key = gate_key(revision, mode, valid_paths, min_agreement, max_latency_ratio) if revision else None
+    cached = _read_report(report_path) if key and report_path else None
+    if cached is not None and cached.get("gate_key") != key:
+        cached = None
+    if cached is not None and not cached["passed"]:
+        return None, dict(cached, cached=True)
+
+    calibration = list(iter_pixel_batches(calibration_paths, processor)) if mode == "static" else None
+    candidate = quantize_model(model, mode, calibration)
+    if cached is not None:
+        return candidate, dict(cached, cached=True)
+
+    report = verify_quantized_model(
+        model.eval(),
+        candidate,
+        iter_pixel_batches(valid_paths, processor),
+        min_agreement=min_agreement,
+        max_latency_ratio=max_latency_ratio
+    )
+    report["mode"] = mode
+    report["calibration_images"] = len(calibration_paths) if mode == "static" else 0
+    report["revision"] = revision
+    report["gate_key"] = key
+
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, indent=2))
+
+    report["cached"] = False
+    return (candidate if report["passed"] else None), report
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    # Verification always starts from the fp32 model
+    os.environ["AGRIDETECT_QUANTIZATION"] = "off"
+    from components.ml_model_connector import list_dataset_images, load_plant_disease_model
+
+    parser = argparse.ArgumentParser(description="Verify int8 quantization against fp32 on the validation split")
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES[1:], default="static")
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    parser.add_argument("--calibration-images", type=int, default=128)
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    processor, model = load_plant_disease_model()
+    if model is None:
+        raise SystemExit("❌ Model could not be loaded")
+
+    valid_paths = [path for path, _ in list_dataset_images("valid")]
+    train_paths = [path for path, _ in list_dataset_images("train")]
+    # Spread calibration images over every class folder
+    step = max(1, len(train_paths) // max(1, args.calibration_images))
+    calibration_paths = train_paths[::step][:args.calibration_images]
+
+    _, report = build_verified_quantized_model(
+        model, processor, args.mode, valid_paths, calibration_paths,
+        report_path=args.report, min_agreement=args.min_agreement
+    )
+    print(json.dumps(report, indent=2))
+    print("✅ Quantized mode may be activated" if report["passed"] else "❌ Quantized mode failed verification")
@@ -0,0 +1,356 @@
+"""
+Model Registry - Versioned Local Models With Zero-Downtime Swaps
+Lists the model versions available on this machine (model store snapshots and
+local training outputs such as plant-disease-model-v2), loads a new version in
+a background thread and swaps it in atomically. Requests that already started
+finish on the version they acquired; its weights are released after the last one.
+"""
+
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from components.model_store import MODEL_STORE_DIR, list_snapshots
+
+ACTIVE_POINTER = "ACTIVE"
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+KIND_SNAPSHOT = "snapshot"
+KIND_FOLDER = "folder"
+KIND_HUB = "hub"
+KIND_TORCHSCRIPT = "torchscript"
+
+
+# ==================== DISCOVERY ====================
+def discover_versions(store_dir, model_dirs=()) -> list:
+    """
+    List the model versions that can be loaded without the network.
+
+    Args:
+        store_dir: Root folder of the model store (snapshots from components.model_store)
+        model_dirs: Folders searched for training outputs, i.e. subfolders holding
+            config.json plus model weights (e.g. ./plant-disease-model-v2)
+
+    Returns:
+        list: Dicts with id, kind, path, name and current (the store's CURRENT snapshot)
+    """
+    versions = [
+        {
+            "id": f"{snapshot['name']}@{snapshot['version']}",
+            "kind": KIND_SNAPSHOT,
+            "path": str(snapshot["path"]),
+            "name": snapshot["name"],
+            "current": snapshot["current"]
+        }
+        for snapshot in list_snapshots(store_dir)
+    ]
+
+    seen = set()
+    for model_dir in model_dirs:
+        model_dir = Path(model_dir)
+        if not model_dir.is_dir():
+            continue
+        for folder in sorted(path for path in model_dir.iterdir() if path.is_dir()):
+            resolved = folder.resolve()
+            if resolved in seen or not (folder / "config.json").is_file():
+                continue
+            if not any((folder / name).is_file() for name in WEIGHT_FILES):
+                continue
+            seen.add(resolved)
+            versions.append({
+                "id": folder.name,
+                "kind": KIND_FOLDER,
+                "path": str(folder),
+                "name": folder.name,
+                "current": False
+            })
+    return versions
+
+
+def read_active_pointer(store_dir):
+    """Version id that every server process should serve, or None if not set"""
+    pointer = Path(store_dir) / ACTIVE_POINTER
+    if not pointer.is_file():
+        return None
+    return pointer.read_text(encoding="utf-8").strip() or None
+
+
+def active_pointer_mtime(store_dir):
+    """Modification time of the ACTIVE pointer in nanoseconds, or None if it is not set"""
+    try:
+        return (Path(store_dir) / ACTIVE_POINTER).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def write_active_pointer(store_dir, version_id: str):
+    """Ask every server process using this store to roll out ``version_id``"""
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = store_dir / f"{ACTIVE_POINTER}.tmp"
+    tmp_path.write_text(version_id, encoding="utf-8")
+    os.replace(tmp_path, store_dir / ACTIVE_POINTER)
+
+
+# ==================== HANDLES ====================
+class ModelHandle:
+    """
+    One loaded model version.
+
+    Per-version helpers that hold on to the weights (e.g. the micro-batching
+    inference engine) are created through resource() so they are shut down
+    together with the version.
+    """
+
+    def __init__(self, version_id: str, processor, model):
+        self.version_id = version_id
+        self.processor = processor
+        self.model = model
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self.retired = False
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def resource(self, name: str, factory):
+        """Get a per-version resource, creating it with ``factory(handle)`` on first use"""
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory(self)
+            return self._resources[name]
+
+    def release(self):
+        """Shut down per-version resources and drop the references to the weights"""
+        with self._lock:
+            resources, self._resources = self._resources, {}
+        for resource in resources.values():
+            shutdown = getattr(resource, "shutdown", None)
+            if shutdown is not None:
+                shutdown(wait=True)
+        self.processor = None
+        self.model = None
+
+
+# ==================== REGISTRY ====================
+class ModelRegistry:
+    """
+    Serves one active model version and swaps versions without downtime.
+
+    activate() loads the new version on a background thread while the current
+    one keeps serving; the swap itself is a single reference assignment under a
+    lock. Requests wrap their work in acquire(), which pins the version that
+    was active when they started. A replaced version is released as soon as
+    its last pinned request finishes.
+    """
+
+    def __init__(self, load_version, pointer_reader=None, poll_interval: float = 10.0, pointer_stamp=None):
+        """
+        Args:
+            load_version: Callable mapping a version id to (processor, model); raises on failure
+            pointer_reader: Optional zero-argument callable returning the version id that
+                should be active (e.g. an ACTIVE pointer shared by all server processes)
+            poll_interval: Minimum seconds between pointer checks
+            pointer_stamp: Optional zero-argument callable returning a value that changes
+                whenever the pointer is rewritten (e.g. its mtime). A version that failed
+                to load is retried once the stamp changes, not on every poll, and a
+                version chosen with activate() holds until the stamp changes.
+        """
+        self._load_version = load_version
+        self._pointer_reader = pointer_reader
+        self._pointer_stamp = pointer_stamp
+        self._poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._draining = []
+        self._loading = None
+        self._last_error = None
+        self._held_at = None
+        self._last_swap_seconds = None
+        self._swaps = 0
+        self._next_poll = 0.0
+
+    # ---------- Serving ----------
+    def current(self):
+        """The active ModelHandle, or None if no version is loaded"""
+        self.poll()
+        return self._active
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin the active version for the duration of a request.
+
+        Yields:
+            ModelHandle or None if no version is loaded
+        """
+        self.poll()
+        with self._lock:
+            handle = self._active
+            if handle is not None:
+                handle.in_flight += 1
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                with self._lock:
+                    handle.in_flight -= 1
+                    release = handle.retired and handle.in_flight == 0
+                    if release:
+                        self._draining.remove(handle)
+                if release:
+                    self._release(handle)
+
+    # ---------- Swapping ----------
+    def load(self, version_id: str) -> "ModelHandle":
+        """Load a version on the calling thread and make it active"""
+        started = time.perf_counter()
+        processor, model = self._load_version(version_id)
+        handle = ModelHandle(version_id, processor, model)
+        self._swap(handle, time.perf_counter() - started)
+        return handle
+
+    def activate(self, version_id: str, wait: bool = False) -> bool:
+        """
+        Load a version in the background and swap it in when it is ready.
+        The current version keeps serving until then; if loading fails it stays active.
+        The shared pointer is not followed again until it is rewritten, so the
+        next promote wins over this call.
+
+        Args:
+            version_id: Version to roll out
+            wait: Block until the load has finished
+
+        Returns:
+            bool: False if that version is already active or being loaded
+        """
+        try:
+            stamp = self._pointer_stamp() if self._pointer_stamp is not None else None
+        except OSError:
+            stamp = None
+        self._held_at = (stamp,)
+        return self._start_load(version_id, wait)
+
+    def _start_load(self, version_id: str, wait: bool, stamp=None) -> bool:
+        with self._lock:
+            if self._loading == version_id or (self._active is not None and self._active.version_id == version_id):
+                return False
+            if self._loading is not None:
+                return False
+            self._loading = version_id
+            self._last_error = None
+
+        thread = threading.Thread(target=self._load_in_background, args=(version_id, stamp),
+                                  name=f"agridetect-model-load-{version_id}", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def poll(self):
+        """Start a rollout if the shared pointer names a version other than the active one"""
+        if self._pointer_reader is None or time.monotonic() < self._next_poll:
+            return
+        self._next_poll = time.monotonic() + self._poll_interval
+        try:
+            # Stamp first: a pointer rewritten in between is then seen again on the next poll
+            stamp = self._pointer_stamp() if self._pointer_stamp is not None else None
+            wanted = self._pointer_reader()
+        except OSError:
+            return
+        if self._held_at is not None:
+            if self._held_at[0] == stamp:
+                return
+            self._held_at = None
+        if wanted and not self._failed_at(wanted, stamp):
+            self._start_load(wanted, wait=False, stamp=stamp)
+
+    def _load_in_background(self, version_id: str, stamp):
+        try:
+            self.load(version_id)
+        except Exception as e:
+            with self._lock:
+                self._last_error = (version_id, f"{type(e).__name__}: {e}", stamp)
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def _failed_at(self, version_id: str, stamp) -> bool:
+        # A version that failed to load is not retried on every poll, only after the pointer is rewritten
+        with self._lock:
+            error = self._last_error
+        return error is not None and error[0] == version_id and error[2] == stamp
+
+    def _swap(self, handle: ModelHandle, load_seconds: float):
+        with self._lock:
+            old, self._active = self._active, handle
+            self._last_swap_seconds = load_seconds
+            self._swaps += 1
+            release = False
+            if old is not None:
+                old.retired = True
+                release = old.in_flight == 0
+                if not release:
+                    self._draining.append(old)
+        if release:
+            self._release(old)
+
+    @staticmethod
+    def _release(handle: ModelHandle):
+        handle.release()
+        gc.collect()
+
+    # ---------- Monitoring ----------
+    def status(self) -> dict:
+        """
+        Returns:
+            dict: active version, in-flight requests on it, version being loaded,
+                  retired versions still draining, last load error, last load
+                  seconds and number of swaps
+        """
+        with self._lock:
+            active = self._active
+            return {
+                "active": active.version_id if active else None,
+                "in_flight": active.in_flight if active else 0,
+                "loading": self._loading,
+                "draining": [(handle.version_id, handle.in_flight) for handle in self._draining],
+                "error": self._last_error[1] if self._last_error else None,
+                "last_load_seconds": self._last_swap_seconds,
+                "swaps": self._swaps
+            }
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+
+    app_root = Path(__file__).parent.parent
+    default_model_dirs = [
+        path for path in os.getenv("AGRIDETECT_MODEL_DIRS", "").split(os.pathsep) if path.strip()
+    ] or [app_root, app_root / "AgriDetect-main", app_root / "AgriDetect-main" / "essential_files" / "scripts"]
+
+    parser = argparse.ArgumentParser(description="List local model versions and roll one out to running servers")
+    parser.add_argument("command", choices=["list", "promote"])
+    parser.add_argument("version", nargs="?", help="Version id to promote (see `list`)")
+    parser.add_argument("--store", default=MODEL_STORE_DIR)
+    parser.add_argument("--model-dir", action="append", default=None,
+                        help="Folder holding training outputs (repeatable, default: AGRIDETECT_MODEL_DIRS)")
+    args = parser.parse_args()
+
+    versions = discover_versions(args.store, args.model_dir or default_model_dirs)
+    if args.command == "list":
+        active = read_active_pointer(args.store)
+        for version in versions:
+            marker = "*" if version["id"] == active else " "
+            print(f"{marker} {version['id']:<40} {version['kind']:<9} {version['path']}")
+    else:
+        if not args.version:
+            raise SystemExit("❌ Name the version to promote")
+        if args.version not in {version["id"] for version in versions}:
+            raise SystemExit(f"❌ Unknown version {args.version}; run `list` to see the available ones")
+        write_active_pointer(args.store, args.version)
+        print(f"✅ {args.version} will be rolled out by every server using {args.store}")
@@ -0,0 +1,245 @@
+"""
+Model Store - Offline, Checksum-Verified Model Snapshots
+Exports models once into versioned local snapshot folders with a SHA-256
+manifest, so app replicas can cold start from disk without the Hugging Face Hub
+
+Layout:
+    <store>/<model>/<version>/        config, preprocessor config, model.safetensors
+    <store>/<model>/<version>/manifest.json
+    <store>/<model>/CURRENT           name of the version loaded by default
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+CURRENT_POINTER = "CURRENT"
+
+# The store used by the app, the registry and every CLI: model_store/ in the app
+# root (the folder holding components/) unless AGRIDETECT_MODEL_STORE is set
+MODEL_STORE_DIR = os.getenv("AGRIDETECT_MODEL_STORE") or str(Path(__file__).parent.parent / "model_store")
+
+
+class SnapshotIntegrityError(RuntimeError):
+    """A snapshot file is missing or does not match its manifest checksum"""
+
+
+# ==================== HELPERS ====================
+def snapshot_slug(model_name: str) -> str:
+    """Store folder name for a Hub id or local training output (its last path component)"""
+    return Path(str(model_name).rstrip("/\\")).name
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, text: str):
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+# ==================== EXPORT ====================
+def export_snapshot(model_name: str, store_dir, revision: str = None, make_current: bool = True) -> Path:
+    """
+    Fetch a model once and write it to the store as a new snapshot.
+
+    Args:
+        model_name: Hugging Face Hub id or local model folder (e.g. a training output)
+        store_dir: Root folder of the model store
+        revision: Optional Hub revision (branch, tag or commit)
+        make_current: Point the model's CURRENT file at the new snapshot
+
+    Returns:
+        Path: The snapshot folder
+    """
+    import torch
+    import transformers
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+    processor = AutoImageProcessor.from_pretrained(model_name, revision=revision)
+    model = AutoModelForImageClassification.from_pretrained(model_name, revision=revision)
+
+    source_revision = getattr(model.config, "_commit_hash", None) or revision
+    version = source_revision[:12] if source_revision else time.strftime("%Y%m%d-%H%M%S")
+
+    model_dir = Path(store_dir) / snapshot_slug(model_name)
+    snapshot_dir = model_dir / version
+    staging_dir = model_dir / f".{version}.staging"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    model.save_pretrained(staging_dir, safe_serialization=True)
+    processor.save_pretrained(staging_dir)
+
+    files = {
+        path.relative_to(staging_dir).as_posix(): {"sha256": _sha256_file(path), "bytes": path.stat().st_size}
+        for path in sorted(staging_dir.rglob("*"))
+        if path.is_file()
+    }
+    manifest = {
+        "model_name": model_name,
+        "version": version,
+        "source_revision": source_revision,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "transformers_version": transformers.__version__,
+        "torch_version": torch.__version__,
+        "files": files
+    }
+    (staging_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    # Publish the snapshot in one rename so readers never see a partial folder
+    if snapshot_dir.exists():
+        shutil.rmtree(snapshot_dir)
+    os.replace(staging_dir, snapshot_dir)
+
+    if make_current:
+        _write_atomic(model_dir / CURRENT_POINTER, version)
+
+    return snapshot_dir
+
+
+# ==================== LOOKUP ====================
+def find_snapshot(store_dir, model_name: str, version: str = None):
+    """
+    Locate a snapshot folder in the store.
+
+    Args:
+        store_dir: Root folder of the model store
+        model_name: Hub id, local folder or store folder name
+        version: Specific version, or None for the CURRENT one
+
+    Returns:
+        Path or None if the store has no such snapshot
+    """
+    model_dir = Path(store_dir) / snapshot_slug(model_name)
+
+    if version is None:
+        pointer = model_dir / CURRENT_POINTER
+        if not pointer.is_file():
+            return None
+        version = pointer.read_text(encoding="utf-8").strip()
+
+    snapshot_dir = model_dir / version
+    return snapshot_dir if (snapshot_dir / MANIFEST_NAME).is_file() else None
+
+
+def list_snapshots(store_dir) -> list:
+    """
+    List every snapshot in the store.
+
+    Returns:
+        list: Dicts with name, version, current flag, path and created_at
+    """
+    store_dir = Path(store_dir)
+    if not store_dir.is_dir():
+        return []
+
+    snapshots = []
+    for model_dir in sorted(path for path in store_dir.iterdir() if path.is_dir()):
+        pointer = model_dir / CURRENT_POINTER
+        current = pointer.read_text(encoding="utf-8").strip() if pointer.is_file() else None
+
+        for manifest_path in sorted(model_dir.glob(f"*/{MANIFEST_NAME}")):
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            snapshots.append({
+                "name": model_dir.name,
+                "version": manifest["version"],
+                "current": manifest["version"] == current,
+                "path": manifest_path.parent,
+                "created_at": manifest.get("created_at")
+            })
+    return snapshots
+
+
+# ==================== VERIFY & LOAD ====================
+def verify_snapshot(snapshot_dir) -> dict:
+    """
+    Check every file of a snapshot against its manifest.
+
+    Returns:
+        dict: The manifest
+
+    Raises:
+        SnapshotIntegrityError: If a file is missing, truncated or modified
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest = json.loads((snapshot_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+
+    for relative_path, expected in manifest["files"].items():
+        path = snapshot_dir / relative_path
+        if not path.is_file():
+            raise SnapshotIntegrityError(f"Missing snapshot file: {path}")
+        if path.stat().st_size != expected["bytes"] or _sha256_file(path) != expected["sha256"]:
+            raise SnapshotIntegrityError(f"Checksum mismatch for snapshot file: {path}")
+
+    return manifest
+
+
+def load_snapshot(snapshot_dir, verify: bool = True):
+    """
+    Load a processor and model from a local snapshot, never touching the network.
+
+    Weights are read from model.safetensors, which transformers memory-maps,
+    so replicas loading the same snapshot start from the OS page cache.
+
+    Args:
+        snapshot_dir: Snapshot folder
+        verify: Check SHA-256 checksums against the manifest first
+
+    Returns:
+        tuple: (processor, model)
+    """
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+    snapshot_dir = Path(snapshot_dir)
+    if verify:
+        manifest = verify_snapshot(snapshot_dir)
+    else:
+        manifest = json.loads((snapshot_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+
+    processor = AutoImageProcessor.from_pretrained(snapshot_dir, local_files_only=True)
+    model = AutoModelForImageClassification.from_pretrained(snapshot_dir, local_files_only=True)
+    model.eval()
+
+    # Identify the weights by source model and revision, not by the local path
+    model.config.name_or_path = manifest["model_name"]
+    model.config._commit_hash = manifest.get("source_revision") or manifest["version"]
+
+    return processor, model
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage local AgriDetect model snapshots")
+    parser.add_argument("command", choices=["fetch", "verify", "list"])
+    parser.add_argument("--model", default="Warrior025/plant-disease-model",
+                        help="Hub id or local model folder to snapshot")
+    parser.add_argument("--revision", default=None)
+    parser.add_argument("--version", default=None, help="Snapshot version to verify (default: CURRENT)")
+    parser.add_argument("--store", default=MODEL_STORE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        path = export_snapshot(args.model, args.store, revision=args.revision)
+        print(f"✅ Snapshot written to {path}")
+    elif args.command == "verify":
+        path = find_snapshot(args.store, args.model, args.version)
+        if path is None:
+            raise SystemExit(f"❌ No snapshot of {args.model} in {args.store}")
+        manifest = verify_snapshot(path)
+        print(f"✅ {path}: {len(manifest['files'])} files match their checksums")
+    else:
+        for snapshot in list_snapshots(args.store):
+            marker = "*" if snapshot["current"] else " "
+            print(f"{marker} {snapshot['name']}  {snapshot['version']}  {snapshot['created_at']}  {snapshot['path']}")
@@ -0,0 +1,104 @@
+"""
+Model Warmup - Background Model Loading at App Startup
+Loads the classifier and runs a few dummy batches in a background thread as
+soon as the app starts, so the first user to press "Analyze" does not pay for
+weight loading and the slow first forward passes
+"""
+
+import threading
+import time
+
+WARMUP_PENDING = "pending"
+WARMUP_RUNNING = "running"
+WARMUP_READY = "ready"
+WARMUP_FAILED = "failed"
+
+
+class BackgroundWarmup:
+    """
+    Runs a warmup callable once in a daemon thread and tracks its state.
+
+    The state can be polled from any thread without blocking, so pages can
+    show a "warming up" notice instead of waiting for the model.
+    """
+
+    def __init__(self, warm_up, name: str = "agridetect-model-warmup"):
+        """
+        Args:
+            warm_up: Zero-argument callable doing the warmup work. Returning
+                False (or raising) marks the warmup as failed.
+            name: Thread name
+        """
+        self.warm_up = warm_up
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._state = WARMUP_PENDING
+        self._error = None
+        self._seconds = None
+
+    # ==================== PUBLIC API ====================
+    def start(self) -> bool:
+        """
+        Start the warmup thread unless it was already started.
+
+        Returns:
+            bool: True if this call started the thread
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._state = WARMUP_RUNNING
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            return True
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def is_ready(self) -> bool:
+        """True once the warmup finished successfully (never blocks)"""
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the warmup finished or the timeout expired.
+
+        Returns:
+            bool: True if the warmup finished, successfully or not
+        """
+        thread = self._thread
+        if thread is None:
+            return False
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def status(self) -> dict:
+        """
+        Get the warmup state.
+
+        Returns:
+            dict: state (pending/running/ready/failed), error and seconds taken
+        """
+        with self._lock:
+            return {"state": self._state, "error": self._error, "seconds": self._seconds}
+
+    # ==================== WORKER ====================
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            succeeded = self.warm_up() is not False
+            error = None if succeeded else "Model is not available"
+        except Exception as e:
+            succeeded = False
+            error = f"{type(e).__name__}: {e}"
+
+        with self._lock:
+            self._seconds = time.perf_counter() - started
+            self._state = WARMUP_READY if succeeded else WARMUP_FAILED
+            self._error = error
+        if succeeded:
+            self._ready.set()
@@ -0,0 +1,277 @@
+"""
+Prediction Cache - Content-Addressed Results Store
+Caches model predictions keyed by a digest of the decoded image pixels,
+with an in-memory LRU tier and an optional SQLite tier shared across processes.
+Disk rows hold the compact result form; each model's class names are stored
+once in a label table referenced by digest. The disk tier is bounded by row
+count and age, and is skipped (memory only) if its database cannot be opened.
+Each thread uses its own SQLite connection, so disk I/O never holds the
+lock that guards the memory tier.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from components.prediction_result import LabelTable, PredictionResult
+
+# Stores between two prunes of the disk tier
+PRUNE_EVERY = 64
+
+
+# ==================== IMAGE DIGEST ====================
+def compute_image_digest(image: Image.Image, model_revision: str) -> str:
+    """
+    Compute the cache key for an image.
+
+    The key is a SHA-256 over the decoded RGB pixels and image size, so the
+    same photo re-uploaded under a different file name or re-encoded
+    container still hits, while a different model revision never does.
+
+    Args:
+        image: PIL Image object
+        model_revision: Identifier of the model weights producing predictions
+
+    Returns:
+        str: Hex digest
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    digest = hashlib.sha256()
+    digest.update(model_revision.encode("utf-8"))
+    digest.update(f"|{image.width}x{image.height}|".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+# ==================== SERIALIZATION ====================
+def _encode_result(result: PredictionResult) -> str:
+    """Serialize a prediction for the disk tier (compact form, label table by digest)"""
+    return json.dumps(result.to_compact(with_labels=False), separators=(",", ":"))
+
+
+def _decode_result(payload: str, find_labels=LabelTable.lookup) -> PredictionResult:
+    """
+    Restore a prediction written by _encode_result (older full-probability rows are converted).
+
+    Args:
+        payload: The stored JSON
+        find_labels: Maps a label table digest to the table, or None if unknown
+
+    Raises:
+        KeyError: If the row's label table cannot be found
+    """
+    data = json.loads(payload)
+    labels = find_labels(data["t"]) if "t" in data else None
+    return PredictionResult.from_compact(data, labels)
+
+
+# ==================== CACHE ====================
+class PredictionCache:
+    """Two-tier prediction cache: in-memory LRU backed by an optional SQLite file"""
+
+    def __init__(self, max_entries: int = 512, disk_path=None, max_disk_entries: int = 50000,
+                 max_age_seconds: float = 30 * 24 * 3600):
+        """
+        Args:
+            max_entries: Capacity of the in-memory LRU tier
+            disk_path: Path of the SQLite database for the shared tier, or None
+                to keep the cache in memory only
+            max_disk_entries: Rows kept in the shared tier (oldest pruned first)
+            max_age_seconds: Age after which shared-tier rows are ignored and pruned
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self.max_age_seconds = float(max_age_seconds)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                          "pruned": 0, "unencodable": 0}
+        self._stored_labels = set()
+        self._stores_since_prune = 0
+        self._local = threading.local()
+        self.disk_error = None
+        self._disk = False
+        if self.disk_path:
+            try:
+                self._create_disk_tier()
+                self._disk = True
+            except (sqlite3.Error, OSError) as e:
+                # Read-only file system, locked or corrupt database: keep serving from memory
+                self.disk_error = f"{type(e).__name__}: {e}"
+
+    def _connect(self):
+        """This thread's connection to the disk tier (opened on first use)"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.disk_path), timeout=5.0)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _create_disk_tier(self):
+        self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+        db = self._connect()
+        # WAL lets several threads and Streamlit processes read while one writes
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " digest TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS label_tables ("
+            " digest TEXT PRIMARY KEY,"
+            " names TEXT NOT NULL)"
+        )
+        db.commit()
+
+    def get(self, key: str):
+        """
+        Look up a prediction by image digest.
+
+        Returns:
+            PredictionResult: The cached prediction (immutable, shared by every caller), or None on a miss
+        """
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return result
+
+        if self._disk:
+            try:
+                row = self._connect().execute(
+                    "SELECT payload FROM predictions WHERE digest = ? AND created_at >= ?",
+                    (key, time.time() - self.max_age_seconds)
+                ).fetchone()
+                # A row whose label table was never stored is recomputed
+                result = _decode_result(row[0], self._find_labels) if row is not None else None
+            except (KeyError, sqlite3.Error):
+                result = None
+
+        with self._lock:
+            if result is not None:
+                self._remember(key, result)
+                self._counters["disk_hits"] += 1
+            else:
+                self._counters["misses"] += 1
+        return result
+
+    def put(self, key: str, result: PredictionResult):
+        """Store a prediction in both tiers (memory only if it cannot be serialized)"""
+        payload = None
+        if self._disk:
+            try:
+                payload = _encode_result(result)
+            except (TypeError, ValueError):
+                # e.g. a detail field JSON cannot represent; the memory tier still has it
+                payload = None
+
+        with self._lock:
+            self._remember(key, result)
+            self._counters["stores"] += 1
+            if self._disk and payload is None:
+                self._counters["unencodable"] += 1
+            new_labels = result.labels.digest not in self._stored_labels
+
+        if payload is None:
+            return
+        try:
+            db = self._connect()
+            if new_labels:
+                db.execute(
+                    "INSERT OR IGNORE INTO label_tables (digest, names) VALUES (?, ?)",
+                    (result.labels.digest, json.dumps(result.labels.names))
+                )
+            db.execute(
+                "INSERT OR REPLACE INTO predictions (digest, payload, created_at) VALUES (?, ?, ?)",
+                (key, payload, time.time())
+            )
+            db.commit()
+        except sqlite3.Error:
+            # The shared tier is best effort; the memory tier still has it
+            return
+
+        with self._lock:
+            self._stored_labels.add(result.labels.digest)
+            self._stores_since_prune += 1
+            prune = self._stores_since_prune >= PRUNE_EVERY
+            if prune:
+                self._stores_since_prune = 0
+        if prune:
+            try:
+                self._prune()
+            except sqlite3.Error:
+                pass
+
+    def _prune(self):
+        """Drop shared-tier rows past max_age_seconds, then the oldest beyond max_disk_entries"""
+        db = self._connect()
+        expired = db.execute(
+            "DELETE FROM predictions WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+        ).rowcount
+        overflow = db.execute(
+            "DELETE FROM predictions WHERE digest IN ("
+            " SELECT digest FROM predictions ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        ).rowcount
+        db.commit()
+        with self._lock:
+            self._counters["pruned"] += expired + overflow
+
+    def _find_labels(self, digest: str):
+        """Label table by digest: interned in this process, else read from the disk tier"""
+        labels = LabelTable.lookup(digest)
+        if labels is None:
+            row = self._connect().execute("SELECT names FROM label_tables WHERE digest = ?", (digest,)).fetchone()
+            labels = LabelTable.intern(json.loads(row[0])) if row is not None else None
+        return labels
+
+    def _remember(self, key: str, result: PredictionResult):
+        if self.max_entries == 0:
+            return
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        """Get hit/miss counters for sizing the cache"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+        stats["disk_entries"] = None
+        stats["disk_error"] = self.disk_error
+        if self._disk:
+            try:
+                stats["disk_entries"] = self._connect().execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            except sqlite3.Error:
+                pass
+
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop every cached prediction from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self._disk:
+            db = self._connect()
+            db.execute("DELETE FROM predictions")
+            db.commit()
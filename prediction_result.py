@@ -0,0 +1,252 @@
+"""
+Prediction Result - Compact, Immutable Classifier Output
+A prediction keeps only its top-k class indices and probabilities (int16 and
+float32 arrays of k entries) plus a reference to the model's label table,
+which is interned so every result of one model shares a single list of class
+names. Results are frozen and slotted: the prediction cache, the worker pool
+and session state hold and pass the same small object around instead of
+copying dicts with a full probability vector and a fresh class-name list.
+to_compact() / from_compact() give the JSON form used by the disk cache.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass, fields, replace
+
+import numpy as np
+
+# Classes kept per prediction (the Results page lists the top 5)
+TOP_K = 5
+
+# Version of the to_compact() format
+COMPACT_VERSION = 1
+
+# Decimals kept for probabilities and maps in the compact form (float32 has ~7 significant digits)
+COMPACT_DECIMALS = 6
+
+
+# ==================== LABEL TABLE ====================
+class LabelTable:
+    """
+    Class names by index; intern() returns one shared instance per distinct
+    table. ``digest`` identifies the table in compact results stored without
+    their class names.
+    """
+
+    __slots__ = ("names", "digest", "_positions")
+
+    _interned = {}
+    _by_digest = {}
+    _lock = threading.Lock()
+
+    def __init__(self, names):
+        self.names = tuple(str(name) for name in names)
+        self.digest = hashlib.sha1("\n".join(self.names).encode("utf-8")).hexdigest()[:16]
+        self._positions = {name: idx for idx, name in enumerate(self.names)}
+
+    @classmethod
+    def intern(cls, names) -> "LabelTable":
+        names = tuple(str(name) for name in names)
+        with cls._lock:
+            table = cls._interned.get(names)
+            if table is None:
+                table = cls._interned[names] = cls(names)
+                cls._by_digest[table.digest] = table
+            return table
+
+    @classmethod
+    def lookup(cls, digest: str):
+        """An interned table by digest, or None if this process has not seen it"""
+        with cls._lock:
+            return cls._by_digest.get(digest)
+
+    @classmethod
+    def from_id2label(cls, id2label: dict) -> "LabelTable":
+        """The table of a model config's ``id2label`` mapping"""
+        return cls.intern(id2label[idx] for idx in range(len(id2label)))
+
+    def index(self, name: str):
+        """Index of a class name, or None if the table does not contain it"""
+        return self._positions.get(name)
+
+    def __getitem__(self, idx) -> str:
+        return self.names[idx]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __reduce__(self):
+        # Unpickled tables (worker pool replies, persisted sessions) are re-interned
+        return LabelTable.intern, (self.names,)
+
+
+def _frozen_array(values, dtype) -> np.ndarray:
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+# ==================== RESULT ====================
+@dataclass(frozen=True, slots=True, eq=False)
+class PredictionResult:
+    """
+    One image's prediction: top-k classes and optional per-feature details.
+
+    Args:
+        labels: The model's shared LabelTable
+        top_indices: int16 (k,) class indices, most probable first
+        top_probabilities: float32 (k,) their probabilities
+        demo_mode: Predicted by the colour/texture fallback classifier
+        cascade_stage: "fast" or "full" when the model cascade answered
+        tta: Test-time augmentation details (first_confidence, views, dropped, ms)
+        saliency_map: Grad-CAM heatmap of the predicted class (h, w) float32
+        saliency_box: Model crop as (left, top, right, bottom) image fractions
+        similar_cases: Nearest training images (path, label, label_name, similarity dicts)
+        severity: Affected foliage fraction (tiled inference)
+        severity_map: Grid of tile severities, NaN where no tile was classified
+        tiles: Per-tile box, class index, confidence and severity dicts
+        working_size: (width, height) the tiles were cut from
+        tile_size: Tile edge in pixels
+    """
+
+    labels: LabelTable
+    top_indices: np.ndarray
+    top_probabilities: np.ndarray
+    demo_mode: bool = False
+    cascade_stage: str = None
+    tta: dict = None
+    saliency_map: np.ndarray = None
+    saliency_box: tuple = None
+    similar_cases: tuple = None
+    severity: float = None
+    severity_map: np.ndarray = None
+    tiles: tuple = None
+    working_size: tuple = None
+    tile_size: int = None
+
+    @classmethod
+    def from_probabilities(cls, probabilities, labels: LabelTable, top_k: int = TOP_K, **details) -> "PredictionResult":
+        """
+        Keep the top_k entries of a full class probability vector.
+
+        Args:
+            probabilities: (C,) class probabilities in label table order
+            labels: Label table of the model
+            top_k: Classes kept
+            **details: Optional fields (saliency_map, tta, ...)
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        # Stable, so ties keep the lowest class index first (like argmax)
+        top = np.argsort(-probabilities, kind="stable")[:top_k]
+        return cls(labels, _frozen_array(top, np.int16), _frozen_array(probabilities[top], np.float32), **details)
+
+    @property
+    def predicted_class_idx(self) -> int:
+        return int(self.top_indices[0])
+
+    @property
+    def predicted_disease(self) -> str:
+        return self.labels[int(self.top_indices[0])]
+
+    @property
+    def confidence(self) -> float:
+        return float(self.top_probabilities[0])
+
+    def top(self, k: int = None) -> list:
+        """(class name, probability) pairs, most probable first"""
+        count = len(self.top_indices) if k is None else min(k, len(self.top_indices))
+        return [(self.labels[int(idx)], float(prob))
+                for idx, prob in zip(self.top_indices[:count], self.top_probabilities[:count])]
+
+    def probability_of(self, name: str):
+        """Probability of a class by name, or None if it is not among the kept top-k"""
+        idx = self.labels.index(name)
+        matches = np.flatnonzero(self.top_indices == idx) if idx is not None else ()
+        return float(self.top_probabilities[matches[0]]) if len(matches) else None
+
+    def with_details(self, **changes) -> "PredictionResult":
+        """Copy with some optional fields set (the arrays and label table are shared)"""
+        return replace(self, **changes)
+
+    def __reduce__(self):
+        # The top-k arrays travel as raw bytes: a pickled ndarray carries ~150 bytes of header
+        details = tuple(getattr(self, name) for name in _DETAIL_FIELDS)
+        return _unpickle_result, (self.labels, self.top_indices.tobytes(), self.top_probabilities.tobytes(), details)
+
+    # ---------- Compact form ----------
+    def to_compact(self, with_labels: bool = True) -> dict:
+        """
+        JSON-ready dict: labels, top indices and rounded probabilities under
+        short keys, plus only the optional fields that are set.
+
+        Args:
+            with_labels: Embed the class names; if False only the label table
+                digest is stored (``"t"``) and from_compact() needs the table
+        """
+        payload = {"v": COMPACT_VERSION}
+        if with_labels:
+            payload["labels"] = list(self.labels.names)
+        else:
+            payload["t"] = self.labels.digest
+        payload["i"] = self.top_indices.tolist()
+        payload["p"] = np.round(self.top_probabilities.astype(np.float64), COMPACT_DECIMALS).tolist()
+        for name in _DETAIL_FIELDS:
+            value = getattr(self, name)
+            if value is None or value is False:
+                continue
+            if isinstance(value, np.ndarray):
+                value = np.round(value.astype(np.float64), COMPACT_DECIMALS).tolist()
+            elif isinstance(value, tuple):
+                value = list(value)
+            payload[name] = value
+        return payload
+
+    @classmethod
+    def from_compact(cls, payload: dict, labels: LabelTable = None) -> "PredictionResult":
+        """
+        Restore a result from to_compact() output (or from a legacy full-probability result dict).
+
+        Args:
+            payload: The compact dict
+            labels: Label table of a payload stored without its class names
+                (default: the interned table with the stored digest)
+
+        Raises:
+            KeyError: If the payload only names a label table that is unknown here
+        """
+        details = {}
+        for name in _DETAIL_FIELDS:
+            if name not in payload:
+                continue
+            value = payload[name]
+            if name in _ARRAY_FIELDS:
+                value = _frozen_array(value, np.float32)
+            elif name in _TUPLE_FIELDS:
+                value = tuple(value)
+            details[name] = value
+
+        if "v" not in payload:
+            return cls.from_probabilities(payload["all_probabilities"], LabelTable.intern(payload["all_classes"]),
+                                          **details)
+        if "labels" in payload:
+            labels = LabelTable.intern(payload["labels"])
+        elif labels is None:
+            labels = LabelTable.lookup(payload["t"])
+            if labels is None:
+                raise KeyError(f"Unknown label table {payload['t']}")
+        return cls(labels, _frozen_array(payload["i"], np.int16),
+                   _frozen_array(payload["p"], np.float32), **details)
+
+
+def _unpickle_result(labels, top_indices: bytes, top_probabilities: bytes, details: tuple) -> PredictionResult:
+    return PredictionResult(labels, _frozen_array(np.frombuffer(top_indices, dtype=np.int16), np.int16),
+                            _frozen_array(np.frombuffer(top_probabilities, dtype=np.float32), np.float32),
+                            *details)
+
+
+_DETAIL_FIELDS = tuple(field.name for field in fields(PredictionResult)[3:])
+_ARRAY_FIELDS = ("saliency_map", "severity_map")
+_TUPLE_FIELDS = ("saliency_box", "similar_cases", "tiles", "working_size")
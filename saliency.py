@@ -0,0 +1,144 @@
+"""
+Saliency - Grad-CAM Heatmaps From the Prediction Forward Pass
+Captures the last convolutional block's activations with a forward hook while
+the image is being classified, and turns them into a per-image heatmap of the
+regions that drove the predicted class. No second inference, no backward pass.
+
+For this classifier's head (global average pooling -> linear layer) the
+Grad-CAM channel weights, i.e. the spatially averaged gradients of the class
+logit, are exactly the linear weights of that class divided by the number of
+positions, so Grad-CAM equals ReLU(sum_k W[c, k] * A_k) up to a constant factor.
+"""
+
+import numpy as np
+from PIL import Image
+
+from components.prediction_result import PredictionResult
+
+# Heatmap colours from cold to hot (blue -> cyan -> yellow -> red)
+COLORMAP_STOPS = np.array([
+    [0, 0, 160],
+    [0, 190, 255],
+    [255, 230, 0],
+    [230, 20, 0]
+], dtype=np.float32)
+
+
+# ==================== MODEL INTROSPECTION ====================
+def saliency_layers(model):
+    """
+    Find the last convolutional block and the final linear layer of the classifier.
+
+    Supports the Hugging Face ResNet and a ClassifierGraph over nn.Sequential
+    (fp32 or dynamic int8). TorchScript and FX-quantized graphs are opaque.
+
+    Returns:
+        tuple: (conv block module, linear module), or None if unsupported
+    """
+    from torch import nn
+
+    if hasattr(model, "resnet") and hasattr(model, "classifier"):
+        block, head = model.resnet.encoder.stages[-1], model.classifier
+    elif isinstance(getattr(model, "network", None), nn.Sequential) and len(model.network) >= 3:
+        block, head = model.network[-3], model.network[-1]
+    else:
+        return None
+
+    linear = head[-1] if isinstance(head, nn.Sequential) else head
+    if not hasattr(linear, "weight"):
+        return None
+    return block, linear
+
+
+def _linear_weight(linear) -> np.ndarray:
+    """(classes, channels) weights of a float or dynamically quantized Linear layer"""
+    weight = linear.weight() if callable(linear.weight) else linear.weight
+    if weight.is_quantized:
+        weight = weight.dequantize()
+    return weight.detach().float().numpy()
+
+
+class ActivationCapture:
+    """
+    Context manager keeping the output of one module during a forward pass.
+
+    Usage:
+        with ActivationCapture(block) as capture:
+            logits = model(pixel_values)
+        activations = capture.activations
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.activations = None
+        self._handle = None
+
+    def _hook(self, module, inputs, output):
+        self.activations = output.dequantize() if output.is_quantized else output
+
+    def __enter__(self):
+        self._handle = self.module.register_forward_hook(self._hook)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._handle.remove()
+        self._handle = None
+
+
+# ==================== HEATMAPS ====================
+def class_activation_maps(activations, linear, class_indices) -> np.ndarray:
+    """
+    Heatmaps of the given classes from captured activations.
+
+    Args:
+        activations: (N, K, h, w) output of the last conv block
+        linear: Final linear layer (classes x K weights)
+        class_indices: Class to explain per image, usually the predicted one
+
+    Returns:
+        np.ndarray: float32 (N, h, w) maps scaled to [0, 1]
+    """
+    features = activations.detach().float().numpy()
+    weights = _linear_weight(linear)[np.asarray(class_indices)]
+
+    maps = np.maximum(np.einsum("nk,nkhw->nhw", weights, features), 0)
+    peak = maps.reshape(len(maps), -1).max(axis=1)
+    maps /= np.where(peak > 0, peak, 1.0)[:, None, None]
+    return maps.astype(np.float32)
+
+
+def colorize(saliency_map: np.ndarray) -> np.ndarray:
+    """Map [0, 1] values to RGB uint8 along COLORMAP_STOPS"""
+    positions = np.clip(saliency_map, 0, 1) * (len(COLORMAP_STOPS) - 1)
+    lower = np.floor(positions).astype(int).clip(0, len(COLORMAP_STOPS) - 2)
+    fraction = (positions - lower)[..., None]
+    rgb = COLORMAP_STOPS[lower] * (1 - fraction) + COLORMAP_STOPS[lower + 1] * fraction
+    return rgb.astype(np.uint8)
+
+
+def render_saliency_overlay(image: Image.Image, result: PredictionResult, alpha: float = 0.55) -> Image.Image:
+    """
+    Blend the heatmap over the image region the model saw.
+
+    Args:
+        image: The displayed image
+        result: Prediction result holding ``saliency_map`` and ``saliency_box``
+            (model crop as fractions of the image width and height)
+        alpha: Opacity at the hottest positions (cold positions stay see-through)
+    """
+    base = image.convert("RGB")
+    width, height = base.size
+    left, top, right, bottom = result.saliency_box or (0.0, 0.0, 1.0, 1.0)
+    box = (round(left * width), round(top * height), round(right * width), round(bottom * height))
+    size = (max(1, box[2] - box[0]), max(1, box[3] - box[1]))
+
+    saliency_map = np.asarray(result.saliency_map, dtype=np.float32)
+    smooth = np.asarray(Image.fromarray(saliency_map, mode="F").resize(size, Image.BICUBIC)).clip(0, 1)
+
+    region = np.asarray(base.crop(box), dtype=np.float32)
+    weight = (alpha * np.sqrt(smooth))[..., None]
+    blended = region * (1 - weight) + colorize(smooth).astype(np.float32) * weight
+
+    output = base.copy()
+    output.paste(Image.fromarray(blended.astype(np.uint8)), box[:2])
+    return output
@@ -0,0 +1,287 @@
+"""
+Shadow Inference - Evaluate a Candidate Model on Live Traffic
+Every production prediction is also handed to a background worker that runs
+the candidate model on the same image and records disagreement, confidence
+deltas and latency in a local SQLite store. The hand-off never blocks: when
+the bounded queue is full the shadow work is dropped and counted.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from components.prediction_cache import compute_image_digest
+from components.prediction_result import PredictionResult
+
+
+# ==================== STORE ====================
+class ShadowStore:
+    """SQLite table of primary vs candidate predictions, one row per shadowed request"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+        # WAL lets several Streamlit processes append to the same store
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shadow_predictions ("
+            " created_at REAL NOT NULL,"
+            " image_digest TEXT NOT NULL,"
+            " primary_version TEXT NOT NULL,"
+            " candidate_version TEXT NOT NULL,"
+            " primary_class TEXT NOT NULL,"
+            " candidate_class TEXT NOT NULL,"
+            " primary_confidence REAL NOT NULL,"
+            " candidate_confidence REAL NOT NULL,"
+            " candidate_primary_probability REAL,"
+            " agree INTEGER NOT NULL,"
+            " latency_ms REAL NOT NULL,"
+            " queue_ms REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS shadow_by_candidate ON shadow_predictions (candidate_version, created_at)"
+        )
+        self._db.commit()
+
+    def record(self, rows: list):
+        """Append rows (dicts keyed by column name)"""
+        if not rows:
+            return
+        columns = list(rows[0])
+        with self._lock:
+            self._db.executemany(
+                f"INSERT INTO shadow_predictions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(row[column] for column in columns) for row in rows]
+            )
+            self._db.commit()
+
+    def summary(self, candidate_version: str = None, since: float = 0.0, top_pairs: int = 5) -> dict:
+        """
+        Aggregate the shadow results.
+
+        Args:
+            candidate_version: Only this candidate, or None for all rows
+            since: Only rows recorded after this UNIX time
+            top_pairs: Number of most frequent disagreement pairs to list
+
+        Returns:
+            dict: requests, disagreement_rate, mean_confidence_delta (candidate - primary),
+                  mean_abs_confidence_delta, candidate latency percentiles and
+                  top_disagreements as (primary class, candidate class, count)
+        """
+        where = "created_at >= ?"
+        params = [since]
+        if candidate_version is not None:
+            where += " AND candidate_version = ?"
+            params.append(candidate_version)
+
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT agree, candidate_confidence - primary_confidence, latency_ms "
+                f"FROM shadow_predictions WHERE {where}", params
+            ).fetchall()
+            pairs = self._db.execute(
+                f"SELECT primary_class, candidate_class, COUNT(*) AS n FROM shadow_predictions "
+                f"WHERE {where} AND agree = 0 GROUP BY primary_class, candidate_class "
+                f"ORDER BY n DESC LIMIT ?", params + [top_pairs]
+            ).fetchall()
+
+        if not rows:
+            return {"requests": 0, "disagreement_rate": None, "mean_confidence_delta": None,
+                    "mean_abs_confidence_delta": None, "p50_ms": None, "p95_ms": None, "p99_ms": None,
+                    "top_disagreements": []}
+
+        agree, delta, latency = (np.asarray(column, dtype=np.float64) for column in zip(*rows))
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        return {
+            "requests": len(rows),
+            "disagreement_rate": float(1.0 - agree.mean()),
+            "mean_confidence_delta": float(delta.mean()),
+            "mean_abs_confidence_delta": float(np.abs(delta).mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "top_disagreements": [tuple(pair) for pair in pairs]
+        }
+
+
+# ==================== WORKER ====================
+class ShadowRunner:
+    """
+    Background worker running the candidate model on shadowed requests.
+
+    submit() only puts the image on a bounded queue (put_nowait) and returns;
+    the worker drains up to ``max_batch`` queued requests per forward pass at
+    the lowest OS scheduling priority, so the primary path is not slowed down.
+    The candidate is loaded by the worker itself on first use.
+    """
+
+    def __init__(self, load_candidate, store: ShadowStore, candidate_version: str,
+                 max_queue: int = 32, max_batch: int = 8):
+        """
+        Args:
+            load_candidate: Zero-argument callable returning predict(images) -> list of
+                PredictionResults; called once on the worker thread
+            store: Where results are recorded
+            candidate_version: Name of the candidate model, stored with every row
+            max_queue: Shadow requests waiting at most; more are dropped
+            max_batch: Shadow requests per candidate forward pass
+        """
+        self.candidate_version = candidate_version
+        self.store = store
+        self.max_batch = max(1, int(max_batch))
+        self._load_candidate = load_candidate
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "dropped": 0, "processed": 0, "failed": 0}
+        self._error = None
+        self._last_failure = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._worker_loop, name="agridetect-shadow", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, primary_result: PredictionResult, primary_version: str) -> bool:
+        """
+        Queue a production prediction for shadow evaluation. Never blocks.
+
+        Returns:
+            bool: False if the request was dropped (queue full, worker stopped or failed)
+        """
+        if self._closed or self._error is not None:
+            return False
+
+        item = (time.perf_counter(), image, primary_result.predicted_disease,
+                primary_result.confidence, primary_version)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            return False
+
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def stats(self) -> dict:
+        """Get worker counters (submitted, dropped, processed, failed, queued), the load error and the last failure"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["candidate_version"] = self.candidate_version
+        stats["error"] = self._error
+        stats["last_failure"] = self._last_failure
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker after the requests already queued have been evaluated"""
+        self._closed = True
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _worker_loop(self):
+        if hasattr(os, "setpriority"):
+            try:
+                # On Linux a thread id is a valid PRIO_PROCESS target: only this thread is deprioritized
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+            except OSError:
+                pass
+
+        try:
+            predict = self._load_candidate()
+        except Exception as e:
+            self._error = f"{type(e).__name__}: {e}"
+            return
+
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [item for item in batch if item is not None]
+            if batch:
+                self._run(predict, batch)
+
+    def _run(self, predict, batch):
+        started = time.perf_counter()
+        try:
+            results = predict([image for _, image, _, _, _ in batch])
+        except Exception as e:
+            with self._stats_lock:
+                self._stats["failed"] += len(batch)
+            self._last_failure = f"{type(e).__name__}: {e}"
+            return
+        latency_ms = 1000.0 * (time.perf_counter() - started) / len(batch)
+
+        rows = []
+        for (queued_at, image, primary_class, primary_confidence, primary_version), result in zip(batch, results):
+            primary_probability = result.probability_of(primary_class)
+            rows.append({
+                "created_at": time.time(),
+                "image_digest": compute_image_digest(image, ""),
+                "primary_version": primary_version,
+                "candidate_version": self.candidate_version,
+                "primary_class": primary_class,
+                "candidate_class": result.predicted_disease,
+                "primary_confidence": primary_confidence,
+                "candidate_confidence": result.confidence,
+                "candidate_primary_probability": primary_probability,
+                "agree": int(result.predicted_disease == primary_class),
+                "latency_ms": latency_ms,
+                "queue_ms": 1000.0 * (started - queued_at)
+            })
+
+        try:
+            self.store.record(rows)
+        except sqlite3.Error:
+            with self._stats_lock:
+                self._stats["failed"] += len(rows)
+            return
+        with self._stats_lock:
+            self._stats["processed"] += len(rows)
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize shadow inference results")
+    parser.add_argument("--db", default=os.getenv("AGRIDETECT_SHADOW_DB", ".cache/agridetect/shadow.sqlite3"))
+    parser.add_argument("--candidate", default=None, help="Only this candidate version")
+    parser.add_argument("--hours", type=float, default=None, help="Only the last N hours")
+    args = parser.parse_args()
+
+    if not Path(args.db).is_file():
+        raise SystemExit(f"❌ No shadow store at {args.db}")
+
+    since = time.time() - 3600 * args.hours if args.hours else 0.0
+    summary = ShadowStore(args.db).summary(args.candidate, since=since)
+    if not summary["requests"]:
+        raise SystemExit("No shadowed requests recorded yet")
+
+    print(f"Shadowed requests:   {summary['requests']}")
+    print(f"Disagreement rate:   {summary['disagreement_rate']:.1%}")
+    print(f"Confidence delta:    {summary['mean_confidence_delta']:+.3f} mean, "
+          f"{summary['mean_abs_confidence_delta']:.3f} mean absolute (candidate - primary)")
+    print(f"Candidate latency:   p50 {summary['p50_ms']:.1f} ms   p95 {summary['p95_ms']:.1f} ms   "
+          f"p99 {summary['p99_ms']:.1f} ms")
+    for primary_class, candidate_class, count in summary["top_disagreements"]:
+        print(f"   {count:>5}x  {primary_class}  ->  {candidate_class}")
@@ -0,0 +1,261 @@
+"""
+Shared Weights - One Memory-Mapped Copy of the Classifier per Host
+Publishes a model version's float32 weights as a plain PyTorch state dict in a
+shared folder (by default /dev/shm, i.e. RAM), next to the architecture and
+preprocessing constants. Server processes and inference workers then attach
+with torch.load(mmap=True) onto a network built on the meta device: every
+replica maps the same page-cache pages instead of holding a private copy, and
+start-up skips the transformers import, the snapshot checksum pass and
+from_pretrained.
+
+A published copy is only attached if the shared folder belongs to this user
+and nobody else can write to it, and if it was published from the same
+source files (snapshot manifest, or the weight files of a training folder)
+the version has now; otherwise the version is loaded from its source.
+
+Layout:
+    <shared>/<version>/weights.pt   state dict of the flat ClassifierGraph network
+    <shared>/<version>/model.json   architecture, labels, preprocessing, source revision and fingerprint
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from components.model_registry import KIND_FOLDER, KIND_SNAPSHOT, WEIGHT_FILES
+from components.model_store import MANIFEST_NAME
+
+WEIGHTS_FILE = "weights.pt"
+MODEL_FILE = "model.json"
+
+# Files of a training output folder whose size and modification time identify its weights
+FOLDER_SOURCE_FILES = ("config.json", "preprocessor_config.json") + WEIGHT_FILES
+
+
+def shared_dir_name(version_id: str) -> str:
+    """Folder name of one published model version"""
+    return "".join(char if char.isalnum() or char in "-_." else "_" for char in version_id)
+
+
+def source_fingerprint(version: dict):
+    """
+    Identity of a model version's source files, checked before a published copy is attached.
+
+    Args:
+        version: Entry of discover_versions() / list_model_versions()
+
+    Returns:
+        str: sha256 of the snapshot manifest (which holds the weight checksums), or
+             of the name, size and mtime of a training folder's files; None for
+             versions without local files (Hub, TorchScript), which are never shared
+    """
+    digest = hashlib.sha256()
+    if version["kind"] == KIND_SNAPSHOT:
+        digest.update((Path(version["path"]) / MANIFEST_NAME).read_bytes())
+    elif version["kind"] == KIND_FOLDER:
+        for name in FOLDER_SOURCE_FILES:
+            path = Path(version["path"]) / name
+            if path.is_file():
+                info = path.stat()
+                digest.update(f"{name}:{info.st_size}:{info.st_mtime_ns}\n".encode("utf-8"))
+    else:
+        return None
+    return digest.hexdigest()
+
+
+def _is_private_dir(folder: Path) -> bool:
+    """True if this user owns the folder and neither group nor others can write to it"""
+    info = folder.stat()
+    owner_ok = not hasattr(os, "getuid") or info.st_uid == os.getuid()
+    return owner_ok and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+# ==================== PUBLISH ====================
+def publish_shared_weights(model, processor, shared_dir, version_id: str, fingerprint: str) -> Path:
+    """
+    Write a model version's weights to the shared folder (replacing an older copy).
+
+    Args:
+        model: Float32 Hugging Face ResNet image classification model
+        processor: Its image processor (the preprocessing constants are stored)
+        shared_dir: Root of the shared weights folder (created with mode 0700)
+        version_id: Model version id the copy is published under
+        fingerprint: source_fingerprint() of the version the weights were loaded from
+
+    Returns:
+        Path: The published folder
+
+    Raises:
+        PermissionError: If the shared folder is owned by another user or writable by others
+    """
+    import torch
+
+    from components.image_preprocessing import spec_from_processor
+    from components.model_graph import build_classifier_graph, resnet_architecture
+
+    graph = build_classifier_graph(model.eval())
+    config = model.config
+    spec = processor.spec if hasattr(processor, "spec") else spec_from_processor(processor)
+    metadata = {
+        "version": version_id,
+        "model_name": config.name_or_path,
+        "source_revision": getattr(config, "_commit_hash", None),
+        "source_fingerprint": fingerprint,
+        "architecture": resnet_architecture(config),
+        "id2label": {str(idx): label for idx, label in config.id2label.items()},
+        "preprocessing": spec.to_dict(),
+        "torch": torch.__version__,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+
+    shared_dir = Path(shared_dir)
+    shared_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not _is_private_dir(shared_dir):
+        raise PermissionError(f"{shared_dir} must belong to this user and not be writable by others")
+    target = shared_dir / shared_dir_name(version_id)
+    staging = shared_dir / f".{target.name}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(mode=0o700)
+
+    state = {name: tensor.contiguous() for name, tensor in graph.network.state_dict().items()}
+    torch.save(state, staging / WEIGHTS_FILE)
+    (staging / MODEL_FILE).write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+
+    # Processes already attached keep their mapping of the old (unlinked) file
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return target
+
+
+def find_shared_weights(shared_dir, version_id: str, fingerprint: str):
+    """
+    Folder of a published version that may be attached.
+
+    Args:
+        shared_dir: Root of the shared weights folder ("" disables sharing)
+        version_id: Model version id
+        fingerprint: source_fingerprint() of the version as it is now
+
+    Returns:
+        Path: The folder, or None if the version is not published, was published
+              from other source files, or the folder is not private to this user
+    """
+    if not shared_dir or fingerprint is None:
+        return None
+    root = Path(shared_dir)
+    folder = root / shared_dir_name(version_id)
+    if not ((folder / WEIGHTS_FILE).is_file() and (folder / MODEL_FILE).is_file()):
+        return None
+    if not (_is_private_dir(root) and _is_private_dir(folder)):
+        return None
+    metadata = json.loads((folder / MODEL_FILE).read_text(encoding="utf-8"))
+    return folder if metadata.get("source_fingerprint") == fingerprint else None
+
+
+def list_shared_weights(shared_dir) -> list:
+    """
+    Returns:
+        list: One dict (version, model_name, size_mb, created_at, path) per published copy
+    """
+    root = Path(shared_dir)
+    if not root.is_dir():
+        return []
+    published = []
+    for folder in sorted(root.iterdir()):
+        if folder.name.startswith(".") or not (folder / MODEL_FILE).is_file():
+            continue
+        metadata = json.loads((folder / MODEL_FILE).read_text(encoding="utf-8"))
+        published.append({
+            "version": metadata["version"],
+            "model_name": metadata["model_name"],
+            "size_mb": (folder / WEIGHTS_FILE).stat().st_size / 1e6,
+            "created_at": metadata["created_at"],
+            "path": str(folder)
+        })
+    return published
+
+
+# ==================== ATTACH ====================
+def attach_shared_model(folder):
+    """
+    Map a published copy into this process without copying the weights.
+
+    The network is built on the meta device (no allocation) and the mapped
+    tensors are assigned to it directly, so the weights stay backed by the
+    shared file: resident once per host however many processes attach.
+
+    Returns:
+        tuple: (FastImageProcessor, ClassifierGraph with the source model's name and revision)
+    """
+    import torch
+
+    from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+    from components.model_graph import ClassifierGraph, build_resnet_network
+
+    folder = Path(folder)
+    metadata = json.loads((folder / MODEL_FILE).read_text(encoding="utf-8"))
+
+    with torch.device("meta"):
+        network = build_resnet_network(metadata["architecture"])
+    state = torch.load(folder / WEIGHTS_FILE, map_location="cpu", mmap=True, weights_only=True)
+    network.load_state_dict(state, strict=True, assign=True)
+
+    config = SimpleNamespace(
+        name_or_path=metadata["model_name"],
+        _commit_hash=metadata.get("source_revision"),
+        id2label={int(idx): label for idx, label in metadata["id2label"].items()}
+    )
+    processor = FastImageProcessor(PreprocessSpec.from_dict(metadata["preprocessing"]))
+    return processor, ClassifierGraph(network.eval(), config)
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+
+    default_shared_dir = os.getenv("AGRIDETECT_SHARED_WEIGHTS_DIR") or "/dev/shm/agridetect"
+
+    # Always publish the fp32 weights, loaded from their original source
+    os.environ["AGRIDETECT_QUANTIZATION"] = "off"
+    os.environ["AGRIDETECT_SHARED_WEIGHTS_DIR"] = ""
+    os.environ.pop("AGRIDETECT_TORCHSCRIPT_PATH", None)
+    from components.ml_model_connector import (
+        MODEL_STORE_DIR, MODEL_VERSION, _default_model_version, _load_model_version, list_model_versions,
+        read_active_pointer
+    )
+
+    parser = argparse.ArgumentParser(description="Publish model weights for memory-mapped sharing between processes")
+    parser.add_argument("command", choices=["publish", "list", "remove"])
+    parser.add_argument("--version", default=None, help="Model version id (default: the served version)")
+    parser.add_argument("--shared-dir", default=default_shared_dir)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for entry in list_shared_weights(args.shared_dir):
+            print(f"  {entry['version']}  {entry['size_mb']:.1f} MB  {entry['created_at']}  {entry['path']}")
+        raise SystemExit(0)
+
+    version_id = (args.version or MODEL_VERSION or read_active_pointer(MODEL_STORE_DIR)
+                  or _default_model_version())
+    if args.command == "remove":
+        folder = Path(args.shared_dir) / shared_dir_name(version_id)
+        if not (folder / MODEL_FILE).is_file():
+            raise SystemExit(f"❌ {version_id} is not published in {args.shared_dir}")
+        shutil.rmtree(folder)
+        print(f"✅ Removed {folder}")
+    else:
+        version = {version["id"]: version for version in list_model_versions()}.get(version_id)
+        fingerprint = source_fingerprint(version) if version is not None else None
+        if fingerprint is None:
+            raise SystemExit(f"❌ {version_id} has no local source files to verify a shared copy against")
+        processor, model = _load_model_version(version_id)
+        started = time.perf_counter()
+        folder = publish_shared_weights(model, processor, args.shared_dir, version_id, fingerprint)
+        size_mb = (folder / WEIGHTS_FILE).stat().st_size / 1e6
+        print(f"✅ Published {version_id} ({size_mb:.1f} MB) in {time.perf_counter() - started:.1f} s -> {folder}")
+        print(f"💡 Set AGRIDETECT_SHARED_WEIGHTS_DIR={args.shared_dir} on every replica to attach to it")
@@ -99,8 +99,1256 @@ except Exception as e:
     print(f"   ❌ Image validation failed: {e}")
     sys.exit(1)
 
-# Test 7: Check Model Availability (Optional - requires internet)
-print("\n7️⃣ Testing model availability (requires internet)...")
+# Test 7: Fast preprocessing matches AutoImageProcessor
+print("\n7️⃣ Testing fast preprocessing against AutoImageProcessor...")
+try:
+    import io
+    from PIL import Image
+    import numpy as np
+    from components.image_preprocessing import FastImageProcessor, decode_image, spec_from_processor
+    
+    try:
+        from transformers import ConvNextImageProcessor
+    except ImportError:
+        ConvNextImageProcessor = None
+    
+    if ConvNextImageProcessor is None:
+        print("   ⏭️  transformers not installed - skipped")
+    else:
+        # Same preprocessing constants the fine-tuned ResNet-50 ships with
+        reference = ConvNextImageProcessor(
+            size={"shortest_edge": 224},
+            crop_pct=0.875,
+            resample=3,
+            image_mean=[0.485, 0.456, 0.406],
+            image_std=[0.229, 0.224, 0.225]
+        )
+        fast = FastImageProcessor(spec_from_processor(reference))
+        
+        rng = np.random.default_rng(0)
+        test_images = [
+            Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+            for width, height in [(224, 224), (640, 480), (333, 517), (1600, 1200), (257, 256)]
+        ]
+        
+        expected = reference(images=test_images, return_tensors="np")["pixel_values"]
+        actual = fast(images=test_images)["pixel_values"].numpy()
+        max_diff = float(np.abs(expected - actual).max())
+        mean_diff = float(np.abs(expected - actual).mean())
+        
+        print(f"   📐 Output shape: {actual.shape}")
+        print(f"   📐 Max abs difference: {max_diff:.5f}, mean: {mean_diff:.6f}")
+        # One uint8 rounding step after normalization is 1 / 255 / 0.224 ≈ 0.0175
+        assert actual.shape == expected.shape, "shape mismatch"
+        assert max_diff <= 0.02 and mean_diff <= 1e-3, "fast preprocessing differs from AutoImageProcessor"
+        
+        buffer = fast.allocate_batch(8)
+        reused = fast.preprocess_into(test_images, buffer).numpy()
+        assert np.array_equal(reused, actual), "preallocated buffer path differs"
+        
+        # Draft-mode decoding keeps the shortest edge above the requested minimum
+        jpeg = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (3000, 4000, 3), dtype=np.uint8)).save(jpeg, format="JPEG")
+        jpeg.seek(0)
+        decoded = decode_image(jpeg, min_edge=256)
+        print(f"   🗜️  4000x3000 JPEG decoded at {decoded.size[0]}x{decoded.size[1]}")
+        assert 256 <= min(decoded.size) < 3000, "draft decoding did not downscale"
+        
+        print("   ✅ Fast preprocessing matches the processor")
+except Exception as e:
+    print(f"   ❌ Fast preprocessing check failed: {e}")
+    sys.exit(1)
+
+# Test 8: Fallback classifier used when PyTorch is unavailable
+print("\n8️⃣ Testing colour/texture fallback classifier...")
+try:
+    from PIL import Image
+    import numpy as np
+    from components.ml_model_connector import get_demo_prediction, list_dataset_images
+    
+    valid_items = list_dataset_images("valid")
+    if not valid_items:
+        print("   ⏭️  Validation split not found - skipped")
+    else:
+        sample = valid_items[::8]
+        images = [Image.open(path).convert("RGB") for path, _ in sample]
+        predictions = [get_demo_prediction(image) for image in images]
+        accuracy = np.mean([p.predicted_class_idx == idx for p, (_, idx) in zip(predictions, sample)])
+        
+        print(f"   🎯 Accuracy on {len(sample)} validation images: {accuracy:.1%}")
+        assert accuracy >= 0.6, "fallback classifier accuracy too low"
+        
+        repeat = get_demo_prediction(images[0])
+        assert np.array_equal(repeat.top_indices, predictions[0].top_indices), "prediction is not deterministic"
+        assert np.array_equal(repeat.top_probabilities, predictions[0].top_probabilities), "prediction is not deterministic"
+        assert np.all(np.diff(repeat.top_probabilities) <= 0), "top classes are not sorted by probability"
+        assert float(np.sum(repeat.top_probabilities)) <= 1.0 + 1e-5, "probabilities sum to more than 1"
+        print("   ✅ Fallback classifier working")
+except Exception as e:
+    print(f"   ❌ Fallback classifier check failed: {e}")
+    sys.exit(1)
+
+# Test 9: Leaf pre-screen rejects unusable photos
+print("\n9️⃣ Testing leaf pre-screen...")
+try:
+    from PIL import Image, ImageDraw
+    from components.ml_model_connector import prescreen_image, list_dataset_images
+    
+    valid_items = list_dataset_images("valid")
+    if not valid_items:
+        print("   ⏭️  Validation split not found - leaf photo check skipped")
+    else:
+        rejected = [path for path, _ in valid_items if not prescreen_image(Image.open(path))[0]]
+        print(f"   🍃 Validation images rejected: {len(rejected)}")
+        assert not rejected, f"leaf photos rejected, e.g. {rejected[0]}"
+    
+    document = Image.new("RGB", (600, 800), "white")
+    draw = ImageDraw.Draw(document)
+    for y in range(40, 760, 30):
+        draw.text((40, y), "Invoice total due " * 4, fill="black")
+    
+    for name, image in [("document", document), ("dark frame", Image.new("RGB", (400, 300), (4, 4, 4)))]:
+        is_leaf, message = prescreen_image(image)
+        print(f"   🚫 {name}: {message}")
+        assert not is_leaf, f"{name} was not rejected"
+    print("   ✅ Leaf pre-screen working")
+except Exception as e:
+    print(f"   ❌ Leaf pre-screen check failed: {e}")
+    sys.exit(1)
+
+# Test 10: Model registry swaps versions without dropping in-flight requests
+print("\n🔟 Testing model registry hot swap...")
+try:
+    import os
+    import tempfile
+    import time
+    from components.model_registry import ModelRegistry, active_pointer_mtime, read_active_pointer, write_active_pointer
+    
+    registry = ModelRegistry(lambda version_id: (None, {"weights": version_id}))
+    registry.load("v1")
+    with registry.acquire() as pinned:
+        assert registry.activate("v2", wait=True), "rollout did not start"
+        assert registry.current().version_id == "v2", "new requests are not served by v2"
+        assert pinned.model == {"weights": "v1"}, "in-flight request lost its weights"
+        assert registry.status()["draining"] == [("v1", 1)], registry.status()
+    assert pinned.model is None and not registry.status()["draining"], "v1 was not released"
+    
+    
+    # A version that fails to load keeps the old one serving and is retried only after the pointer is rewritten
+    attempts = []
+    def load_once_broken(version_id):
+        attempts.append(version_id)
+        if attempts.count("broken") == 1:
+            raise FileNotFoundError(version_id)
+        return None, {"weights": version_id}
+    
+    with tempfile.TemporaryDirectory() as store:
+        registry = ModelRegistry(load_once_broken, pointer_reader=lambda: read_active_pointer(store),
+                                 poll_interval=0.0, pointer_stamp=lambda: active_pointer_mtime(store))
+        registry.load("v2")
+        write_active_pointer(store, "broken")
+        def settle():
+            registry.poll()
+            while registry.status()["loading"]:
+                time.sleep(0.01)
+        
+        settle()
+        assert registry.current().version_id == "v2", "a failed load replaced the active version"
+        error = registry.status()["error"]
+        settle()
+        assert attempts.count("broken") == 1, "a failed version was retried without a new rollout"
+        
+        pointer = Path(store) / "ACTIVE"
+        os.utime(pointer, ns=(pointer.stat().st_atime_ns, pointer.stat().st_mtime_ns + 1_000_000_000))
+        settle()
+        assert attempts.count("broken") == 2 and registry.current().version_id == "broken", "no retry after promote"
+        
+        # A local activate() holds against the unchanged pointer until the next promote
+        assert registry.activate("v3", wait=True), "local rollout did not start"
+        settle()
+        assert registry.current().version_id == "v3", "polling undid a local activate()"
+        write_active_pointer(store, "v4")
+        os.utime(pointer, ns=(pointer.stat().st_atime_ns, pointer.stat().st_mtime_ns + 2_000_000_000))
+        settle()
+        assert registry.current().version_id == "v4", "a promote after activate() was ignored"
+    print(f"   🔁 Failed load kept v2 active ({error}), retried after the pointer changed")
+    print("   📌 Local activate() held until the next promote")
+    print("   ✅ Model registry working")
+except Exception as e:
+    print(f"   ❌ Model registry check failed: {e}")
+    sys.exit(1)
+
+# Test 11: Shadow inference records disagreements and drops work under load
+print("\n1️⃣1️⃣ Testing shadow inference...")
+try:
+    import tempfile
+    import threading
+    import numpy as np
+    from PIL import Image
+    from components.prediction_result import LabelTable, PredictionResult
+    from components.shadow_inference import ShadowRunner, ShadowStore
+    
+    labels = LabelTable.intern(["A", "B"])
+    release = threading.Event()
+    def slow_candidate(images):
+        release.wait(10)
+        return [PredictionResult.from_probabilities([0.3, 0.7], labels) for _ in images]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        runner = ShadowRunner(lambda: slow_candidate, ShadowStore(f"{tmp}/shadow.sqlite3"), "candidate", max_queue=2)
+        image = Image.new("RGB", (32, 32), (60, 140, 60))
+        primary = PredictionResult.from_probabilities([0.9, 0.1], labels)
+        accepted = [runner.submit(image, primary, "primary") for _ in range(10)]
+        release.set()
+        runner.shutdown()
+        summary = runner.store.summary("candidate")
+        print(f"   👥 Accepted {sum(accepted)}/10, dropped {runner.stats()['dropped']}, "
+              f"disagreement {summary['disagreement_rate']:.0%}, delta {summary['mean_confidence_delta']:+.2f}")
+        assert runner.stats()["dropped"] > 0, "a full queue did not drop shadow work"
+        assert summary["requests"] == sum(accepted) and summary["disagreement_rate"] == 1.0
+        assert abs(summary["mean_confidence_delta"] + 0.2) < 1e-6
+    print("   ✅ Shadow inference working")
+except Exception as e:
+    print(f"   ❌ Shadow inference check failed: {e}")
+    sys.exit(1)
+
+# Test 12: Heatmaps from the forward pass match backpropagated Grad-CAM
+print("\n1️⃣2️⃣ Testing Grad-CAM heatmaps...")
+try:
+    try:
+        import torch
+        from torch import nn
+    except ImportError:
+        torch = None
+    
+    if torch is None:
+        print("   ⏭️  PyTorch not installed - skipped")
+    else:
+        from components.model_graph import ClassifierGraph
+        from components.saliency import ActivationCapture, class_activation_maps, saliency_layers
+        
+        torch.manual_seed(0)
+        network = nn.Sequential(
+            nn.Conv2d(3, 16, 3, stride=4), nn.ReLU(), nn.Conv2d(16, 32, 3, padding=1), nn.ReLU(),
+            nn.AdaptiveAvgPool2d(1), nn.Sequential(nn.Flatten(), nn.Linear(32, 8))
+        )
+        graph = ClassifierGraph(network.eval(), config=None)
+        block, linear = saliency_layers(graph)
+        pixel_values = torch.randn(2, 3, 64, 64)
+        
+        with torch.no_grad(), ActivationCapture(block) as capture:
+            predicted = graph(pixel_values).argmax(dim=1)
+        maps = class_activation_maps(capture.activations, linear, predicted.numpy())
+        
+        with ActivationCapture(block) as capture:
+            logits = graph(pixel_values)
+            capture.activations.retain_grad()
+            logits.gather(1, predicted[:, None]).sum().backward()
+        activations = capture.activations
+        reference = torch.relu((activations.grad.mean(dim=(2, 3), keepdim=True) * activations).sum(dim=1))
+        reference = (reference / reference.flatten(1).max(dim=1).values.clamp_min(1e-12)[:, None, None]).detach().numpy()
+        
+        difference = float(np.abs(maps - reference).max())
+        print(f"   🔥 Max difference to backpropagated Grad-CAM: {difference:.2e}")
+        assert difference < 1e-4, "heatmap does not match Grad-CAM"
+    print("   ✅ Grad-CAM heatmaps working")
+except Exception as e:
+    print(f"   ❌ Grad-CAM check failed: {e}")
+    sys.exit(1)
+
+# Test 13: Embedding index finds the nearest reference images
+print("\n1️⃣3️⃣ Testing similar-case embedding index...")
+try:
+    import tempfile
+    from components.embedding_index import EmbeddingIndex, write_index
+    
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((600, 64)).astype(np.float32)
+    labels = np.arange(600) % 8
+    paths = [f"class_{label}/leaf_{i}.jpg" for i, label in enumerate(labels)]
+    queries = embeddings[[3, 250, 599]] + 0.05 * rng.standard_normal((3, 64))
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for ivf_lists in (0, 16):
+            write_index(f"{tmp}/index{ivf_lists}", embeddings, labels, paths, [f"class_{i}" for i in range(8)],
+                        "test", ivf_lists=ivf_lists)
+            index = EmbeddingIndex(f"{tmp}/index{ivf_lists}")
+            assert index.vectors.dtype == np.float16 and isinstance(index.vectors, np.memmap)
+            results = index.search(queries, k=5, n_probe=16)
+            assert [neighbours[0]["path"] for neighbours in results] == [paths[3], paths[250], paths[599]]
+            assert all(len(neighbours) == 5 for neighbours in results)
+            print(f"   🔎 {'IVF' if ivf_lists else 'Exact'} search: nearest similarity {results[0][0]['similarity']:.3f}")
+        
+        # Rebuilding replaces the folder; an index that is already open keeps searching its old files
+        write_index(f"{tmp}/index16", embeddings[:100], labels[:100], paths[:100], [f"class_{i}" for i in range(8)], "test")
+        assert index.search(queries, k=1, n_probe=16)[2][0]["path"] == paths[599], "open index lost its files"
+        assert EmbeddingIndex(f"{tmp}/index16").vectors.shape[0] == 100, "rebuilt index not visible"
+        assert not list(Path(tmp).glob(".*staging")), "staging folder left behind"
+        del index
+        
+        # The connector picks up an index built (or rebuilt) after a lookup found none
+        from types import SimpleNamespace
+        from components import ml_model_connector as connector
+        knn_model = SimpleNamespace(config=SimpleNamespace(name_or_path="test/knn-model", _commit_hash="rev-1"))
+        saved_dir, connector.EMBEDDING_INDEX_DIR = connector.EMBEDDING_INDEX_DIR, f"{tmp}/indexes"
+        try:
+            assert connector.get_embedding_index(knn_model) is None
+            index_dir = connector._embedding_index_dir(connector.get_model_revision(knn_model))
+            write_index(index_dir, embeddings, labels, paths, [f"class_{i}" for i in range(8)], "test/knn-model@rev-1")
+            assert len(connector.get_embedding_index(knn_model)) == 600, "index built after a miss not loaded"
+            write_index(index_dir, embeddings[:100], labels[:100], paths[:100], [f"class_{i}" for i in range(8)],
+                        "test/knn-model@rev-1")
+            assert len(connector.get_embedding_index(knn_model)) == 100, "rebuilt index not reloaded"
+        finally:
+            connector.EMBEDDING_INDEX_DIR = saved_dir
+            connector._load_embedding_index.clear()
+    print("   ✅ Embedding index working")
+except Exception as e:
+    print(f"   ❌ Embedding index check failed: {e}")
+    sys.exit(1)
+
+# Test 14: Request Tracing and Stage Histograms
+print("\n1️⃣4️⃣ Testing request stage profiling...")
+try:
+    import time
+    from components.inference_profiler import InferenceProfiler, LatencyHistogram, RequestTrace, active_trace, traced_stage
+    
+    trace = RequestTrace()
+    with trace.stage("decode"):
+        time.sleep(0.01)
+    with active_trace(trace), traced_stage("forward"):
+        time.sleep(0.02)
+    with traced_stage("untraced"):
+        pass
+    trace.add("decode", 0.5)
+    time.sleep(0.01)
+    breakdown = trace.finish().breakdown()
+    assert list(breakdown) == ["decode", "forward", "other"]
+    assert breakdown["decode"] >= 10.5 and breakdown["forward"] >= 20
+    assert abs(sum(breakdown.values()) - trace.total_ms) < 1e-6
+    
+    profiler = InferenceProfiler(recent=2)
+    for _ in range(3):
+        profiler.record(RequestTrace())
+    assert len(profiler.recent()) == 2 and profiler.summary()["total"]["count"] == 3
+    
+    histogram = LatencyHistogram()
+    latencies = np.random.default_rng(0).lognormal(np.log(150), 0.4, 5000)
+    for latency in latencies:
+        histogram.record(latency)
+    for q in (50, 95, 99):
+        exact = np.percentile(latencies, q)
+        assert exact <= histogram.percentile(q) <= exact * 1.2, (q, exact, histogram.percentile(q))
+    print(f"   ⏱️  Histogram p95 {histogram.percentile(95):.0f} ms (exact {np.percentile(latencies, 95):.0f} ms)")
+    print("   ✅ Request profiling working")
+except Exception as e:
+    print(f"   ❌ Request profiling check failed: {e}")
+    sys.exit(1)
+
+# Test 15: Shared weights attach to a plain PyTorch copy of the transformers ResNet
+print("\n1️⃣5️⃣ Testing shared memory-mapped weights...")
+try:
+    try:
+        import torch
+        from transformers import ResNetConfig, ResNetForImageClassification
+    except ImportError:
+        torch = None
+    
+    if torch is None:
+        print("   ⏭️  PyTorch/transformers not installed - skipped")
+    else:
+        import os
+        import stat
+        import tempfile
+        from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+        from components.shared_weights import (
+            attach_shared_model, find_shared_weights, publish_shared_weights, source_fingerprint
+        )
+        
+        torch.manual_seed(0)
+        config = ResNetConfig(embedding_size=16, hidden_sizes=[32, 64], depths=[2, 1], layer_type="bottleneck",
+                              num_labels=8, id2label={i: f"class {i}" for i in range(8)})
+        hf_model = ResNetForImageClassification(config).eval()
+        for module in hf_model.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.1, 0.1)
+                module.running_var.uniform_(0.5, 1.5)
+        spec = PreprocessSpec(resize_shortest_edge=72, crop_size=64,
+                              image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5))
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            # A retrained folder gets a new fingerprint, so its old published copy is not attached
+            folder = Path(tmp) / "plant-disease-model-v2"
+            folder.mkdir()
+            (folder / "config.json").write_text("{}")
+            (folder / "model.safetensors").write_bytes(b"weights v1")
+            version = {"kind": "folder", "path": str(folder)}
+            fingerprint = source_fingerprint(version)
+            (folder / "model.safetensors").write_bytes(b"weights v2, retrained")
+            assert source_fingerprint(version) != fingerprint, "retraining did not change the fingerprint"
+            assert source_fingerprint({"kind": "hub", "path": None}) is None
+            
+            shared_dir = Path(tmp) / "shared"
+            assert find_shared_weights(shared_dir, "test@1", fingerprint) is None
+            publish_shared_weights(hf_model, FastImageProcessor(spec), shared_dir, "test@1", fingerprint)
+            assert stat.S_IMODE(shared_dir.stat().st_mode) == 0o700, "shared folder is not private"
+            assert find_shared_weights(shared_dir, "test@1", source_fingerprint(version)) is None, "stale copy accepted"
+            processor, graph = attach_shared_model(find_shared_weights(shared_dir, "test@1", fingerprint))
+            
+            pixel_values = torch.randn(2, 3, 64, 64)
+            with torch.no_grad():
+                difference = float((graph(pixel_values) - hf_model(pixel_values).logits).abs().max())
+            print(f"   🧩 Max logit difference to the transformers model: {difference:.2e}")
+            assert difference < 1e-5, "attached network does not match the transformers model"
+            assert graph.config.id2label[3] == "class 3" and processor.spec == spec
+            del graph
+            
+            os.chmod(shared_dir, 0o777)
+            assert find_shared_weights(shared_dir, "test@1", fingerprint) is None, "world-writable folder accepted"
+    print("   ✅ Shared weights working")
+except Exception as e:
+    print(f"   ❌ Shared weights check failed: {e}")
+    sys.exit(1)
+
+# Test 16: Test-time augmentation averages logits within the latency budget
+print("\n1️⃣6️⃣ Testing test-time augmentation...")
+try:
+    from PIL import Image
+    from components.augmented_inference import TestTimeAugmenter, average_logits
+    
+    def softmax(logits):
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+    
+    rng = np.random.default_rng(0)
+    logits = rng.normal(size=(4, 8))
+    assert np.allclose(average_logits(softmax(logits[0]), logits[1:]), softmax(logits.mean(axis=0)), atol=1e-6)
+    
+    images = [Image.new("RGB", (64, 48), (90, 140, 60)) for _ in range(2)]
+    probabilities = np.stack([np.eye(8)[3] * 0.9 + 0.1 / 8, np.full(8, 1 / 8)])
+    batches = []
+    def predict_logits(views):
+        batches.append([view.size for view in views])
+        return np.tile(np.eye(8)[5] * 4.0, (len(views), 1))
+    
+    augmenter = TestTimeAugmenter(["hflip", "vflip", "zoom"], threshold=0.7, budget_ms=100)
+    refined, augmentations = augmenter.refine(images, probabilities, predict_logits, elapsed_ms=10)
+    assert np.array_equal(refined[0], probabilities[0]) and augmentations[0] is None
+    assert len(batches) == 1 and batches[0] == [(64, 48), (64, 48), (54, 41)]
+    assert refined[1].argmax() == 5 and augmentations[1]["views"] == ["hflip", "vflip", "zoom"]
+    
+    # Before any views were timed, each is estimated to cost as much as the first pass
+    fresh = TestTimeAugmenter(["hflip", "vflip", "zoom"], threshold=0.7, budget_ms=100)
+    assert fresh.plan(1, elapsed_ms=60, first_pass_ms=20) == ["hflip", "vflip"]
+    assert fresh.plan(2, elapsed_ms=60, first_pass_ms=20) == ["hflip"]
+    unchanged, augmentations = augmenter.refine(images, probabilities, predict_logits, elapsed_ms=150)
+    assert augmentations[1]["views"] == [] and augmentations[1]["dropped"] == ["hflip", "vflip", "zoom"]
+    assert np.array_equal(unchanged, probabilities) and len(batches) == 1
+    stats = augmenter.stats()
+    assert stats["augmented"] == 1 and stats["skipped_budget"] == 1 and stats["views"] == 3
+    print(f"   🔁 {stats['augmented']} augmented, {stats['skipped_budget']} over budget, ~{stats['view_ms']:.2f} ms per view")
+    
+    # A verdict changed by the views gets the heatmap of the new class
+    try:
+        import torch
+        from torch import nn
+    except ImportError:
+        torch = None
+    if torch is not None:
+        from types import SimpleNamespace
+        import components.ml_model_connector as connector
+        from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+        from components.model_graph import ClassifierGraph
+        from components.saliency import ActivationCapture, class_activation_maps, saliency_layers
+        
+        class ReversingAugmenter:
+            def refine(self, images, probabilities, predict_logits, elapsed_ms):
+                details = {"first_confidence": 0.0, "views": ["hflip"], "dropped": [], "ms": 0.0}
+                return probabilities[:, ::-1].copy(), [details] * len(probabilities)
+        
+        torch.manual_seed(0)
+        network = nn.Sequential(
+            nn.Conv2d(3, 16, 3, stride=4), nn.ReLU(), nn.Conv2d(16, 32, 3, padding=1), nn.ReLU(),
+            nn.AdaptiveAvgPool2d(1), nn.Sequential(nn.Flatten(), nn.Linear(32, 8))
+        )
+        graph = ClassifierGraph(network.eval(), SimpleNamespace(id2label={idx: f"class_{idx}" for idx in range(8)}))
+        processor = FastImageProcessor(PreprocessSpec(72, 64, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5)))
+        leaves = [Image.effect_noise((80, 80), 40 + 20 * idx).convert("RGB") for idx in range(2)]
+        
+        tta_augmenter = connector.get_test_time_augmenter
+        connector.get_test_time_augmenter = ReversingAugmenter
+        try:
+            first = connector._predict_images(leaves, processor, graph, saliency=True)
+            refined = connector._predict_images(leaves, processor, graph, saliency=True, tta=True)
+        finally:
+            connector.get_test_time_augmenter = tta_augmenter
+        
+        block, linear = saliency_layers(graph)
+        with torch.no_grad(), ActivationCapture(block) as capture:
+            graph(connector._preprocess_images(leaves, processor))
+        expected = class_activation_maps(capture.activations, linear, [result.predicted_class_idx for result in refined])
+        for before, after, saliency_map in zip(first, refined, expected):
+            assert after.predicted_class_idx != before.predicted_class_idx, "the verdict did not change"
+            assert np.allclose(after.saliency_map, saliency_map, atol=1e-6), "heatmap still explains the first-pass class"
+    print("   ✅ Test-time augmentation working")
+except Exception as e:
+    print(f"   ❌ Test-time augmentation check failed: {e}")
+    sys.exit(1)
+
+# Test 17: Compact prediction results survive the disk cache and pickling
+print("\n1️⃣7️⃣ Testing compact prediction results...")
+try:
+    import json
+    import pickle
+    import sqlite3
+    import tempfile
+    import threading
+    import time
+    import numpy as np
+    from dataclasses import FrozenInstanceError
+    from components.prediction_cache import PRUNE_EVERY, PredictionCache, _decode_result, _encode_result
+    from components.prediction_result import LabelTable, PredictionResult
+    
+    names = [f"Plant___disease_{idx}" for idx in range(38)]
+    probabilities = np.random.default_rng(1).dirichlet(np.ones(38)).astype(np.float32)
+    result = PredictionResult.from_probabilities(probabilities, LabelTable.intern(names),
+                                                 saliency_box=(0.1, 0.0, 0.9, 1.0))
+    assert result.predicted_class_idx == int(probabilities.argmax()) and result.confidence == float(probabilities.max())
+    assert result.probability_of(result.predicted_disease) == result.confidence
+    assert result.probability_of("Unknown") is None and len(result.top()) == 5
+    
+    assert names[0] not in _encode_result(result), "cached row embeds the class names"
+    with tempfile.TemporaryDirectory() as tmp:
+        PredictionCache(disk_path=f"{tmp}/cache.sqlite3").put("key", result)
+        replica = PredictionCache(disk_path=f"{tmp}/cache.sqlite3")
+        restored = replica.get("key")
+        assert replica._find_labels(result.labels.digest) is result.labels, "label table not stored"
+        
+        # The shared tier is pruned to its bound; a database that cannot be opened leaves the memory tier
+        bounded = PredictionCache(max_entries=0, disk_path=f"{tmp}/bounded.sqlite3", max_disk_entries=10)
+        for idx in range(PRUNE_EVERY):
+            bounded.put(f"key{idx}", result)
+        assert bounded.stats()["disk_entries"] == 10, "disk tier not pruned"
+        assert bounded.get("key0") is None and bounded.get(f"key{PRUNE_EVERY - 1}") is not None
+        Path(tmp, "not-a-folder").write_text("")
+        memory_only = PredictionCache(disk_path=f"{tmp}/not-a-folder/cache.sqlite3")
+        memory_only.put("key", result)
+        assert memory_only.get("key") is result and memory_only.stats()["disk_error"], "unusable disk tier not skipped"
+        
+        # A result JSON cannot represent stays in the memory tier
+        odd = PredictionResult.from_probabilities(probabilities, result.labels, tta={"views": {"hflip"}})
+        shared = PredictionCache(disk_path=f"{tmp}/shared.sqlite3")
+        shared.put("odd", odd)
+        assert shared.get("odd") is odd and shared.stats()["unencodable"] == 1 and shared.stats()["disk_entries"] == 0
+        
+        # A store waiting on a locked database does not block memory hits in other threads
+        shared.put("warm", result)
+        blocker = sqlite3.connect(f"{tmp}/shared.sqlite3")
+        blocker.execute("BEGIN EXCLUSIVE")
+        writer = threading.Thread(target=shared.put, args=("slow", result))
+        writer.start()
+        time.sleep(0.2)
+        started = time.perf_counter()
+        assert shared.get("warm") is result
+        hit_seconds = time.perf_counter() - started
+        blocker.rollback()
+        blocker.close()
+        writer.join()
+        assert hit_seconds < 0.1, f"memory hit waited {hit_seconds:.2f} s on a disk write"
+        assert PredictionCache(disk_path=f"{tmp}/shared.sqlite3").get("slow") is not None, "delayed store was lost"
+    assert restored is not None and restored.labels is result.labels, "decoded result has its own label table"
+    assert np.array_equal(restored.top_indices, result.top_indices) and restored.saliency_box == result.saliency_box
+    assert np.allclose(restored.top_probabilities, result.top_probabilities, atol=1e-6)
+    
+    unpickled = pickle.loads(pickle.dumps(result))
+    assert unpickled.labels is result.labels, "unpickled label table was not interned"
+    
+    legacy = {"predicted_disease": result.predicted_disease, "confidence": result.confidence,
+              "predicted_class_idx": result.predicted_class_idx, "all_probabilities": probabilities,
+              "all_classes": names, "demo_mode": True}
+    converted = _decode_result(json.dumps({**legacy, "all_probabilities": probabilities.tolist()}))
+    assert np.array_equal(converted.top_indices, result.top_indices) and converted.demo_mode
+    
+    for mutate in (lambda: setattr(result, "demo_mode", True), lambda: result.top_probabilities.__setitem__(0, 1.0)):
+        try:
+            mutate()
+            raise AssertionError("a prediction result was modified")
+        except (FrozenInstanceError, ValueError):
+            pass
+    print(f"   📦 Pickled: {len(pickle.dumps(result))} bytes (dict with all probabilities: {len(pickle.dumps(legacy))}), "
+          f"cached: {len(_encode_result(result))} bytes")
+    print("   ✅ Compact prediction results working")
+except Exception as e:
+    print(f"   ❌ Compact prediction result check failed: {e}")
+    sys.exit(1)
+
+# Test 18: Worker pool re-attaches by request id, rejects work when full, retries crashes
+# and replaces its workers when the active version changes
+print("\n1️⃣8️⃣ Testing inference worker pool...")
+POOL_SCENARIO = '''
+import os
+import time
+from pathlib import Path
+from components.worker_pool import InferenceWorkerPool, PoolBusyError, WorkerCrashedError
+
+CRASHED_ONCE = Path(__file__).with_name("crashed_once")
+ACTIVE = Path(__file__).with_name("ACTIVE")
+
+def load_echo(version_id):
+    def predict(images, mode=None):
+        results = []
+        for image in images:
+            time.sleep(0.3)
+            if image == "crash" or (image == "crash-once" and not CRASHED_ONCE.exists()):
+                CRASHED_ONCE.touch()
+                os._exit(1)
+            results.append(f"{version_id}:{mode}:{image}" if mode else f"{version_id}:{image}")
+        return results
+    return predict, {"version": version_id}
+
+if __name__ == "__main__":
+    ACTIVE.write_text("v1")
+    pool = InferenceWorkerPool(load_echo, ACTIVE.read_text, num_workers=1, max_pending=2, max_batch=1,
+                               hang_timeout=20, health_interval=0.1, version_stamp=lambda: ACTIVE.stat().st_mtime_ns)
+    try:
+        assert pool.wait_ready(60) and pool.worker_info() == {"version": "v1"}, "worker did not start"
+        first = pool.submit("leaf-a", request_id="a")
+        assert pool.submit("leaf-a", request_id="a") is first, "the same request id did not re-attach"
+        pool.submit("leaf-b", request_id="b")
+        try:
+            pool.submit("leaf-c")
+            raise AssertionError("a full pool accepted another request")
+        except PoolBusyError:
+            pass
+        assert first.result(30) == "v1:leaf-a"
+        assert pool.predict("leaf-a", request_id="a", timeout=30) == "v1:leaf-a", "finished request not kept"
+        
+        assert pool.predict("crash-once", timeout=60) == "v1:crash-once", "crashed request not retried"
+        try:
+            pool.predict("crash", timeout=60)
+            raise AssertionError("a request that kills every worker did not fail")
+        except WorkerCrashedError:
+            pass
+        assert pool.wait_ready(60), "crashed worker not replaced"
+        status = pool.status()
+        print(f"   🧵 Re-attached {status['reattached']}, rejected {status['rejected']}, "
+              f"retried {status['retried']}, restarts {status['restarts']}")
+        assert (status["reattached"], status["rejected"], status["retried"], status["restarts"]) == (2, 1, 2, 3)
+        assert pool.predict("leaf-t", timeout=30, mode="tiled") == "v1:tiled:leaf-t", "mode not passed to the worker"
+        
+        # A promote rewrites the pointer: a v2 worker starts, the v1 worker retires once it is ready,
+        # and every result says which worker version produced it
+        ACTIVE.write_text("v2")
+        os.utime(ACTIVE, ns=(time.time_ns(), ACTIVE.stat().st_mtime_ns + 1_000_000_000))
+        during = pool.submit("leaf-d")
+        assert during.result(30) in ("v1:leaf-d", "v2:leaf-d")
+        assert during.worker_info == {"version": during.result()[:2]}, "result not tagged with its worker"
+        deadline = time.monotonic() + 60
+        while [w["version"] for w in pool.status()["workers"]] != ["v2"] and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert [w["version"] for w in pool.status()["workers"]] == ["v2"], pool.status()["workers"]
+        after = pool.submit("leaf-e")
+        assert after.result(30) == "v2:leaf-e" and after.worker_info == pool.worker_info() == {"version": "v2"}
+        status = pool.status()
+        print(f"   🔄 Rolled over to v2 ({status['rollovers']} worker replaced, restarts still {status['restarts']})")
+        assert status["rollovers"] == 1 and status["restarts"] == 3
+    finally:
+        pool.shutdown()
+'''
+try:
+    import os
+    import subprocess
+    import tempfile
+    
+    # Workers are spawned processes: the scenario runs as its own script so they
+    # import that module instead of re-running this one
+    with tempfile.TemporaryDirectory() as tmp:
+        scenario = Path(tmp) / "pool_scenario.py"
+        scenario.write_text(POOL_SCENARIO, encoding="utf-8")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+        run = subprocess.run([sys.executable, str(scenario)], env=env, capture_output=True, text=True, timeout=300)
+        print(run.stdout.rstrip())
+        assert run.returncode == 0, run.stderr.strip().splitlines()[-1] if run.stderr.strip() else "scenario failed"
+    
+    # During a rollover a result is cached under the revision of the worker that produced it
+    from types import SimpleNamespace
+    from PIL import Image
+    from components import ml_model_connector as connector
+    from components.prediction_cache import compute_image_digest
+    from components.prediction_result import LabelTable, PredictionResult
+    
+    def worker_model(commit):
+        return SimpleNamespace(config=SimpleNamespace(name_or_path="pool-test", _commit_hash=commit,
+                                                      id2label={0: "A", 1: "B"}), variant="fp32")
+    newest, older = worker_model("v2"), worker_model("v1")
+    image = Image.new("RGB", (40, 40), (10, 200, 30))
+    produced = PredictionResult.from_probabilities([0.2, 0.8], LabelTable.intern(["A", "B"]))
+    connector._cached_prediction(image, newest, lambda: produced, served_model=lambda: older)
+    cache = connector.get_prediction_cache()
+    assert cache.get(compute_image_digest(image, connector._cache_revision(older))) is not None
+    assert cache.get(compute_image_digest(image, connector._cache_revision(newest))) is None, "cached under the wrong revision"
+    print("   ✅ Inference worker pool working")
+except Exception as e:
+    print(f"   ❌ Inference worker pool check failed: {e}")
+    sys.exit(1)
+
+# Test 19: Micro-batching engine groups concurrent requests and cancels timed-out ones
+print("\n1️⃣9️⃣ Testing micro-batching inference engine...")
+try:
+    import threading
+    import time
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+    from components.inference_engine import MicroBatchInferenceEngine
+    
+    batches = []
+    release = threading.Event()
+    
+    def run_batch(images):
+        batches.append(list(images))
+        release.wait(5)
+        return [f"result-{image}" for image in images]
+    
+    # Requests queued within the wait window share one forward pass, capped at max_batch_size
+    engine = MicroBatchInferenceEngine(run_batch, max_batch_size=4, max_wait_ms=200)
+    release.set()
+    futures = [engine.submit(i) for i in range(6)]
+    assert [future.result(timeout=5) for future in futures] == [f"result-{i}" for i in range(6)]
+    assert batches == [[0, 1, 2, 3], [4, 5]], f"unexpected batches {batches}"
+    
+    # A lone request is served once the wait expires instead of waiting for a full batch
+    started = time.perf_counter()
+    assert engine.predict(9, timeout=5) == "result-9"
+    waited_ms = 1000 * (time.perf_counter() - started)
+    assert 150 <= waited_ms < 2000, f"lone request waited {waited_ms:.0f} ms"
+    print(f"   📦 Batches {[len(batch) for batch in batches]}, lone request served after {waited_ms:.0f} ms")
+    
+    # A request that times out while queued behind a busy batch is cancelled and never run
+    release.clear()
+    blocking = engine.submit("slow")
+    time.sleep(0.3)
+    try:
+        engine.predict("late", timeout=0.1)
+        raise AssertionError("predict did not time out")
+    except FutureTimeoutError:
+        pass
+    release.set()
+    assert blocking.result(timeout=5) == "result-slow"
+    
+    # Shutdown serves the requests already queued, then refuses new ones
+    queued = [engine.submit(f"queued-{i}") for i in range(3)]
+    engine.shutdown()
+    assert [future.result(timeout=0) for future in queued] == [f"result-queued-{i}" for i in range(3)]
+    assert not any("late" in batch for batch in batches), "timed-out request was still run"
+    try:
+        engine.submit("after")
+        raise AssertionError("submit accepted work after shutdown")
+    except RuntimeError:
+        pass
+    stats = engine.stats()
+    assert stats["requests"] == 11 and stats["largest_batch"] == 4, stats
+    print(f"   📊 {stats['requests']} requests in {stats['batches']} batches, timed-out request skipped")
+    print("   ✅ Micro-batching engine working")
+except Exception as e:
+    print(f"   ❌ Micro-batching engine check failed: {e}")
+    sys.exit(1)
+
+# Test 20: Model cascade answers confident images with the fast model and escalates the rest
+print("\n2️⃣0️⃣ Testing confidence cascade...")
+try:
+    import numpy as np
+    from types import SimpleNamespace
+    from components.model_cascade import ConfidenceCascade, sweep_thresholds
+    from components.prediction_result import LabelTable, PredictionResult
+    
+    labels = LabelTable.intern(["Healthy", "Blight", "Rust"])
+    full_calls = []
+    
+    def predict_full():
+        full_calls.append(1)
+        return PredictionResult.from_probabilities([0.05, 0.05, 0.9], labels)
+    
+    def build_result(probabilities):
+        return PredictionResult.from_probabilities(probabilities, labels)
+    
+    # Stand-in "images" are the fast model's top confidence, so each call picks its own
+    fast_model = SimpleNamespace(predict_proba=lambda confidence: np.array([confidence, 1.0 - confidence, 0.0]))
+    cascade = ConfidenceCascade(fast_model, threshold=0.8)
+    
+    confident = cascade.predict(0.95, predict_full, build_result)
+    at_threshold = cascade.predict(0.8, predict_full, build_result)
+    unsure = cascade.predict(0.6, predict_full, build_result)
+    
+    assert (confident.cascade_stage, confident.predicted_disease) == ("fast", "Healthy")
+    assert abs(confident.confidence - 0.95) < 1e-6, "fast answer lost its probabilities"
+    assert at_threshold.cascade_stage == "fast", "confidence equal to the threshold was escalated"
+    assert (unsure.cascade_stage, unsure.predicted_disease) == ("full", "Rust")
+    assert len(full_calls) == 1, "full model ran for a confident image"
+    
+    stats = cascade.stats()
+    assert (stats["requests"], stats["escalated"]) == (3, 1) and abs(stats["escalated_fraction"] - 1 / 3) < 1e-9
+    assert stats["p50_ms"] is not None
+    print(f"   🪜 Escalated {stats['escalated']}/{stats['requests']} at threshold {stats['threshold']}")
+    
+    # The offline sweep simulates the same rule: threshold 0 never escalates, above 1 always does
+    fast_probabilities = np.array([[0.95, 0.05, 0.0], [0.6, 0.4, 0.0], [0.3, 0.7, 0.0]])
+    full_probabilities = np.array([[0.9, 0.05, 0.05], [0.1, 0.1, 0.8], [0.1, 0.8, 0.1]])
+    rows = sweep_thresholds(fast_probabilities, full_probabilities, np.array([0, 2, 1]),
+                            np.full(3, 1.0), np.full(3, 10.0), [0.0, 0.8, 1.01])
+    assert [row["escalated_fraction"] for row in rows] == [0.0, 2 / 3, 1.0]
+    assert [round(row["accuracy"], 3) for row in rows] == [0.667, 1.0, 1.0]
+    assert [round(row["mean_ms"], 3) for row in rows] == [1.0, 7.667, 11.0]
+    print("   ✅ Confidence cascade working")
+except Exception as e:
+    print(f"   ❌ Confidence cascade check failed: {e}")
+    sys.exit(1)
+
+# Test 21: Tiled inference keeps small lesions from being outvoted by healthy leaf area
+print("\n2️⃣1️⃣ Testing tiled inference aggregation...")
+try:
+    import numpy as np
+    from PIL import Image, ImageDraw
+    from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+    from components.tiled_inference import aggregate_tiles, classify_tiled, plan_tiles
+    
+    labels = ["Tomato___healthy", "Tomato___Early_blight", "Tomato___Late_blight"]
+    
+    # One diseased tile among three large healthy ones decides the verdict
+    probabilities = np.array([[0.9, 0.05, 0.05]] * 3 + [[0.1, 0.2, 0.7]], dtype=np.float32)
+    foliage = np.array([1.0, 1.0, 1.0, 0.5], dtype=np.float32)
+    image_probs, severities, affected = aggregate_tiles(probabilities, foliage, labels)
+    assert labels[int(image_probs.argmax())] == "Tomato___Late_blight", "lesion outvoted by healthy tiles"
+    assert np.allclose(severities, [0.1, 0.1, 0.1, 0.9]) and abs(affected - 0.5 / 3.5) < 1e-6
+    
+    # Without a diseased tile the verdict is the foliage-weighted mean of all tiles
+    probabilities = np.array([[0.9, 0.1, 0.0], [0.6, 0.0, 0.4]], dtype=np.float32)
+    image_probs, _, affected = aggregate_tiles(probabilities, np.array([0.75, 0.25], dtype=np.float32), labels)
+    assert np.allclose(image_probs, [0.825, 0.075, 0.1]) and affected == 0.0
+    
+    # Only tiles over foliage are planned; max_tiles keeps the leafiest ones
+    image = Image.new("RGB", (600, 400), (128, 128, 128))
+    ImageDraw.Draw(image).rectangle((0, 0, 299, 399), fill=(40, 150, 40))
+    plan = plan_tiles(image, 224)
+    assert plan["xs"] == [0, 168, 336, 376] and plan["ys"] == [0, 168, 176]
+    assert sorted({col for _, col, _, _, _ in plan["tiles"]}) == [0, 1], "bare background tiles were planned"
+    assert all(foliage > 0.99 for _, col, _, _, foliage in plan["tiles"] if col == 0)
+    assert [(row, col) for row, col, _, _, _ in plan_tiles(image, 224, max_tiles=2)["tiles"]] == [(0, 0), (1, 0)]
+    
+    # End to end: a stand-in model calls a tile diseased in proportion to its brown pixels
+    def predict_brown_share(pixel_values):
+        brown = (pixel_values[:, 0] > 0).float().mean(dim=(1, 2)).numpy()
+        return np.stack([1.0 - brown, brown, np.zeros_like(brown)], axis=1)
+    
+    processor = FastImageProcessor(PreprocessSpec(72, 64, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5)))
+    leaf = Image.new("RGB", (256, 128), (40, 150, 40))
+    ImageDraw.Draw(leaf).rectangle((192, 32, 255, 95), fill=(150, 90, 30))
+    result = classify_tiled(leaf, processor, predict_brown_share, labels)
+    severity_map = result["severity_map"]
+    assert severity_map.shape == (3, 5) and not np.isnan(severity_map).any()
+    assert (severity_map[:, 4] >= 0.5).all() and (severity_map[:, :4] < 0.5).all()
+    assert labels[int(result["probabilities"].argmax())] == "Tomato___Early_blight"
+    assert abs(result["severity"] - 3 / 15) < 1e-6 and result["tile_size"] == 64
+    print(f"   🧩 {len(result['tiles'])} tiles, lesion column severities {np.round(severity_map[:, 4], 2).tolist()}, "
+          f"affected {result['severity']:.0%}")
+    
+    # A photo without foliage is classified as a single whole-image tile
+    bare = classify_tiled(Image.new("RGB", (256, 128), (128, 128, 128)), processor, predict_brown_share, labels)
+    assert len(bare["tiles"]) == 1 and bare["severity_map"].shape == (1, 1)
+    print("   ✅ Tiled inference working")
+except Exception as e:
+    print(f"   ❌ Tiled inference check failed: {e}")
+    sys.exit(1)
+
+# Test 22: Frame streams back off while the camera is still and classify in batches
+print("\n2️⃣2️⃣ Testing frame stream sampling...")
+try:
+    import numpy as np
+    from PIL import Image
+    from components.frame_stream import AdaptiveSampler, dhash, hamming_distance, iter_image_frames, stream_detections
+    from components.prediction_result import LabelTable, PredictionResult
+    
+    rng = np.random.default_rng(0)
+    ramp = np.tile(np.linspace(20, 235, 64), (48, 1))
+    def scene(reverse: bool):
+        pixels = (ramp[:, ::-1] if reverse else ramp) + rng.uniform(-3, 3, ramp.shape)
+        return Image.fromarray(np.repeat(pixels[..., None], 3, axis=2).astype(np.uint8))
+    
+    assert hamming_distance(dhash(scene(False)), dhash(scene(False))) <= 6, "noise broke the near-duplicate hash"
+    assert hamming_distance(dhash(scene(False)), dhash(scene(True))) == 64
+    
+    sampler = AdaptiveSampler(min_interval=0.25, max_interval=1.0)
+    for _ in range(4):
+        sampler.update(0.0, duplicate=True)
+    assert sampler.interval == 1.0, "back-off not capped at max_interval"
+    sampler.update(0.0, False)
+    assert sampler.interval == 0.25 and sampler.wants(0.25) and not sampler.wants(0.2)
+    
+    labels = LabelTable.intern(["Healthy", "Blight"])
+    batches = []
+    def classify_batch(images):
+        batches.append(len(images))
+        # Stand-in model: "Blight" when the bright side of the ramp is on the left
+        return [PredictionResult.from_probabilities(
+            [0.1, 0.9] if np.asarray(image)[:, :32].mean() > np.asarray(image)[:, 32:].mean() else [0.9, 0.1], labels
+        ) for image in images]
+    
+    # 4 fps: a still scene for 6 seconds, then the camera turns. Timestamps are exact in binary.
+    frames = [scene(False) for _ in range(24)] + [scene(True) for _ in range(12)]
+    stats = {}
+    timeline = list(stream_detections(iter_image_frames(frames, fps=4), classify_batch, batch_size=8,
+                                      min_interval=0.25, max_interval=2.0, stats=stats))
+    # Sampled at 0, 0.25, 0.75, 1.75, 3.75, 5.75 (still scene) and 7.75, 8.0, 8.5 (turned)
+    assert [(entry["frame_index"], entry["predicted_disease"]) for entry in timeline] == [(0, "Healthy"), (31, "Blight")]
+    assert timeline[1]["frames_skipped"] == 30
+    assert stats == {"frames_read": 36, "frames_sampled": 9, "duplicates_skipped": 7, "frames_classified": 2}, stats
+    print(f"   🎞️ {stats['frames_read']} frames read, {stats['frames_sampled']} sampled, "
+          f"{stats['duplicates_skipped']} near-duplicates skipped")
+    
+    # Every frame differs: batches flush when full and once more at the end, as the stream is consumed
+    batches.clear()
+    alternating = iter_image_frames([scene(i % 2 == 1) for i in range(7)], fps=4)
+    stream = stream_detections(alternating, classify_batch, batch_size=3, min_interval=0.0)
+    first = next(stream)
+    assert batches == [3] and first["frame_index"] == 0, "results were not yielded per batch"
+    rest = list(stream)
+    assert batches == [3, 3, 1] and [entry["frame_index"] for entry in rest] == [1, 2, 3, 4, 5, 6]
+    assert [entry["predicted_disease"] for entry in rest] == ["Blight", "Healthy"] * 3
+    print(f"   📦 Batch sizes {batches}")
+    print("   ✅ Frame stream sampling working")
+except Exception as e:
+    print(f"   ❌ Frame stream check failed: {e}")
+    sys.exit(1)
+
+# Test 23: TorchScript export loads back, and a missing or stale artifact falls back to the snapshot
+print("\n2️⃣3️⃣ Testing TorchScript export...")
+try:
+    try:
+        import torch
+        from transformers import ResNetConfig, ResNetForImageClassification
+    except ImportError:
+        torch = None
+    
+    if torch is None:
+        print("   ⏭️  PyTorch/transformers not installed - skipped")
+    else:
+        import json
+        import tempfile
+        import warnings
+        from PIL import Image
+        from components import ml_model_connector as connector
+        from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+        from components.model_store import CURRENT_POINTER, MANIFEST_NAME, snapshot_slug
+        from components.torchscript_export import (
+            check_torchscript_artifact, export_torchscript, load_torchscript_classifier, read_torchscript_metadata
+        )
+        
+        torch.manual_seed(0)
+        config = ResNetConfig(embedding_size=16, hidden_sizes=[32, 64], depths=[1, 1], layer_type="bottleneck",
+                              num_labels=4, id2label={i: f"class {i}" for i in range(4)})
+        hf_model = ResNetForImageClassification(config).eval()
+        hf_model.config.name_or_path = "test/plant-model"
+        hf_model.config._commit_hash = "rev-a"
+        spec = PreprocessSpec(resize_shortest_edge=72, crop_size=64,
+                              image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5))
+        images = [Image.new("RGB", (90, 70), (40 + 60 * i, 150, 60)) for i in range(3)]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            with warnings.catch_warnings():
+                # torch.jit deprecation notices
+                warnings.simplefilter("ignore", FutureWarning)
+                artifact = export_torchscript(hf_model, FastImageProcessor(spec), Path(tmp) / "model.torchscript.pt")
+                processor, classifier = load_torchscript_classifier(artifact)
+            with torch.no_grad():
+                exported = classifier(processor(images)["pixel_values"])
+                reference = hf_model(FastImageProcessor(spec)(images)["pixel_values"]).logits
+            difference = float((exported - reference).abs().max())
+            print(f"   📦 Max logit difference after export and load: {difference:.2e}")
+            assert difference < 1e-4, "exported classifier does not match the model"
+            assert classifier.config.id2label[2] == "class 2" and processor.spec == spec
+            assert read_torchscript_metadata(artifact)["source_revision"] == "rev-a"
+            
+            # Snapshot store whose CURRENT snapshot is (or is not) the revision the artifact came from
+            store = Path(tmp) / "store"
+            snapshot_dir = store / snapshot_slug("test/plant-model") / "v1"
+            snapshot_dir.mkdir(parents=True)
+            (snapshot_dir.parent / CURRENT_POINTER).write_text("v1")
+            def set_snapshot_revision(revision):
+                manifest = {"model_name": "test/plant-model", "version": "v1", "source_revision": revision, "files": {}}
+                (snapshot_dir / MANIFEST_NAME).write_text(json.dumps(manifest))
+            
+            set_snapshot_revision("rev-a")
+            assert check_torchscript_artifact(artifact, snapshot_dir) is None
+            assert "not found" in check_torchscript_artifact(Path(tmp) / "missing.pt")
+            (Path(tmp) / "broken.pt").write_bytes(b"not a zip")
+            assert "not a TorchScript archive" in check_torchscript_artifact(Path(tmp) / "broken.pt")
+            set_snapshot_revision("rev-b")
+            assert "exported from revision rev-a" in check_torchscript_artifact(artifact, snapshot_dir)
+            
+            # The connector serves the artifact only while it is current, else the snapshot
+            saved = connector.TORCHSCRIPT_PATH, connector.MODEL_STORE_DIR, connector.MODEL_NAME
+            connector.MODEL_STORE_DIR, connector.MODEL_NAME = str(store), "test/plant-model"
+            try:
+                connector.TORCHSCRIPT_PATH = str(artifact)
+                assert connector._default_model_version() == "plant-model@v1", "stale artifact served"
+                set_snapshot_revision("rev-a")
+                assert connector._default_model_version() == f"torchscript:{artifact}"
+                connector.TORCHSCRIPT_PATH = str(Path(tmp) / "missing.pt")
+                assert connector._default_model_version() == "plant-model@v1", "missing artifact chosen"
+                assert not any(v["kind"] == "torchscript" for v in connector.list_model_versions())
+            finally:
+                connector.TORCHSCRIPT_PATH, connector.MODEL_STORE_DIR, connector.MODEL_NAME = saved
+        print("   ✅ TorchScript export working")
+except Exception as e:
+    print(f"   ❌ TorchScript export check failed: {e}")
+    sys.exit(1)
+
+# Test 24: Bulk classification resumes without re-writing rows
+print("\n2️⃣4️⃣ Testing bulk classification resume...")
+try:
+    try:
+        import torch
+        from transformers import ResNetConfig, ResNetForImageClassification
+    except ImportError:
+        torch = None
+    
+    if torch is None:
+        print("   ⏭️  PyTorch/transformers not installed - skipped")
+    else:
+        import csv
+        import tempfile
+        from PIL import Image
+        from components import ml_model_connector as connector
+        from components.bulk_classify import CsvResultWriter, ProcessedManifest, classify_directory
+        from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+        
+        torch.manual_seed(0)
+        config = ResNetConfig(embedding_size=16, hidden_sizes=[32, 64], depths=[1, 1], layer_type="bottleneck",
+                              num_labels=4, id2label={i: f"class {i}" for i in range(4)})
+        tiny_model = ResNetForImageClassification(config).eval()
+        spec = PreprocessSpec(resize_shortest_edge=72, crop_size=64,
+                              image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5))
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            photos = Path(tmp) / "photos"
+            (photos / "field_b").mkdir(parents=True)
+            for i in range(3):
+                Image.new("RGB", (90, 70), (40 + 60 * i, 150, 60)).save(photos / f"leaf_{i}.jpg")
+            Image.new("RGB", (80, 80), (90, 120, 40)).save(photos / "field_b" / "leaf_3.png")
+            (photos / "field_b" / "truncated.jpg").write_bytes(b"\xff\xd8\xff not a jpeg")
+            output, manifest_path = Path(tmp) / "results.csv", Path(tmp) / "results.csv.manifest"
+            
+            def run():
+                writer, manifest = CsvResultWriter(output, 3), ProcessedManifest(manifest_path)
+                try:
+                    return classify_directory(photos, writer, manifest, workers=1, batch_size=2, top_k=3, log_every=1000)
+                finally:
+                    writer.close()
+                    manifest.close()
+            
+            saved = connector.load_plant_disease_model
+            connector.load_plant_disease_model = lambda: (FastImageProcessor(spec), tiny_model)
+            try:
+                first, second = run(), run()
+            finally:
+                connector.load_plant_disease_model = saved
+            
+            with open(output, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            paths = [row["path"] for row in rows]
+            print(f"   📄 {len(rows)} rows after two runs, resumed run retried {second['failed']} unreadable file")
+            assert first["processed"] == 5 and first["failed"] == 1, first
+            assert second["processed"] == 1 and second["failed"] == 1, "resume did not retry only the failed file"
+            assert len(paths) == len(set(paths)) == 5, f"duplicated rows after resume: {paths}"
+            assert [row["path"] for row in rows if row["error"]] == ["field_b/truncated.jpg"]
+            assert all(row["predicted_disease"].startswith("class ") for row in rows if not row["error"])
+        print("   ✅ Bulk classification resume working")
+except Exception as e:
+    print(f"   ❌ Bulk classification resume check failed: {e}")
+    sys.exit(1)
+
+# Test 25: Batched predictions match the single-image path
+print("\n2️⃣5️⃣ Testing batched prediction...")
+try:
+    try:
+        import torch
+        from transformers import ResNetConfig, ResNetForImageClassification
+    except ImportError:
+        torch = None
+    from components.ml_model_connector import list_dataset_images
+    
+    valid_items = list_dataset_images("valid")
+    if torch is None:
+        print("   ⏭️  PyTorch/transformers not installed - skipped")
+    elif not valid_items:
+        print("   ⏭️  Validation split not found - skipped")
+    else:
+        from PIL import Image
+        from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+        from components.ml_model_connector import predict_batch, predict_disease
+        from components.prediction_result import TOP_K
+        
+        torch.manual_seed(0)
+        config = ResNetConfig(embedding_size=16, hidden_sizes=[32, 64], depths=[1, 1], layer_type="bottleneck",
+                              num_labels=8, id2label={i: f"class {i}" for i in range(8)})
+        tiny_model = ResNetForImageClassification(config).eval()
+        tiny_model.config.name_or_path = "test/batch-model"
+        processor = FastImageProcessor(PreprocessSpec(resize_shortest_edge=72, crop_size=64,
+                                                      image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5)))
+        
+        images = [Image.open(path).convert("RGB") for path, _ in valid_items[::max(1, len(valid_items) // 5)][:5]]
+        batched = predict_batch(images, processor, tiny_model, batch_size=2)
+        single = [predict_disease(image, processor, tiny_model, tta=False) for image in images]
+        for one, many in zip(single, batched):
+            assert len(many.top_indices) == len(one.top_indices) == TOP_K, "batch kept a different number of classes"
+            assert np.array_equal(many.top_indices, one.top_indices), "batch ranked the classes differently"
+            assert np.allclose(many.top_probabilities, one.top_probabilities, atol=1e-5), "batch probabilities differ"
+        print(f"   📦 {len(images)} validation images: batch and single-image top-{TOP_K} agree")
+        print("   ✅ Batched prediction working")
+except Exception as e:
+    print(f"   ❌ Batched prediction check failed: {e}")
+    sys.exit(1)
+
+# Test 26: Int8 gate rejects a disagreeing model, falls back to fp32 and caches its verdict
+print("\n2️⃣6️⃣ Testing int8 quantization gate...")
+try:
+    try:
+        import torch
+        from transformers import ResNetConfig, ResNetForImageClassification
+    except ImportError:
+        torch = None
+    
+    if torch is None:
+        print("   ⏭️  PyTorch/transformers not installed - skipped")
+    else:
+        import tempfile
+        import warnings
+        from PIL import Image
+        from components import ml_model_connector as connector
+        from components import model_quantization
+        
+        # Deprecation notice from PyTorch's own quantized Linear modules
+        warnings.filterwarnings("ignore", message="torch.quantize_per_tensor", category=UserWarning)
+        from components.image_preprocessing import FastImageProcessor, PreprocessSpec
+        
+        torch.manual_seed(0)
+        config = ResNetConfig(embedding_size=16, hidden_sizes=[32, 64], depths=[1, 1], layer_type="bottleneck",
+                              num_labels=8, id2label={i: f"class {i}" for i in range(8)})
+        tiny_model = ResNetForImageClassification(config).eval()
+        tiny_model.config.name_or_path = "test/quant-model"
+        processor = FastImageProcessor(PreprocessSpec(resize_shortest_edge=72, crop_size=64,
+                                                      image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5)))
+        
+        class Negated(torch.nn.Module):
+            """Ranks the classes in reverse, so it never agrees with the reference"""
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+            def forward(self, pixel_values):
+                return -self.model(pixel_values).logits
+        
+        verify_calls = []
+        verify = model_quantization.verify_quantized_model
+        def counting_verify(*args, **kwargs):
+            verify_calls.append(1)
+            return verify(*args, **kwargs)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            valid_paths = []
+            for i in range(6):
+                path = Path(tmp) / f"leaf_{i}.png"
+                Image.new("RGB", (80, 70), (30 * i, 160 - 10 * i, 60)).save(path)
+                valid_paths.append(str(path))
+            batches = list(model_quantization.iter_pixel_batches(valid_paths, processor, batch_size=3))
+            
+            same = verify(tiny_model, tiny_model, batches, max_latency_ratio=float("inf"), timing_repeats=1)
+            flipped = verify(tiny_model, Negated(tiny_model), batches, max_latency_ratio=float("inf"), timing_repeats=1)
+            assert same["passed"] and same["top1_agreement"] == 1.0, same
+            assert not flipped["passed"] and flipped["top1_agreement"] == 0.0, flipped
+            
+            model_quantization.verify_quantized_model = counting_verify
+            saved = (connector.QUANTIZATION_MODE, connector.QUANTIZATION_MIN_AGREEMENT,
+                     connector.QUANTIZATION_REPORT_DIR, connector.list_dataset_images)
+            try:
+                # Passing gate: the int8 model is returned, and a second build reuses the verdict
+                report_path = Path(tmp) / "reports" / "dynamic-test.json"
+                for attempt in range(2):
+                    quantized, report = model_quantization.build_verified_quantized_model(
+                        tiny_model, processor, "dynamic", valid_paths, [], report_path=report_path,
+                        min_agreement=0.0, max_latency_ratio=float("inf"), revision="test@rev-1"
+                    )
+                    assert quantized is not None and quantized.variant == "int8-dynamic", report
+                    assert report["cached"] == (attempt == 1), "verdict not reused for the same revision"
+                assert len(verify_calls) == 1, "gate re-ran for a cached revision"
+                
+                # Failing gate (agreement above 100% is impossible): the connector keeps fp32, once per revision
+                connector.QUANTIZATION_MODE, connector.QUANTIZATION_MIN_AGREEMENT = "dynamic", 1.01
+                connector.QUANTIZATION_REPORT_DIR = str(Path(tmp) / "connector-reports")
+                connector.list_dataset_images = lambda split: [(path, 0) for path in valid_paths] if split == "valid" else []
+                assert connector._activate_quantization(processor, tiny_model) is tiny_model, "failed gate activated int8"
+                assert connector._activate_quantization(processor, tiny_model) is tiny_model
+                assert len(verify_calls) == 2, "failed verdict was not cached"
+                
+                connector.list_dataset_images = lambda split: []
+                assert connector._activate_quantization(processor, tiny_model) is tiny_model, "unverified int8 activated"
+            finally:
+                model_quantization.verify_quantized_model = verify
+                (connector.QUANTIZATION_MODE, connector.QUANTIZATION_MIN_AGREEMENT,
+                 connector.QUANTIZATION_REPORT_DIR, connector.list_dataset_images) = saved
+        print(f"   🧮 Agreement gate: identical model {same['top1_agreement']:.0%}, reversed ranking {flipped['top1_agreement']:.0%}")
+        print("   💾 Verdicts cached per revision, fp32 kept when the gate fails")
+        print("   ✅ Int8 quantization gate working")
+except Exception as e:
+    print(f"   ❌ Int8 quantization gate check failed: {e}")
+    sys.exit(1)
+
+# Test 27: Background warmup never blocks, and importing the connector leaves torch unloaded
+print("\n2️⃣7️⃣ Testing background warmup and deferred imports...")
+try:
+    import os
+    import subprocess
+    import threading
+    import time
+    from components.model_warmup import WARMUP_FAILED, WARMUP_PENDING, WARMUP_READY, WARMUP_RUNNING, BackgroundWarmup
+    
+    release = threading.Event()
+    warmup = BackgroundWarmup(lambda: release.wait(30))
+    assert warmup.status()["state"] == WARMUP_PENDING and not warmup.wait(0.01)
+    started = time.perf_counter()
+    assert warmup.start() and not warmup.start(), "warmup started twice"
+    start_seconds = time.perf_counter() - started
+    assert start_seconds < 0.1, f"start() blocked for {start_seconds:.2f} s"
+    assert warmup.status()["state"] == WARMUP_RUNNING and not warmup.is_ready()
+    release.set()
+    assert warmup.wait(5) and warmup.is_ready(), "warmup did not finish"
+    assert warmup.status()["state"] == WARMUP_READY and warmup.status()["seconds"] is not None
+    
+    def broken():
+        raise OSError("weights missing")
+    failing = BackgroundWarmup(broken)
+    failing.start()
+    failing.wait(5)
+    assert failing.status()["state"] == WARMUP_FAILED and "weights missing" in failing.status()["error"]
+    assert not failing.is_ready()
+    
+    # Outside a Streamlit server nothing is warmed up, and torch/transformers stay unimported until a model loads
+    from components.ml_model_connector import get_model_warmup_status
+    assert get_model_warmup_status()["state"] == WARMUP_PENDING and not get_model_warmup_status()["started"]
+    probe = ("import sys, time\n"
+             "started = time.perf_counter()\n"
+             "import components.ml_model_connector\n"
+             "print(round(time.perf_counter() - started, 2), sorted({'torch', 'transformers'} & set(sys.modules)))\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    run = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, run.stderr[-2000:]
+    import_seconds, loaded = run.stdout.strip().splitlines()[-1].split(" ", 1)
+    print(f"   ⚡ Connector import: {import_seconds} s, heavy modules loaded: {loaded}")
+    assert loaded == "[]", f"importing the connector loaded {loaded}"
+    print("   ✅ Background warmup working")
+except Exception as e:
+    print(f"   ❌ Background warmup check failed: {e}")
+    sys.exit(1)
+
+# Test 28: Check Model Availability (Optional - requires internet)
+print("\n2️⃣8️⃣ Testing model availability (requires internet)...")
 print("   ⏳ This may take a while on first run (downloading model)...")
 print("   💡 You can skip this test by pressing Ctrl+C")
 try:
@@ -128,5 +1376,26 @@ print("   ✅ Disease classes loaded")
 print("   ✅ Dataset info available")
 print("   ✅ Recommendations working")
 print("   ✅ Image validation working")
+print("   ✅ Fast preprocessing matches the processor")
+print("   ✅ Fallback classifier working")
+print("   ✅ Leaf pre-screen working")
+print("   ✅ Model registry hot swap working")
+print("   ✅ Shadow inference working")
+print("   ✅ Grad-CAM heatmaps working")
+print("   ✅ Similar-case embedding index working")
+print("   ✅ Request profiling working")
+print("   ✅ Shared weights working")
+print("   ✅ Test-time augmentation working")
+print("   ✅ Compact prediction results working")
+print("   ✅ Inference worker pool working")
+print("   ✅ Micro-batching engine working")
+print("   ✅ Confidence cascade working")
+print("   ✅ Tiled inference working")
+print("   ✅ Frame stream sampling working")
+print("   ✅ TorchScript export working")
+print("   ✅ Bulk classification resume working")
+print("   ✅ Batched prediction working")
+print("   ✅ Int8 quantization gate working")
+print("   ✅ Background warmup working")
 print("\n🚀 Ready to run: streamlit run app.py")
 print("=" * 60)
@@ -0,0 +1,217 @@
+"""
+Tiled Inference - Lesion-Scale Classification of High-Resolution Photos
+Instead of squashing a 12-50 MP field photo into one 224x224 input, the photo is
+decoded at a bounded working resolution, cut into overlapping model-sized tiles
+around the foliage, classified in one batched forward pass, and the tile
+probabilities are aggregated into an image verdict and a per-tile severity map
+"""
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from components.image_preprocessing import decode_image
+from components.image_screening import foliage_masks
+from components.prediction_result import PredictionResult
+
+TILE_OVERLAP = 0.25
+MIN_TILE_FOLIAGE = 0.15
+MASK_FACTOR = 4
+
+
+# ==================== DECODING ====================
+def working_image(source, working_edge: int = 672, max_long_edge: int = 1344) -> Image.Image:
+    """
+    Decode a photo at a bounded working resolution.
+
+    JPEGs are shrunk by the decoder (draft mode), so memory stays proportional
+    to the working size, not the source megapixels. The result has a shortest
+    edge of at most ``working_edge`` and a longest edge of at most ``max_long_edge``.
+
+    Args:
+        source: File path, file-like object (e.g. Streamlit UploadedFile) or PIL image
+    """
+    if isinstance(source, Image.Image):
+        image = source if source.mode == "RGB" else source.convert("RGB")
+    else:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        image = decode_image(source, min_edge=working_edge)
+
+    width, height = image.size
+    scale = min(working_edge / min(width, height), max_long_edge / max(width, height), 1.0)
+    if scale < 1:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                             Image.BILINEAR, reducing_gap=2.0)
+    return image
+
+
+# ==================== TILE PLANNING ====================
+def _axis_positions(length: int, tile: int, stride: int) -> list:
+    """Tile offsets covering [0, length), the last tile flush with the far edge"""
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile + 1, stride))
+    if positions[-1] != length - tile:
+        positions.append(length - tile)
+    return positions
+
+
+def plan_tiles(image: Image.Image, tile: int, overlap: float = TILE_OVERLAP,
+               min_foliage: float = MIN_TILE_FOLIAGE, max_tiles: int = 16) -> dict:
+    """
+    Choose the overlapping tiles worth classifying.
+
+    Foliage is detected on a 1/MASK_FACTOR scale copy and each candidate tile's
+    foliage fraction is read from an integral image, so planning stays cheap.
+    At most ``max_tiles`` tiles are kept (the leafiest), which bounds the batch.
+
+    Returns:
+        dict: xs and ys (grid offsets), tiles as (row, col, left, top, foliage)
+              tuples in grid order
+    """
+    width, height = image.size
+    stride = max(1, int(tile * (1 - overlap)))
+    xs = _axis_positions(width, tile, stride)
+    ys = _axis_positions(height, tile, stride)
+
+    small = image.reduce(MASK_FACTOR) if min(width, height) >= MASK_FACTOR * 8 else image
+    factor = width / small.size[0]
+    green, lesion = foliage_masks(np.asarray(small.convert("HSV")))
+    integral = np.pad((green | lesion).cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+
+    tiles = []
+    for row, top in enumerate(ys):
+        for col, left in enumerate(xs):
+            y0, x0 = int(top / factor), int(left / factor)
+            y1 = min(integral.shape[0] - 1, max(y0 + 1, int((top + tile) / factor)))
+            x1 = min(integral.shape[1] - 1, max(x0 + 1, int((left + tile) / factor)))
+            area = (y1 - y0) * (x1 - x0)
+            foliage = (integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]) / area
+            tiles.append((row, col, left, top, float(foliage)))
+
+    selected = [t for t in tiles if t[4] >= min_foliage]
+    if len(selected) > max_tiles:
+        selected = sorted(selected, key=lambda t: -t[4])[:max_tiles]
+        selected.sort(key=lambda t: (t[0], t[1]))
+
+    return {"xs": xs, "ys": ys, "tiles": selected}
+
+
+# ==================== AGGREGATION ====================
+def aggregate_tiles(probabilities: np.ndarray, foliage: np.ndarray, labels: list,
+                    disease_threshold: float = 0.5) -> tuple:
+    """
+    Turn tile probabilities into one image verdict.
+
+    A tile's severity is its probability of not being healthy. If any tile is
+    diseased (severity >= disease_threshold), the verdict comes from the
+    diseased tiles only, so a small lesion is not outvoted by healthy leaf
+    area; otherwise it is the foliage-weighted mean of all tiles.
+
+    Returns:
+        tuple: (image probabilities, per-tile severities, affected foliage fraction)
+    """
+    healthy = [idx for idx, label in enumerate(labels) if "healthy" in str(label).lower()]
+    severities = 1.0 - probabilities[:, healthy].sum(axis=1)
+    diseased = severities >= disease_threshold
+    weights = np.maximum(foliage, 1e-6)
+
+    if diseased.any():
+        tile_weights = weights * severities * diseased
+    else:
+        tile_weights = weights
+    image_probabilities = (tile_weights[:, None] * probabilities).sum(axis=0) / tile_weights.sum()
+
+    affected = float((weights * diseased).sum() / weights.sum())
+    return image_probabilities.astype(np.float32), severities.astype(np.float32), affected
+
+
+# ==================== PIPELINE ====================
+def classify_tiled(image: Image.Image, processor, predict_probabilities, labels: list,
+                   max_tiles: int = 16) -> dict:
+    """
+    Classify a working image tile by tile in one batched forward pass.
+
+    Args:
+        image: Working image from working_image()
+        processor: FastImageProcessor (tiles are packed as-is) or Hugging Face processor
+        predict_probabilities: Callable mapping a pixel batch to an (N, C) probability array
+        labels: Class names in model order
+        max_tiles: Upper bound on tiles per image (and so on batch memory)
+
+    Returns:
+        dict: probabilities (image verdict), severity (affected foliage fraction),
+              severity_map (grid of tile severities, NaN where no tile was classified),
+              tiles (box, label index, confidence, severity each), working_size and tile_size
+    """
+    tile = processor.spec.crop_size if hasattr(processor, "spec") else 224
+    if min(image.size) < tile:
+        scale = tile / min(image.size)
+        image = image.resize((max(tile, round(image.size[0] * scale)), max(tile, round(image.size[1] * scale))),
+                             Image.BILINEAR)
+
+    plan = plan_tiles(image, tile, max_tiles=max_tiles)
+    tiles = plan["tiles"]
+    if not tiles:
+        # No foliage found: classify the whole photo as one tile
+        tiles = [(0, 0, 0, 0, 1.0)]
+        plan = {"xs": [0], "ys": [0]}
+        image = image.resize((tile, tile), Image.BILINEAR)
+
+    pixels = np.asarray(image)
+    crops = [pixels[top:top + tile, left:left + tile].copy() for _, _, left, top, _ in tiles]
+    if hasattr(processor, "pack_crops"):
+        pixel_values = processor.pack_crops(crops, processor.allocate_batch(len(crops)))
+    else:
+        pixel_values = processor(images=[Image.fromarray(crop) for crop in crops], return_tensors="pt")["pixel_values"]
+
+    probabilities = predict_probabilities(pixel_values)
+    foliage = np.array([t[4] for t in tiles], dtype=np.float32)
+    image_probabilities, severities, affected = aggregate_tiles(probabilities, foliage, labels)
+
+    severity_map = np.full((len(plan["ys"]), len(plan["xs"])), np.nan, dtype=np.float32)
+    tile_results = []
+    for (row, col, left, top, _), tile_probs, severity in zip(tiles, probabilities, severities):
+        severity_map[row, col] = severity
+        tile_results.append({
+            "box": [int(left), int(top), int(left + tile), int(top + tile)],
+            "predicted_class_idx": int(tile_probs.argmax()),
+            "confidence": float(tile_probs.max()),
+            "severity": float(severity)
+        })
+
+    return {
+        "probabilities": image_probabilities,
+        "severity": affected,
+        "severity_map": severity_map,
+        "tiles": tile_results,
+        "working_size": list(image.size),
+        "tile_size": tile
+    }
+
+
+# ==================== VISUALIZATION ====================
+def render_severity_overlay(image: Image.Image, result: PredictionResult, alpha: int = 110) -> Image.Image:
+    """
+    Draw each classified tile over the image, shaded from green (healthy) to red (diseased).
+
+    Args:
+        image: The displayed image (any size; tile boxes are rescaled from the working size)
+        result: Prediction result holding ``tiles`` and ``working_size``
+    """
+    base = image.convert("RGBA")
+    overlay = Image.new("RGBA", base.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    working_width, working_height = result.working_size
+    scale_x = base.size[0] / working_width
+    scale_y = base.size[1] / working_height
+
+    for tile in result.tiles:
+        left, top, right, bottom = tile["box"]
+        severity = tile["severity"]
+        color = (int(255 * severity), int(200 * (1 - severity)), 40)
+        box = (left * scale_x, top * scale_y, right * scale_x, bottom * scale_y)
+        draw.rectangle(box, fill=color + (int(alpha * severity),), outline=color + (220,), width=2)
+
+    return Image.alpha_composite(base, overlay).convert("RGB")
@@ -0,0 +1,178 @@
+"""
+TorchScript Export - Frozen Classifier Artifact and Fast-Load Path
+Traces the fine-tuned ResNet-50 into a frozen TorchScript file with the
+normalization constants embedded, so cold start skips building the
+transformers model class and config
+"""
+
+import json
+import zipfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+from torch import nn
+
+from components.image_preprocessing import FastImageProcessor, PreprocessSpec, spec_from_processor
+from components.model_graph import build_classifier_graph
+from components.model_store import MANIFEST_NAME, MODEL_STORE_DIR
+
+METADATA_FILE = "agridetect.json"
+# Where the CLI writes the artifact: inside the model store, whatever the current directory
+DEFAULT_TORCHSCRIPT_PATH = str(Path(MODEL_STORE_DIR) / "plant-disease-model.torchscript.pt")
+
+
+class _NormalizedClassifier(nn.Module):
+    """uint8 (N, 3, H, W) pixels -> logits, with rescale/normalize folded into one multiply-add"""
+
+    def __init__(self, network: nn.Module, spec: PreprocessSpec):
+        super().__init__()
+        std = torch.tensor(spec.image_std).view(1, 3, 1, 1)
+        mean = torch.tensor(spec.image_mean).view(1, 3, 1, 1)
+        self.network = network
+        self.register_buffer("scale", spec.rescale_factor / std)
+        self.register_buffer("shift", -mean / std)
+
+    def forward(self, pixels):
+        return self.network(pixels.float() * self.scale + self.shift)
+
+
+# ==================== EXPORT ====================
+def export_torchscript(model, processor, output_path) -> Path:
+    """
+    Trace and freeze the classifier into a standalone TorchScript file.
+
+    Args:
+        model: Hugging Face ResNet image classification model
+        processor: Its image processor (preprocessing constants are embedded)
+        output_path: Destination .pt file
+
+    Returns:
+        Path: The written artifact
+    """
+    spec = processor.spec if hasattr(processor, "spec") else spec_from_processor(processor)
+    module = _NormalizedClassifier(build_classifier_graph(model.eval()).network, spec).eval()
+    example = torch.zeros(1, 3, spec.crop_size, spec.crop_size, dtype=torch.uint8)
+
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(module, example))
+
+    config = model.config
+    metadata = {
+        "model_name": config.name_or_path,
+        "source_revision": getattr(config, "_commit_hash", None),
+        "id2label": {str(idx): label for idx, label in config.id2label.items()},
+        "preprocessing": spec.to_dict()
+    }
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(frozen, str(output_path), _extra_files={METADATA_FILE: json.dumps(metadata)})
+    return output_path
+
+
+# ==================== LOAD ====================
+class TorchScriptClassifier:
+    """
+    Exported classifier exposing the small part of the transformers model API
+    the connector uses: calling it on pixel batches and ``config.id2label``.
+    """
+
+    variant = "torchscript"
+
+    def __init__(self, module, metadata: dict):
+        self.module = module
+        self.spec = PreprocessSpec.from_dict(metadata["preprocessing"])
+        self.config = SimpleNamespace(
+            name_or_path=metadata["model_name"],
+            _commit_hash=metadata.get("source_revision"),
+            id2label={int(idx): label for idx, label in metadata["id2label"].items()}
+        )
+
+    def __call__(self, pixels):
+        return self.module(pixels)
+
+    def eval(self):
+        return self
+
+
+def load_torchscript_classifier(path):
+    """
+    Load an exported classifier and its matching preprocessing.
+
+    Returns:
+        tuple: (FastImageProcessor producing uint8 pixels, TorchScriptClassifier)
+    """
+    extra_files = {METADATA_FILE: ""}
+    module = torch.jit.load(str(path), map_location="cpu", _extra_files=extra_files)
+    classifier = TorchScriptClassifier(module, json.loads(extra_files[METADATA_FILE]))
+    return FastImageProcessor(classifier.spec, normalize=False), classifier
+
+
+def read_torchscript_metadata(path) -> dict:
+    """
+    Read the metadata embedded by export_torchscript without loading the module.
+
+    Raises:
+        ValueError: If the file is not an artifact written by export_torchscript
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            name = next((name for name in archive.namelist() if name.endswith(f"/extra/{METADATA_FILE}")), None)
+            if name is None:
+                raise ValueError(f"{path} has no {METADATA_FILE} metadata")
+            return json.loads(archive.read(name))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{path} is not a TorchScript archive") from e
+
+
+def check_torchscript_artifact(path, snapshot_dir=None):
+    """
+    Tell whether an exported artifact can be served in place of the transformers model.
+
+    Args:
+        path: Artifact file
+        snapshot_dir: Model store snapshot that would be served otherwise, if any
+
+    Returns:
+        str or None: Why the artifact must not be used (missing, unreadable, or
+            exported from another revision than the snapshot), None if it can be
+    """
+    path = Path(path)
+    if not path.is_file():
+        return f"{path} not found"
+    try:
+        metadata = read_torchscript_metadata(path)
+    except (OSError, ValueError) as e:
+        return str(e)
+
+    if snapshot_dir is not None:
+        manifest = json.loads((Path(snapshot_dir) / MANIFEST_NAME).read_text(encoding="utf-8"))
+        revision = manifest.get("source_revision") or manifest["version"]
+        if metadata.get("model_name") == manifest["model_name"] and metadata.get("source_revision") != revision:
+            return (f"{path} was exported from revision {metadata.get('source_revision')}, "
+                    f"the model store serves {revision}")
+    return None
+
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    # Always export the fp32 transformers model
+    os.environ["AGRIDETECT_QUANTIZATION"] = "off"
+    os.environ.pop("AGRIDETECT_TORCHSCRIPT_PATH", None)
+    from components.ml_model_connector import load_plant_disease_model
+
+    parser = argparse.ArgumentParser(description="Export the classifier as a frozen TorchScript artifact")
+    parser.add_argument("--output", default=DEFAULT_TORCHSCRIPT_PATH)
+    args = parser.parse_args()
+
+    processor, model = load_plant_disease_model()
+    if model is None:
+        raise SystemExit("❌ Model could not be loaded")
+
+    path = export_torchscript(model, processor, args.output)
+    print(f"✅ TorchScript classifier written to {path}")
+    print(f"💡 Set AGRIDETECT_TORCHSCRIPT_PATH={path.resolve()} to serve it")
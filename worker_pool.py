@@ -0,0 +1,460 @@
+"""
+Worker Pool - Out-of-Process Inference
+Runs the classifier in N worker processes, each holding its own model copy,
+so preprocessing and forward passes neither hold the Streamlit process's GIL
+nor die with a rerun. Requests carry an id: asking again with the same id
+(e.g. after a rerun) attaches to the running request or returns its kept
+result instead of classifying the image twice.
+
+Workers pull from one shared multiprocessing task queue (idle workers take
+the next request) and post results to a reply queue drained by a collector
+thread in the server process, which also runs the health checks: dead or hung
+workers are replaced and their requests retried once on another worker. When
+the version stamp (e.g. the ACTIVE pointer's mtime) changes, workers on another
+version are replaced by new ones, and retire once a replacement is ready.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+READY = "ready"
+LOAD_FAILED = "load_failed"
+STARTED = "started"
+DONE = "done"
+ERROR = "error"
+
+
+class PoolBusyError(RuntimeError):
+    """Raised by submit() when the pool already holds max_pending requests"""
+
+
+class WorkerCrashedError(RuntimeError):
+    """A request was lost twice with its worker (crash or hang)"""
+
+
+# ==================== WORKER PROCESS ====================
+def _worker_main(worker_id: int, load_predictor, version_id: str, threads: int,
+                 tasks, replies, max_batch: int, stop):
+    """
+    Worker process entry point.
+
+    load_predictor(version_id) returns (predict, info): predict(images, mode) -> list
+    of PredictionResults (mode is None, or the mode passed to submit()), and a
+    picklable description of the loaded model that is reported to the server.
+    It must be importable by name (the pool uses the spawn start method).
+    The worker exits after its current batch once ``stop`` is set (retirement).
+    """
+    try:
+        import torch
+        torch.set_num_threads(max(1, threads))
+    except ImportError:
+        pass
+
+    try:
+        predict, info = load_predictor(version_id)
+    except Exception as e:
+        replies.put((LOAD_FAILED, worker_id, f"{type(e).__name__}: {e}"))
+        return
+    replies.put((READY, worker_id, os.getpid(), info))
+
+    finished = False
+    while not finished and not stop.is_set():
+        try:
+            batch = [tasks.get(timeout=0.5)]
+        except queue.Empty:
+            continue
+        while len(batch) < max_batch and batch[-1] is not None:
+            try:
+                batch.append(tasks.get_nowait())
+            except queue.Empty:
+                break
+        if batch[-1] is None:
+            finished = True
+            batch.pop()
+        if not batch:
+            continue
+
+        replies.put((STARTED, worker_id, [request_id for request_id, _, _ in batch]))
+        # One forward pass per mode present in the batch, in arrival order
+        for mode in dict.fromkeys(task_mode for _, task_mode, _ in batch):
+            group = [(request_id, image) for request_id, task_mode, image in batch if task_mode == mode]
+            try:
+                results = predict([image for _, image in group], mode)
+            except Exception as e:
+                for request_id, _ in group:
+                    replies.put((ERROR, worker_id, request_id, f"{type(e).__name__}: {e}"))
+                continue
+            for (request_id, _), result in zip(group, results):
+                replies.put((DONE, worker_id, request_id, result))
+
+
+# ==================== POOL ====================
+class _Worker:
+    """Server-side view of one worker process"""
+
+    def __init__(self, worker_id: int, process, version_id: str, stop):
+        self.worker_id = worker_id
+        self.process = process
+        self.version_id = version_id
+        self.stop = stop
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.retiring = False
+        self.info = None
+        self.error = None
+        self.in_flight = []
+        self.busy_since = None
+        self.served = 0
+
+
+class InferenceWorkerPool:
+    """
+    N inference processes behind a bounded request table.
+
+    submit() never blocks: it returns a Future, or raises PoolBusyError when
+    ``max_pending`` requests are already queued or running (backpressure).
+    Finished results stay retrievable by request id for the last
+    ``keep_results`` requests. A resolved future carries ``worker_info`` and
+    ``version_id`` of the worker that produced its result.
+    """
+
+    def __init__(self, load_predictor, version_reader, num_workers: int = 2, max_pending: int = 64,
+                 max_batch: int = 8, hang_timeout: float = 120.0, health_interval: float = 2.0,
+                 keep_results: int = 256, threads_per_worker: int = None, version_stamp=None):
+        """
+        Args:
+            load_predictor: Module-level function mapping a version id to a
+                (predict(images) callable, model info) pair; runs inside each worker
+            version_reader: Zero-argument callable returning the version id a
+                (re)started worker should load
+            num_workers: Worker processes (one model copy each)
+            max_pending: Queued plus running requests accepted at most
+            max_batch: Requests a worker classifies per forward pass
+            hang_timeout: Seconds a worker may spend on one batch (or loading
+                its model) before it is considered hung and replaced
+            health_interval: Seconds between health checks
+            keep_results: Finished requests kept for retrieval by id
+            threads_per_worker: torch intra-op threads per worker
+                (default: CPU count divided by num_workers)
+            version_stamp: Optional zero-argument callable returning a value that
+                changes whenever version_reader may return another version (e.g.
+                the ACTIVE pointer's mtime); checked with the health checks. During
+                a rollover old and new workers run side by side.
+        """
+        self._load_predictor = load_predictor
+        self._version_reader = version_reader
+        self._version_stamp = version_stamp
+        self.num_workers = max(1, int(num_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.max_batch = max(1, int(max_batch))
+        self.hang_timeout = float(hang_timeout)
+        self.health_interval = float(health_interval)
+        self.keep_results = max(1, int(keep_results))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._tasks = self._context.Queue()
+        self._replies = self._context.Queue()
+
+        self._lock = threading.Lock()
+        self._pending = {}          # request id -> [image, future, attempts, submitted at, mode]
+        self._finished = OrderedDict()
+        self._workers = {}
+        self._next_worker_id = 0
+        self._stats = {"submitted": 0, "rejected": 0, "reattached": 0, "completed": 0,
+                       "failed": 0, "retried": 0, "restarts": 0, "rollovers": 0}
+        self._closed = False
+        self._seen_stamp = None
+        self._seen_stamp = self._read_stamp()
+
+        for _ in range(self.num_workers):
+            self._spawn_worker()
+
+        self._collector = threading.Thread(target=self._collect_loop, name="agridetect-worker-pool", daemon=True)
+        self._collector.start()
+
+    # ---------- Requests ----------
+    def submit(self, image, request_id: str = None, mode: str = None) -> Future:
+        """
+        Queue an image for prediction, or attach to an earlier request with the same id.
+
+        Args:
+            image: PIL Image object
+            request_id: Caller-chosen id that survives reruns (a new one if None)
+            mode: Passed to the workers' predict(images, mode), e.g. "tiled"
+
+        Returns:
+            Future: Resolves to the PredictionResult; ``future.request_id`` holds the id
+
+        Raises:
+            PoolBusyError: If max_pending requests are already waiting
+        """
+        if self._closed:
+            raise RuntimeError("Worker pool has been shut down")
+        request_id = request_id or uuid.uuid4().hex
+
+        with self._lock:
+            entry = self._pending.get(request_id)
+            existing = entry[1] if entry is not None else self._finished.get(request_id)
+            if existing is not None:
+                self._stats["reattached"] += 1
+                return existing
+            if len(self._pending) >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise PoolBusyError(f"{len(self._pending)} requests are already waiting for a worker")
+
+            future = Future()
+            future.request_id = request_id
+            self._pending[request_id] = [image, future, 1, time.monotonic(), mode]
+            self._stats["submitted"] += 1
+
+        self._tasks.put((request_id, mode, image))
+        return future
+
+    def predict(self, image, request_id: str = None, timeout: float = None, mode: str = None):
+        """Submit (or re-attach to) a request and block until its prediction is ready"""
+        return self.submit(image, request_id, mode).result(timeout=timeout)
+
+    # ---------- Monitoring ----------
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Block until a worker has loaded its model; False on timeout or if every worker failed to load"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            with self._lock:
+                if any(worker.ready for worker in self._workers.values()):
+                    return True
+            if not self.healthy():
+                return False
+            time.sleep(0.05)
+        return False
+
+    def worker_info(self):
+        """
+        Model info reported by the most recently started ready worker (preferring
+        workers that are not retiring), or None if none is ready
+        """
+        with self._lock:
+            ready = [worker for worker in self._workers.values() if worker.ready]
+            if not ready:
+                return None
+            return max(ready, key=lambda worker: (not worker.retiring, worker.started_at)).info
+
+    def healthy(self) -> bool:
+        """True while at least one worker is running or starting (and has not failed to load its model)"""
+        with self._lock:
+            return any(worker.error is None and worker.process.is_alive() for worker in self._workers.values())
+
+    def status(self) -> dict:
+        """
+        Returns:
+            dict: Request counters, pending requests and one health entry per
+                  worker (pid, alive, ready, retiring, version, in-flight, busy
+                  seconds, served, load error)
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                **self._stats,
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "workers": [
+                    {
+                        "worker_id": worker.worker_id,
+                        "pid": worker.process.pid,
+                        "alive": worker.process.is_alive(),
+                        "ready": worker.ready,
+                        "retiring": worker.retiring,
+                        "version": worker.version_id,
+                        "in_flight": len(worker.in_flight),
+                        "busy_seconds": now - worker.busy_since if worker.busy_since is not None else 0.0,
+                        "served": worker.served,
+                        "error": worker.error
+                    }
+                    for worker in self._workers.values()
+                ]
+            }
+
+    def shutdown(self, wait: bool = True, timeout: float = 10.0):
+        """Let the workers finish the queued requests, then stop them"""
+        self._closed = True
+        for _ in range(len(self._workers)):
+            self._tasks.put(None)
+        if wait:
+            deadline = time.monotonic() + timeout
+            for worker in list(self._workers.values()):
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+        for worker in list(self._workers.values()):
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    # ---------- Workers ----------
+    def _spawn_worker(self, version_id: str = None):
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        version_id = version_id or self._version_reader()
+        stop = self._context.Event()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self._load_predictor, version_id, self.threads_per_worker,
+                  self._tasks, self._replies, self.max_batch, stop),
+            name=f"agridetect-inference-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = _Worker(worker_id, process, version_id, stop)
+
+    def _read_stamp(self):
+        if self._version_stamp is None:
+            return None
+        try:
+            return self._version_stamp()
+        except OSError:
+            return self._seen_stamp
+
+    def _check_version(self):
+        """Start replacing the workers when the version stamp changed and names another version"""
+        stamp = self._read_stamp()
+        if stamp == self._seen_stamp or self._closed:
+            return
+        self._seen_stamp = stamp
+        try:
+            version_id = self._version_reader()
+        except OSError:
+            return
+
+        with self._lock:
+            for worker_id, worker in list(self._workers.items()):
+                if worker.retiring:
+                    continue
+                if worker.error is not None:
+                    # Never served; a new rollout (or a fixed model) gets a fresh try
+                    del self._workers[worker_id]
+                elif worker.version_id != version_id:
+                    worker.retiring = True
+                else:
+                    continue
+                self._stats["rollovers"] += 1
+                self._spawn_worker(version_id)
+
+    def _retire_replaced(self):
+        """Let retiring workers finish their batch and exit once a replacement can serve"""
+        with self._lock:
+            if not any(worker.ready and not worker.retiring for worker in self._workers.values()):
+                return
+            for worker in self._workers.values():
+                if worker.retiring:
+                    worker.stop.set()
+
+    def _collect_loop(self):
+        next_check = time.monotonic() + self.health_interval
+        while not (self._closed and not any(w.process.is_alive() for w in self._workers.values())):
+            try:
+                self._handle(self._replies.get(timeout=min(0.5, self.health_interval)))
+            except queue.Empty:
+                pass
+            if time.monotonic() >= next_check:
+                self._check_version()
+                self._retire_replaced()
+                self._check_health()
+                next_check = time.monotonic() + self.health_interval
+
+    def _handle(self, message):
+        kind, worker_id = message[0], message[1]
+        with self._lock:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                # A replaced worker's late reply; its requests were already retried
+                return
+            if kind == READY:
+                worker.ready = True
+                worker.info = message[3]
+            elif kind == LOAD_FAILED:
+                worker.error = message[2]
+            elif kind == STARTED:
+                worker.in_flight = list(message[2])
+                worker.busy_since = time.monotonic()
+            else:
+                request_id = message[2]
+                if request_id in worker.in_flight:
+                    worker.in_flight.remove(request_id)
+                if not worker.in_flight:
+                    worker.busy_since = None
+                entry = self._pending.pop(request_id, None)
+                if entry is None:
+                    return
+                future = entry[1]
+                future.worker_info = worker.info
+                future.version_id = worker.version_id
+                if kind == DONE:
+                    worker.served += 1
+                    self._stats["completed"] += 1
+                else:
+                    self._stats["failed"] += 1
+                self._finished[request_id] = future
+                while len(self._finished) > self.keep_results:
+                    self._finished.popitem(last=False)
+
+        if kind == DONE:
+            future.set_result(message[3])
+        elif kind == ERROR:
+            future.set_exception(RuntimeError(message[3]))
+
+    def _check_health(self):
+        """
+        Replace dead workers and workers stuck on one batch for longer than
+        hang_timeout; retiring workers that exited are only removed
+        """
+        now = time.monotonic()
+        lost = []
+        with self._lock:
+            for worker_id, worker in list(self._workers.items()):
+                if worker.error is not None:
+                    # The model failed to load; a restart would fail the same way
+                    continue
+                busy_since = worker.busy_since if worker.ready else worker.started_at
+                hung = busy_since is not None and now - busy_since > self.hang_timeout
+                if worker.process.is_alive() and not hung:
+                    continue
+                if hung:
+                    worker.process.terminate()
+                del self._workers[worker_id]
+                lost.extend(worker.in_flight)
+                if worker.retiring:
+                    continue
+                self._stats["restarts"] += 1
+                if not self._closed:
+                    self._spawn_worker()
+
+            # Requests lost before a worker reported them (or starved by failed
+            # workers) must not hold a pending slot forever
+            expired = [
+                self._pending.pop(request_id)[1] for request_id, entry in list(self._pending.items())
+                if now - entry[3] > 2 * self.hang_timeout and request_id not in lost
+            ]
+            self._stats["failed"] += len(expired)
+
+            retry, failed = [], []
+            for request_id in lost:
+                entry = self._pending.get(request_id)
+                if entry is None:
+                    continue
+                if entry[2] >= 2:
+                    failed.append(self._pending.pop(request_id)[1])
+                    self._stats["failed"] += 1
+                else:
+                    entry[2] += 1
+                    retry.append((request_id, entry[4], entry[0]))
+                    self._stats["retried"] += 1
+
+        for task in retry:
+            self._tasks.put(task)
+        for future in failed:
+            future.set_exception(WorkerCrashedError("The inference worker stopped twice while serving this request"))
+        for future in expired:
+            future.set_exception(TimeoutError("No inference worker answered this request"))